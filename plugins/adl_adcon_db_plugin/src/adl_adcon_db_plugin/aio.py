@@ -0,0 +1,216 @@
+"""
+An asyncio counterpart of ``ADCONDBClient``'s fetch, so many ADCON servers can
+be read at once from one thread: a slow server then only delays its own
+station links.
+
+It runs on psycopg2's own asynchronous connections, driven by the running
+event loop through ``add_reader``/``add_writer`` rather than on a second
+driver, so errors are the same psycopg2 exceptions, carrying the same SQLSTATE,
+and ``_stamping()`` stamps them exactly as it does on the blocking path.
+
+Asynchronous connections have no server-side cursors and no COPY, so a fetch
+here is always the materialised query; the ``"copy"`` engine reshapes like
+``"columnar"``, as it does wherever it reads by query.
+
+The time limits are the blocking path's: the session's ``statement_timeout``
+set at connect, and a run deadline past which the statement in flight is
+cancelled on the server and ``RunDeadlineExceeded`` raised. A fetch whose task
+is cancelled cancels its statement on the server too, rather than leaving it
+running there with nobody to read the result.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from .db import (
+    _DROPPED_SELECT,
+    DEFAULT_SAMPLING_INTERVAL,
+    RESHAPE_ENGINES,
+    RunDeadlineExceeded,
+    _data_parameters,
+    _data_query,
+    _positions,
+    _stamping,
+    _take_dropped,
+)
+
+
+async def _wait(connection):
+    """Drive an asynchronous connection until its pending operation is done,
+    yielding to the loop while the socket is not ready."""
+    loop = asyncio.get_running_loop()
+
+    while True:
+        state = connection.poll()
+
+        if state == extensions.POLL_OK:
+            return
+
+        if state == extensions.POLL_READ:
+            add, remove = loop.add_reader, loop.remove_reader
+        elif state == extensions.POLL_WRITE:
+            add, remove = loop.add_writer, loop.remove_writer
+        else:
+            raise psycopg2.OperationalError(f"Unexpected poll state {state}")
+
+        ready = loop.create_future()
+        fd = connection.fileno()
+        add(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            remove(fd)
+
+
+class AsyncADCONDBClient:
+    """The historiandata fetch of ``ADCONDBClient``, awaitable.
+
+    Open one with ``await AsyncADCONDBClient.connect(...)``, which takes the
+    same arguments as ``ADCONDBClient`` bar the pool.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @classmethod
+    async def connect(cls, db_host, db_port, db_name, db_user, db_password, connect_timeout=None,
+                      statement_timeout=None):
+        options = {}
+        if connect_timeout is not None:
+            options["connect_timeout"] = connect_timeout
+        if statement_timeout is not None:
+            options["options"] = f"-c statement_timeout={int(statement_timeout)}"
+
+        with _stamping():
+            connection = psycopg2.connect(
+                host=db_host,
+                port=db_port,
+                password=db_password,
+                dbname=db_name,
+                user=db_user,
+                async_=1,
+                **options,
+            )
+            try:
+                await _wait(connection)
+            except BaseException:
+                connection.close()
+                raise
+
+        return cls(connection)
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    async def _execute(self, cursor, sql, parameters, deadline=None):
+        """Run ``sql`` and wait for its result until ``deadline``, a
+        ``time.monotonic()``, if any.
+
+        A statement still running at the deadline, or whose task is cancelled,
+        is cancelled on the server and the session closed: its result would
+        still be on its way, and nothing is left to read it.
+        """
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                raise RunDeadlineExceeded("The run's deadline passed before the fetch began.")
+
+        cursor.execute(sql, parameters)
+        try:
+            await asyncio.wait_for(_wait(self.connection), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            self.connection.cancel()
+            self.close()
+            if isinstance(e, asyncio.TimeoutError):
+                raise RunDeadlineExceeded("The run's deadline passed; its query was cancelled.") from e
+            raise
+
+    async def get_data_for_parameters(self, parameter_ids, start_date, end_date, station_timezone,
+                                      sampling_interval=DEFAULT_SAMPLING_INTERVAL, engine="rows", after=None,
+                                      compact=False, deadline=None):
+        """``ADCONDBClient.get_data_for_parameters``, without streaming:
+        ``(records, sources_count)`` for the window, counted the same way.
+
+        ``deadline`` is the run's, as a ``time.monotonic()``: the sessions are
+        shared by the links of a run, so it goes with each fetch rather than
+        with the client. One cancelled by the session's statement timeout
+        raises ``QueryCanceledError``, as on the blocking path.
+        """
+        if not parameter_ids:
+            raise ValueError("No parameter ids provided")
+
+        parameter_ids = list(parameter_ids)
+
+        with _stamping(), self.connection.cursor() as cursor:
+            await self._execute(cursor, _data_query(after=after is not None, dropped=_DROPPED_SELECT),
+                                _data_parameters(parameter_ids, start_date, end_date, after, sampling_interval,
+                                                 dropped=True),
+                                deadline)
+            data = cursor.fetchall()
+            columns = [column.name for column in cursor.description]
+
+        tag_index, end_index, _value_index = _positions(columns)
+        dropped = _take_dropped(data, tag_index, end_index)
+
+        return RESHAPE_ENGINES[engine](data, columns, station_timezone, compact), len(data) + dropped
+
+
+class AsyncServerSessions:
+    """At most ``max_size`` open clients to one server, reused across the
+    fetches of one run.
+
+    The bound is what keeps a run from opening one session per station link:
+    a fetch past it waits for a session to come back rather than opening
+    another. Borrow one with ``async with sessions.session() as client``, so
+    it comes back however the fetch ends, cancelled included.
+    """
+
+    def __init__(self, connect, max_size):
+        self.connect = connect
+        self.idle = []
+        self.available = asyncio.Semaphore(max_size)
+
+    async def acquire(self):
+        await self.available.acquire()
+        try:
+            if self.idle:
+                return self.idle.pop()
+            return await self.connect()
+        except BaseException:
+            self.available.release()
+            raise
+
+    def release(self, client, discard=False):
+        if discard or client.connection is None or client.connection.closed:
+            client.close()
+        else:
+            self.idle.append(client)
+        self.available.release()
+
+    @asynccontextmanager
+    async def session(self):
+        """A client for the block, released when it ends. One the block left
+        by a broken session, a cancellation or the deadline is closed rather
+        than reused: its statement may have been cancelled halfway."""
+        client = await self.acquire()
+        try:
+            yield client
+        except (psycopg2.OperationalError, RunDeadlineExceeded, asyncio.CancelledError):
+            self.release(client, discard=True)
+            raise
+        except BaseException:
+            self.release(client)
+            raise
+        else:
+            self.release(client)
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
@@ -8,6 +8,7 @@ class ADCONDBConfig(AppConfig):
     name = "adl_adcon_db_plugin"
 
     def ready(self):
+        from . import signals  # noqa: F401
         from .plugins import ADCONDBPlugin
 
         plugin_registry.register(ADCONDBPlugin())
@@ -0,0 +1,450 @@
+"""
+Benchmarks for the ingestion hot path, run against a live ADCON connection
+with ``adl adcon_db_benchmark <case> --station-link <id>``.
+
+Each case takes a client, the station link and a window in epoch seconds, and
+returns a flat dict of measurements for the command to print. Every case reads
+the window with the statement the fetch itself sends, its count of the dropped
+rows included, so that what it measures is what ingestion runs.
+
+The suite, ``adl adcon_db_benchmark_suite``, runs instead against a synthetic
+dataset of a given scale (see ``synthetic``), and keeps its results so that a
+run can be compared with the last one at the same scale.
+"""
+
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from . import synthetic
+from .db import (
+    _COPY_DROPPED_SELECT,
+    _COPY_SELECT,
+    _DROPPED_SELECT,
+    RESHAPE_ENGINES,
+    _data_parameters,
+    _data_query,
+    _execute_prepared,
+    _observation_time,
+    _positions,
+    _records_from_copy,
+    _take_copy_dropped,
+    _take_dropped,
+)
+from .metrics import FetchCost
+
+# How many times the statement-forms case runs through its statements.
+STATEMENT_FORM_ROUNDS = 5
+
+# The rows the suite's phased fetch takes per round trip.
+SUITE_BATCH = 2000
+
+# How far a run's rows per second may fall below the last run's at the same
+# scale before the suite reports it as a regression. Timings on a shared
+# machine wander by a good tenth between runs.
+REGRESSION_TOLERANCE = 0.2
+
+
+def _unbounded_data_query(tag_count):
+    # The data query as it stood while the sampling-interval filter still ran
+    # in Python: every row of the window crossed the network.
+    tag_ids_placeholders = ', '.join(['%s'] * tag_count)
+    return f"""
+        SELECT tag_id, enddate, startdate, measuringvalue
+        FROM historiandata
+        WHERE tag_id IN ({tag_ids_placeholders})
+        AND startdate >= %s
+        AND enddate <= %s
+        AND status = 0
+    """
+
+
+def _in_list_data_query(tag_count):
+    # The data query with the tag ids as a list of placeholders, as they were:
+    # a different statement for every number of tags a station maps.
+    tag_ids_placeholders = ', '.join(['%s'] * tag_count)
+    return _data_query(dropped=_DROPPED_SELECT).replace(
+        "tag_id = ANY(%s::int8[])", f"tag_id IN ({tag_ids_placeholders})")
+
+
+def _data_rows(cursor, parameter_ids, start_date, end_date, sampling_interval):
+    """The window's rows as the fetch reads them, by the same prepared
+    statement, and its columns and count of the dropped rows, taken out of the
+    rows."""
+    _execute_prepared(cursor, _data_query(dropped=_DROPPED_SELECT),
+                      _data_parameters(parameter_ids, start_date, end_date, None, sampling_interval, dropped=True))
+    return _without_count(cursor.fetchall(), cursor)
+
+
+def _without_count(rows, cursor):
+    columns = [column.name for column in cursor.description]
+    tag_index, end_index, _value_index = _positions(columns)
+    dropped = _take_dropped(rows, tag_index, end_index)
+    return rows, columns, dropped
+
+
+def benchmark_interval_filter(client, station_link, start_date, end_date):
+    """Rows transferred with the sampling-interval bounds evaluated by the
+    server, against the rows the unbounded query transferred."""
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    sampling_interval = station_link.network_connection.get_sampling_interval()
+
+    with client.connection.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(_unbounded_data_query(len(parameter_ids)), parameter_ids + [start_date, end_date])
+        unbounded_rows = len(cursor.fetchall())
+        unbounded_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows, _columns, dropped = _data_rows(cursor, parameter_ids, start_date, end_date, sampling_interval)
+        bounded_seconds = time.perf_counter() - started
+    bounded_rows = len(rows)
+
+    return {
+        "sampling_interval_seconds": f"{sampling_interval[0]}-{sampling_interval[1]}",
+        "rows_transferred_unbounded": unbounded_rows,
+        "rows_transferred_bounded": bounded_rows,
+        "rows_not_transferred": unbounded_rows - bounded_rows,
+        "rows_dropped_counted": dropped,
+        "transfer_reduction": f"{(1 - bounded_rows / unbounded_rows) if unbounded_rows else 0:.1%}",
+        "seconds_unbounded": round(unbounded_seconds, 4),
+        "seconds_bounded": round(bounded_seconds, 4),
+    }
+
+
+def benchmark_reshape_engines(client, station_link, start_date, end_date):
+    """CPU time of each reshape engine on the same fetched window."""
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    sampling_interval = station_link.network_connection.get_sampling_interval()
+
+    with client.connection.cursor() as cursor:
+        rows, columns, _dropped = _data_rows(cursor, parameter_ids, start_date, end_date, sampling_interval)
+
+    results = {"rows": len(rows)}
+
+    for name in ("rows", "columnar"):
+        reshape = RESHAPE_ENGINES[name]
+        started = time.process_time()
+        records = reshape(rows, columns, station_link.timezone)
+        results[f"{name}_cpu_seconds"] = round(time.process_time() - started, 4)
+        results[f"{name}_records"] = len(records)
+
+    return results
+
+
+def benchmark_fetch_engines(client, station_link, start_date, end_date):
+    """Wall time and peak Python memory of a whole fetch with each engine,
+    reading included."""
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    sampling_interval = station_link.network_connection.get_sampling_interval()
+
+    results = {}
+
+    for name in RESHAPE_ENGINES:
+        tracemalloc.start()
+        started = time.perf_counter()
+        records, sources_count = client.get_data_for_parameters(
+            parameter_ids, start_date, end_date, station_link.timezone,
+            sampling_interval=sampling_interval, engine=name)
+        results[f"{name}_seconds"] = round(time.perf_counter() - started, 4)
+        results[f"{name}_peak_mib"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+        results[f"{name}_records"] = len(records)
+
+    results["sources_count"] = sources_count
+
+    return results
+
+
+def benchmark_statement_forms(client, station_link, start_date, end_date):
+    """Wall time of the data query with the tag ids as a list of placeholders
+    and as the array parameter of a prepared statement.
+
+    The query is run for every leading subset of the link's tags in turn, as
+    for that many stations each mapping a different number of tags, and the
+    whole sequence repeated a few times, as over successive runs.
+    """
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    sampling_interval = list(station_link.network_connection.get_sampling_interval())
+    subsets = [parameter_ids[:count] for count in range(1, len(parameter_ids) + 1)] * STATEMENT_FORM_ROUNDS
+
+    results = {"statements": len(subsets)}
+
+    with client.connection.cursor() as cursor:
+        # Warm the server's buffers, so neither form pays for reading them in.
+        _data_rows(cursor, parameter_ids, start_date, end_date, sampling_interval)
+
+        rows = {}
+
+        started = time.perf_counter()
+        rows["in_list"] = 0
+        for tag_ids in subsets:
+            cursor.execute(_in_list_data_query(len(tag_ids)),
+                           tag_ids + [start_date, end_date] + sampling_interval * 2)
+            rows["in_list"] += len(_without_count(cursor.fetchall(), cursor)[0])
+        results["in_list_seconds"] = round(time.perf_counter() - started, 4)
+
+        started = time.perf_counter()
+        rows["prepared"] = 0
+        for tag_ids in subsets:
+            rows["prepared"] += len(_data_rows(cursor, tag_ids, start_date, end_date, sampling_interval)[0])
+        results["prepared_seconds"] = round(time.perf_counter() - started, 4)
+
+    for form in ("in_list", "prepared"):
+        results[f"{form}_ms_per_statement"] = round(results[f"{form}_seconds"] * 1000 / len(subsets), 3)
+        results[f"{form}_rows"] = rows[form]
+
+    return results
+
+
+def _held_mib(make):
+    """What the result of ``make()`` holds once made, and the peak while
+    making it, in MiB of Python allocations."""
+    tracemalloc.start()
+    try:
+        result = make()
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return round(held / 2 ** 20, 2), round(peak / 2 ** 20, 2)
+
+
+def benchmark_record_memory(client, station_link, start_date, end_date):
+    """The memory the window's records hold, as dicts and as compact records,
+    reshaped from the same fetched rows by each engine."""
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    sampling_interval = station_link.network_connection.get_sampling_interval()
+
+    with client.connection.cursor() as cursor:
+        rows, columns, _dropped = _data_rows(cursor, parameter_ids, start_date, end_date, sampling_interval)
+
+    results = {"rows": len(rows), "tags": len(parameter_ids)}
+
+    for name in ("rows", "columnar"):
+        reshape = RESHAPE_ENGINES[name]
+        for form, compact in (("dict", False), ("compact", True)):
+            held, peak = _held_mib(lambda: reshape(rows, columns, station_link.timezone, compact))
+            results[f"{name}_{form}_mib"] = held
+            results[f"{name}_{form}_peak_mib"] = peak
+
+        if results[f"{name}_dict_mib"]:
+            results[f"{name}_compact_ratio"] = round(results[f"{name}_compact_mib"] / results[f"{name}_dict_mib"], 2)
+
+    return results
+
+
+def benchmark_time_conversion(client, station_link, start_date, end_date):
+    """Nanoseconds per row of turning the window's enddates into aware
+    datetimes: once per row, as every row once was, and through
+    ``_observation_time``, with its cache cold and then warm."""
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    sampling_interval = station_link.network_connection.get_sampling_interval()
+
+    with client.connection.cursor() as cursor:
+        rows, columns, _dropped = _data_rows(cursor, parameter_ids, start_date, end_date, sampling_interval)
+    end_index = columns.index("enddate")
+    end_dates = [row[end_index] for row in rows]
+
+    results = {"rows": len(end_dates), "times": len(set(end_dates)), "tags": len(parameter_ids)}
+    if not end_dates:
+        return results
+
+    station_timezone = station_link.timezone
+
+    def per_row():
+        for end_date in end_dates:
+            datetime.fromtimestamp(end_date, tz=station_timezone)
+
+    def cached():
+        for end_date in end_dates:
+            _observation_time(end_date, station_timezone)
+
+    _observation_time.cache_clear()
+    for name, convert in (("per_row", per_row), ("cold_cache", cached), ("warm_cache", cached)):
+        started = time.perf_counter()
+        convert()
+        results[f"{name}_ns_per_row"] = round((time.perf_counter() - started) * 1e9 / len(end_dates))
+
+    return results
+
+
+CASES = {
+    "interval-filter": benchmark_interval_filter,
+    "reshape-engines": benchmark_reshape_engines,
+    "fetch-engines": benchmark_fetch_engines,
+    "statement-forms": benchmark_statement_forms,
+    "record-memory": benchmark_record_memory,
+    "time-conversion": benchmark_time_conversion,
+}
+
+
+def _synthetic_sampling_interval():
+    # Wide enough for the dataset's ten-minute rows, narrow enough to drop its
+    # one-minute ones.
+    return synthetic.STEP // 2, synthetic.STEP * 2
+
+
+def _phased_copy(client, parameters):
+    """``_phased_fetch`` of the copy engine, by its own COPY statement: the
+    COPY, which transfers the whole window as it runs, the parse of its stream
+    in place of a transfer of its own, and the reshape. None where the server
+    refuses the COPY, as the fetch would read by query instead."""
+    cost = FetchCost()
+    with client.connection.cursor() as cursor:
+        window = client._copy_window(
+            cursor, _data_query(select=_COPY_SELECT, dropped=_COPY_DROPPED_SELECT), parameters, cost)
+    if window is None:
+        return None
+
+    _take_copy_dropped(window)
+    started = time.perf_counter()
+    _records_from_copy(window, timezone.utc)
+
+    client.connection.rollback()
+
+    return {
+        "query": cost.seconds["execute"],
+        "transfer": cost.seconds["fetch"],
+        "reshape": time.perf_counter() - started,
+    }
+
+
+def _phased_fetch(client, parameter_ids, start_date, end_date, sampling_interval, engine):
+    """One window read by the statement the fetch sends, through a server-side
+    cursor, timed by phase: the query until its first batch arrives, the
+    transfer of the rest, and the reshape."""
+    parameters = _data_parameters(parameter_ids, start_date, end_date, None, sampling_interval, dropped=True)
+
+    if engine == "copy":
+        phased = _phased_copy(client, parameters)
+        if phased is not None:
+            return phased
+
+    started = time.perf_counter()
+    with client.connection.cursor(name="adl_adcon_benchmark") as cursor:
+        cursor.itersize = SUITE_BATCH
+        cursor.execute(_data_query(dropped=_DROPPED_SELECT), parameters)
+        rows = cursor.fetchmany(SUITE_BATCH)
+        queried = time.perf_counter()
+
+        while batch := cursor.fetchmany(SUITE_BATCH):
+            rows.extend(batch)
+        rows, columns, _dropped = _without_count(rows, cursor)
+    transferred = time.perf_counter()
+
+    RESHAPE_ENGINES[engine](rows, columns, timezone.utc)
+    reshaped = time.perf_counter()
+
+    client.connection.rollback()
+
+    return {
+        "query": queried - started,
+        "transfer": transferred - queried,
+        "reshape": reshaped - transferred,
+    }
+
+
+def benchmark_suite(client, stations, tags, days, engines):
+    """Fetch every synthetic station's whole window with each engine.
+
+    Returns ``{engine: measurements}``: rows and records fetched, wall time and
+    rows per second of ``get_data_for_parameters`` over all stations — the rows
+    counted by the same calls that were timed — the Python memory its records
+    hold for one station and its peak while making them, as dicts and as
+    compact records, and the time spent in each phase of a separate, phased
+    read of the same windows.
+    """
+    start_date, end_date = synthetic.window(days)
+    sampling_interval = _synthetic_sampling_interval()
+    results = {}
+
+    for engine in engines:
+        measurements = {"rows": 0, "records": 0, "query_seconds": 0, "transfer_seconds": 0, "reshape_seconds": 0}
+        first_station = synthetic.tag_ids(synthetic.station_ids(1)[0], tags)
+
+        # A first fetch, untimed, so that neither the engine's imports nor
+        # reading the server's buffers in count against it.
+        client.get_data_for_parameters(first_station, start_date, end_date, timezone.utc,
+                                       sampling_interval=sampling_interval, engine=engine)
+
+        started = time.perf_counter()
+        for station_id in synthetic.station_ids(stations):
+            records, _sources_count = client.get_data_for_parameters(
+                synthetic.tag_ids(station_id, tags), start_date, end_date, timezone.utc,
+                sampling_interval=sampling_interval, engine=engine)
+            measurements["records"] += len(records)
+            measurements["rows"] += client.last_cost.rows
+        measurements["seconds"] = time.perf_counter() - started
+
+        # Measured apart, so tracing allocations does not slow the timed run.
+        for form, compact in (("", False), ("compact_", True)):
+            held, peak = _held_mib(lambda: client.get_data_for_parameters(
+                first_station, start_date, end_date, timezone.utc,
+                sampling_interval=sampling_interval, engine=engine, compact=compact))
+            measurements[f"station_{form}records_mib"] = held
+            measurements[f"station_{form}peak_mib"] = peak
+
+        for station_id in synthetic.station_ids(stations):
+            phases = _phased_fetch(
+                client, synthetic.tag_ids(station_id, tags), start_date, end_date, sampling_interval, engine)
+            for phase, seconds in phases.items():
+                measurements[f"{phase}_seconds"] += seconds
+
+        measurements["rows_per_second"] = round(measurements["rows"] / measurements["seconds"]) \
+            if measurements["seconds"] else None
+        for name in ("seconds", "query_seconds", "transfer_seconds", "reshape_seconds"):
+            measurements[name] = round(measurements[name], 4)
+
+        results[engine] = measurements
+
+    return results
+
+
+def suite_run(source, stations, tags, days, results):
+    """What the suite keeps of one run: when, against what, at what scale."""
+    return {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "scale": {"stations": stations, "tags": tags, "days": days},
+        "results": results,
+    }
+
+
+def last_suite_run(path, source, scale):
+    """The latest run kept in ``path`` against the same source at the same
+    scale, or None."""
+    last = None
+
+    try:
+        with open(path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                run = json.loads(line)
+                if run["source"] == source and run["scale"] == scale:
+                    last = run
+    except FileNotFoundError:
+        return None
+
+    return last
+
+
+def keep_suite_run(path, run):
+    with open(path, "a") as file:
+        file.write(json.dumps(run) + "\n")
+
+
+def suite_regressions(previous, current):
+    """``{engine: (previous, current rows per second)}`` of the engines whose
+    throughput fell by more than ``REGRESSION_TOLERANCE`` since ``previous``."""
+    regressions = {}
+
+    for engine, measurements in current["results"].items():
+        before = previous["results"].get(engine, {}).get("rows_per_second")
+        after = measurements["rows_per_second"]
+        if before and after is not None and after < before * (1 - REGRESSION_TOLERANCE):
+            regressions[engine] = (before, after)
+
+    return regressions
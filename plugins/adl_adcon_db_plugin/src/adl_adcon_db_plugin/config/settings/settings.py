@@ -1,3 +1,11 @@
+import os
+from datetime import timedelta
+
+# How often every ADCON connection's local metadata mirror is refreshed: the
+# remote node_60 is read once per interval rather than once per page view.
+METADATA_MIRROR_REFRESH_MINUTES = 60
+
+
 def setup(settings):
     """
     This function is called after adl has setup its own Django settings file but
@@ -6,3 +14,17 @@ def setup(settings):
 
     settings.INSTALLED_APPS += ["some_custom_plugin_dep"]
     """
+    beat_schedule = getattr(settings, "CELERY_BEAT_SCHEDULE", None) or {}
+    beat_schedule["adl_adcon_db_plugin_refresh_metadata_mirrors"] = {
+        "task": "adl_adcon_db_plugin.tasks.refresh_metadata_mirrors",
+        "schedule": timedelta(minutes=METADATA_MIRROR_REFRESH_MINUTES),
+    }
+    settings.CELERY_BEAT_SCHEDULE = beat_schedule
+
+    # Who may scrape the metrics endpoint: a bearer token, and/or addresses or
+    # networks, comma separated. With neither, the endpoint refuses everyone.
+    settings.ADCON_DB_METRICS_TOKEN = os.environ.get("ADCON_DB_METRICS_TOKEN", "")
+    settings.ADCON_DB_METRICS_ALLOWED_IPS = [
+        network.strip() for network in os.environ.get("ADCON_DB_METRICS_ALLOWED_IPS", "").split(",")
+        if network.strip()
+    ]
@@ -1,8 +1,22 @@
+import hashlib
+import io
+import itertools
+import logging
+import threading
+import time
+import weakref
 from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache, wraps
 
 import psycopg2
 
+from . import metrics
+from .metrics import FetchCost
+from .records import CompactRecords
+
+logger = logging.getLogger(__name__)
+
 # The ingestion diagnostic's failure categories, keyed by the SQLSTATE the
 # server sent. The strings are written out rather than imported from core:
 # importing core's vocabulary would break this plugin at import time on an older
@@ -21,6 +35,87 @@ SQLSTATE_CATEGORIES = {
     "42501": "PERMISSION_DENIED",  # insufficient_privilege on a table
 }
 
+# How many tag ids one batched query carries. Past a few hundred the tag array
+# costs the planner more than the round trip it saves.
+BATCH_MAX_TAGS_PER_QUERY = 500
+
+# Server-side cursor names only have to be unique per session; a process-wide
+# counter makes them unique per process, which is simpler to reason about when
+# pooled sessions change hands.
+_cursor_names = itertools.count(1)
+
+# The sampling intervals, in seconds, whose rows are ingested: 10 and 15 minute
+# loggers, taking obs with greater than 3 minutes sampling and less than 20.
+# Each connection can set its own.
+DEFAULT_SAMPLING_INTERVAL = (3 * 60, 20 * 60)
+
+# An incremental fetch's high-watermark: only the rows ending after it. By
+# enddate rather than startdate, so a row of a slower logger that began before
+# the watermark and ended after it is still read.
+_AFTER_BOUND = "AND enddate > %s"
+
+# The SQLSTATEs with which a server refuses ``COPY ... TO STDOUT`` while still
+# answering the same SELECT: a role denied COPY by an extension or proxy
+# (insufficient_privilege), or a pooler or replica that does not speak the COPY
+# sub-protocol (feature_not_supported).
+COPY_REFUSED_SQLSTATES = {"42501", "0A000"}
+
+# What the copy engine selects. Every column is cast to a fixed-width type, and
+# a NULL value is flagged in a column of its own rather than sent as a NULL, so
+# every row of the binary stream has the same length and the whole stream can
+# be read as one NumPy record array.
+_COPY_SELECT = "tag_id::int8, enddate::int8, coalesce(measuringvalue::float8, 0), measuringvalue IS NULL"
+
+# A fetch's data query also counts the window's rows its interval bounds leave
+# out, in the same statement rather than a count of its own: one row more per
+# window, whose tag is the window's position negated — no tag has a negative
+# id — and whose enddate is the count, ``{count}`` below. A window that lost no
+# rows may have no such row. The copy engine's is in the copy engine's layout.
+_DROPPED_SELECT = "-1, {count}, NULL, NULL"
+_COPY_DROPPED_SELECT = "-1::int8, {count}::int8, 0::float8, false"
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+# The DSNs of the sessions whose server refused a COPY, so later fetches on
+# them go straight to the query. Kept for the life of the process: privileges
+# do not change between runs often enough to be worth a retry per fetch.
+_copy_refused = set()
+
+# The SQLSTATEs with which a session loses track of its prepared statements:
+# the backend was reset, or a pooler in transaction mode handed the statement
+# to a backend where it was never prepared (invalid_sql_statement_name) or was
+# prepared by another client (duplicate_prepared_statement). Preparing afresh
+# usually mends that; a second failure in a row means the server will keep
+# doing it.
+PREPARE_LOST_SQLSTATES = {"26000", "42P05"}
+
+# The SQLSTATEs with which a server refuses prepared statements outright, as a
+# pooler that does not pass PREPARE on at all does (feature_not_supported).
+PREPARE_REFUSED_SQLSTATES = {"0A000"}
+
+# The statements prepared on each open session, by name. Keyed weakly on the
+# connection, so a session that is closed takes its names with it; a pooled
+# one keeps them across borrows, which is the point.
+_prepared = weakref.WeakKeyDictionary()
+
+# The DSNs of the sessions that refused a prepared statement, so later fetches
+# on them run their queries as they are. Kept for the life of the process, as
+# with ``_copy_refused``.
+_prepare_refused = set()
+
+# The query behind each prepared statement's name, for the statement profiler
+# to show what an EXECUTE ran.
+_prepared_queries = {}
+
+# How many (enddate, timezone) conversions ``_observation_time`` remembers:
+# about four months of ten-minute times in one timezone, a few MiB at most.
+OBSERVATION_TIME_CACHE_SIZE = 16384
+
+
+class RunDeadlineExceeded(Exception):
+    """A client's deadline passed, and its query in flight, if any, was
+    cancelled on the server."""
+
 
 def category_for_sqlstate(pgcode):
     """The diagnostic failure category for a SQLSTATE, or None where it carries
@@ -62,8 +157,20 @@ def _stamping():
         raise
 
 
+def _cancellable(method):
+    """Run a fetch under the client's deadline; see ``_cancelling``."""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._cancelling():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class ADCONDBClient:
-    def __init__(self, db_host, db_port, db_name, db_user, db_password, connect_timeout=None):
+    def __init__(self, db_host, db_port, db_name, db_user, db_password, connect_timeout=None,
+                 pool=None, connection_id=None, profiler=None, statement_timeout=None, deadline=None):
         # connect_timeout defaults to None, which is today's unbounded ingestion
         # connect. The diagnostic's on-demand checks pass a bound; bounding
         # ingestion would change runtime behaviour across deployments for
@@ -72,20 +179,108 @@ class ADCONDBClient:
         if connect_timeout is not None:
             options["connect_timeout"] = connect_timeout
 
+        # statement_timeout, in milliseconds, is set for the session at
+        # connect, so the server itself cancels a statement that overruns it.
+        if statement_timeout is not None:
+            options["options"] = f"-c statement_timeout={int(statement_timeout)}"
+
+        connect_kwargs = dict(
+            host=db_host,
+            port=db_port,
+            password=db_password,
+            dbname=db_name,
+            user=db_user,
+            **options,
+        )
+
+        # With a pool the connection is borrowed rather than owned: the pool
+        # opens it with these same arguments when it has none idle, and close()
+        # hands it back instead of ending the session.
+        self.pool = pool
+
+        # The ADCONDBConnection whose counters in ``metrics`` this client's
+        # fetches are added to; without one they are counted nowhere. The cost
+        # of the latest fetch is kept on the client either way.
+        self.connection_id = connection_id
+        self.last_cost = None
+
+        started = time.perf_counter()
         with _stamping():
-            self.connection = psycopg2.connect(
-                host=db_host,
-                port=db_port,
-                password=db_password,
-                dbname=db_name,
-                user=db_user,
-                **options,
-            )
+            if pool is not None:
+                self.connection = pool.getconn(connect_kwargs)
+            else:
+                self.connection = psycopg2.connect(**connect_kwargs)
+        self._connect_seconds = time.perf_counter() - started
+
+        # With a ``profiling.StatementProfiler``, every cursor of the session
+        # notes its statements there until close().
+        self.profiler = profiler
+        if profiler is not None:
+            self.connection.cursor_factory = profiler.cursor_factory()
+
+        # A time.monotonic() past which the client's fetches are cancelled.
+        self.deadline = deadline
+
+    @contextmanager
+    def _cancelling(self):
+        """Cancel the statement in flight once the deadline passes, and leave
+        the session usable after any cancelled statement.
+
+        The cancel is sent from a timer thread, as ``connection.cancel()``
+        asks the server to stop whatever the session is running: a blocked
+        libpq call does not return to Python until the server answers, so
+        nothing in this thread could interrupt it. A cancelled statement,
+        whether by the deadline or by the session's ``statement_timeout``,
+        raises ``QueryCanceledError``; it is rolled back here and, past the
+        deadline, raised as ``RunDeadlineExceeded`` instead.
+        """
+        timer = None
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise RunDeadlineExceeded("The run's deadline passed before the fetch began.")
+
+            timer = threading.Timer(remaining, self.connection.cancel)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            yield
+        except psycopg2.extensions.QueryCanceledError as e:
+            self.connection.rollback()
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise RunDeadlineExceeded("The run's deadline passed; its query was cancelled.") from e
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def _finish(self, cost):
+        """Keep a completed fetch's cost, and add it to the connection's
+        counters. The connect is charged to the client's first fetch."""
+        cost.seconds["connect"] += self._connect_seconds
+        self._connect_seconds = 0.0
+        self.last_cost = cost
+
+        if self.connection_id is not None:
+            metrics.record(self.connection_id, cost)
 
     def close(self):
-        if self.connection:
+        if not self.connection:
+            return
+
+        if self.profiler is not None:
+            # A pooled session goes back to its next borrower unprofiled.
+            self.connection.cursor_factory = psycopg2.extensions.cursor
+            self.profiler.flush()
+
+        if self.pool is not None:
+            self.pool.putconn(self.connection)
+        else:
             self.connection.close()
 
+        self.connection = None
+
     def ping_readonly(self):
         """One trivial round trip on a server-enforced read-only session.
 
@@ -130,64 +325,889 @@ class ADCONDBClient:
 
         return parameters
 
-    def get_data_for_parameters(self, parameter_ids, start_date, end_date, station_timezone):
+    def get_station_digests(self):
+        """``{station id: md5}`` of every DeviceNode row, computed by the
+        server so only the digests cross the network."""
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, md5(ROW(id, displayname, latitude, longitude, timezoneid)::text)
+                FROM node_60
+                WHERE dtype = 'DeviceNode'
+            """)
+            return dict(cursor.fetchall())
+
+    def get_parameter_digests(self):
+        """``{station id: md5}`` of each station's AnalogTagNode rows taken
+        together, one digest per station rather than one per tag."""
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT parent_id, md5(string_agg(ROW(id, displayname, subclass)::text, ',' ORDER BY id))
+                FROM node_60
+                WHERE dtype = 'AnalogTagNode'
+                GROUP BY parent_id
+            """)
+            return dict(cursor.fetchall())
+
+    def get_stations_by_ids(self, station_ids):
+        """``get_stations`` for the given station ids only."""
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute(
+                """SELECT id, displayname, latitude, longitude, timezoneid
+                   FROM node_60
+                   WHERE dtype = 'DeviceNode'
+                     AND id = ANY(%s)""", (list(station_ids),)
+            )
+            stations = cursor.fetchall()
+
+        return [dict(zip([column.name for column in cursor.description], station)) for station in stations]
+
+    def get_station(self, station_id):
+        """One station's row as ``get_stations`` lists it, or None where there
+        is no such station. A lookup by primary key, so only the matching row
+        is read and transferred."""
+        stations = self.get_stations_by_ids([station_id])
+        return stations[0] if stations else None
+
+    def get_station_summaries(self, station_ids):
+        """``{station id: (displayname, parameter count)}`` for those of the
+        given stations that exist, in one query however many are asked for.
+
+        The count is of the station's AnalogTagNode rows, the ones
+        ``get_adcon_parameters_for_station`` lists.
+        """
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute(
+                """SELECT station.id, station.displayname, count(DISTINCT tag.id)
+                   FROM node_60 station
+                   LEFT JOIN node_60 tag
+                     ON tag.parent_id = station.id
+                    AND tag.dtype = 'AnalogTagNode'
+                   WHERE station.dtype = 'DeviceNode'
+                     AND station.id = ANY(%s)
+                   GROUP BY station.id, station.displayname""", (list(station_ids),)
+            )
+            rows = cursor.fetchall()
+
+        return {station_id: (displayname, count) for station_id, displayname, count in rows}
+
+    def get_adcon_parameters_for_stations(self, adcon_station_ids):
+        """``get_adcon_parameters_for_station`` for many stations in one query,
+        each row carrying its station's id as ``parent_id``."""
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute(
+                """SELECT DISTINCT id, displayname, subclass, parent_id
+                   FROM node_60
+                   WHERE dtype = 'AnalogTagNode'
+                     and parent_id = ANY(%s)""", (list(adcon_station_ids),)
+            )
+            parameters = cursor.fetchall()
+
+        return [dict(zip([column.name for column in cursor.description], parameter)) for parameter in parameters]
+
+    @_cancellable
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, station_timezone,
+                                itersize=None, sampling_interval=DEFAULT_SAMPLING_INTERVAL, engine="rows", after=None,
+                                compact=False):
         """Fetch the window's rows, returning ``(records, sources_count)``.
 
-        The count is of the rows the query returned, taken once the fetch is
-        materialised and before the reshaping below — which drops rows outside
-        the sampling interval and collapses the rest by timestamp, so a count
-        taken after it would let our own handling read as the source having
-        offered nothing. The WHERE clause carries the window, so the result is
-        the count. It leaves the client by return value because the station link
-        it is reported on belongs to the plugin, not here.
+        Only rows whose sampling interval — ``enddate - startdate``, in seconds
+        — lies within ``sampling_interval`` are transferred; the server drops
+        the rest. The count, though, is of every row in the window: the same
+        statement counts the rows the interval bounds dropped (see
+        ``_DROPPED_SELECT``), and they are added to those kept. A logger
+        sampling at an interval we drop has still offered rows, and a count of
+        what we kept would let our own handling read as the source having
+        offered nothing. It leaves the client by return value because the
+        station link it is reported on belongs to the plugin, not here.
+
+        With an ``itersize`` the rows are streamed through a server-side cursor
+        instead (see ``stream_data_for_parameters``), so the raw rows held are
+        those of one round trip rather than the whole window's. The window's
+        records are still all held, and the plugin joins a run's windows before
+        handing them to core: memory is bounded by one round trip's rows plus
+        the records of the run, which ``backfill_slices_per_run`` limits. The
+        result is the same but for record order, which is then by observation
+        time.
+
+        ``engine`` picks how a materialised window is reshaped; see
+        ``RESHAPE_ENGINES``. Every engine returns the same records. The
+        ``"copy"`` engine also changes how the window is read: by a binary
+        ``COPY`` parsed straight into NumPy arrays (see ``_copy_window``),
+        falling back to the query where the server refuses the COPY.
+
+        ``after``, an epoch ``enddate``, narrows the window — the count with it
+        — to the rows ending strictly after it: the high-watermark of an
+        incremental fetch, below which everything was handed over already.
+
+        With ``compact`` the records are ``records.CompactRecord``s: read-only
+        mappings with the same keys and values as the dicts, in about half the
+        memory on a window of many tags. ``records.as_dicts`` turns them back.
+
+        A fetch still running at the client's ``deadline`` is cancelled and
+        raises ``RunDeadlineExceeded``; one cancelled by the session's
+        statement timeout raises ``QueryCanceledError``.
+
+        The fetch's ``metrics.FetchCost`` is left on ``last_cost``.
         """
 
-        # tag_id is the ADCON parameter id
-        # status=0 means the data is valid
+        if itersize:
+            stream = self.stream_data_for_parameters(
+                parameter_ids, start_date, end_date, station_timezone, itersize=itersize,
+                sampling_interval=sampling_interval, after=after, compact=compact)
+            records = list(stream)
+            return records, stream.sources_count
 
         if not parameter_ids:
             raise ValueError("No parameter ids provided")
 
-        tag_ids_placeholders = ', '.join(['%s'] * len(parameter_ids))
-        query = f"""
-            SELECT tag_id, enddate, startdate, measuringvalue
-            FROM historiandata
-            WHERE tag_id IN ({tag_ids_placeholders})
-            AND startdate >= %s
-            AND enddate <= %s
-            AND status = 0
+        parameter_ids = list(parameter_ids)
+        cost = FetchCost()
+
+        with _stamping(), self.connection.cursor() as conn_cursor:
+            parameters = _data_parameters(parameter_ids, start_date, end_date, after, sampling_interval,
+                                          dropped=True)
+
+            if engine == "copy":
+                window = self._copy_window(
+                    conn_cursor,
+                    _data_query(select=_COPY_SELECT, after=after is not None, dropped=_COPY_DROPPED_SELECT),
+                    parameters, cost)
+                if window is not None:
+                    cost.rows_dropped = _take_copy_dropped(window)
+                    with cost.phase("reshape"):
+                        records = _records_from_copy(window, station_timezone, compact)
+                    cost.rows = len(window["tag_id"])
+                    self._finish(cost)
+                    return records, cost.rows + cost.rows_dropped
+
+            with cost.phase("execute"):
+                _execute_prepared(conn_cursor, _data_query(after=after is not None, dropped=_DROPPED_SELECT),
+                                  parameters)
+
+            with cost.phase("fetch"):
+                data = conn_cursor.fetchall()
+            columns = [column.name for column in conn_cursor.description]
+
+        tag_index, end_index, _value_index = _positions(columns)
+        cost.rows_dropped = _take_dropped(data, tag_index, end_index)
+
+        with cost.phase("reshape"):
+            records = RESHAPE_ENGINES[engine](data, columns, station_timezone, compact)
+
+        cost.rows = len(data)
+        self._finish(cost)
+
+        return records, cost.rows + cost.rows_dropped
+
+    def stream_data_for_parameters(self, parameter_ids, start_date, end_date, station_timezone,
+                                   itersize=2000, sampling_interval=DEFAULT_SAMPLING_INTERVAL, after=None,
+                                   compact=False):
+        """Fetch the window through a server-side cursor, ``itersize`` rows per
+        round trip.
+
+        Returns an ``ObservationStream`` yielding the window's records in
+        observation-time order, each as soon as its last row has arrived, so
+        the rows it holds are bounded by ``itersize`` however long the window;
+        the records are the caller's to keep or let go. Its
+        ``sources_count`` is the same count ``get_data_for_parameters`` returns,
+        taken by the same statement, and is only set once the stream has been
+        read to the end: a stream abandoned or broken halfway has made no claim
+        about the source.
         """
+        if not parameter_ids:
+            raise ValueError("No parameter ids provided")
 
-        parameters = parameter_ids + [start_date, end_date]
+        return ObservationStream(self.connection, list(parameter_ids), start_date, end_date,
+                                 station_timezone, itersize, sampling_interval, after, on_complete=self._finish,
+                                 compact=compact)
 
-        with _stamping(), self.connection.cursor() as conn_cursor:
-            conn_cursor.execute(query, parameters)
+    @_cancellable
+    def get_data_for_parameter_groups(self, groups, max_tags_per_query=BATCH_MAX_TAGS_PER_QUERY,
+                                      sampling_interval=DEFAULT_SAMPLING_INTERVAL, engine="rows", watermarks=None,
+                                      compact=False):
+        """Fetch many station links' windows in as few queries as possible.
+
+        ``groups`` maps a caller's key to ``(parameter_ids, start_date,
+        end_date, station_timezone)``, one entry per station link; the result
+        maps the same keys to ``(records, sources_count)``, each exactly what
+        ``get_data_for_parameters`` would have returned for that entry alone.
+
+        Groups whose windows overlap share one query over the union of their
+        windows, split into chunks of at most ``max_tags_per_query`` tag ids.
+        Each returned row is handed to the groups owning its tag and then held
+        to that group's own window. The rows the interval bounds dropped are
+        counted per group by the same statement, each over the group's own tags
+        and window, so a link's count is of the rows its own query would have
+        counted — no more because a neighbour's window was wider. The windows
+        go as arrays, so the statement is prepared once whatever their
+        number.
+
+        The ``"copy"`` engine reads by query here, like ``"columnar"``: a batch
+        is many short windows, where a COPY costs more to set up than it saves.
+
+        ``watermarks`` maps keys to the ``after`` of
+        ``get_data_for_parameters``; a shared query only leaves out the rows
+        below a watermark when every group in it has one.
+
+        Each shared query's cost is counted as a fetch of its own; their total
+        is left on ``last_cost``.
+        """
+        if any(not group[0] for group in groups.values()):
+            raise ValueError("No parameter ids provided")
 
-            data = conn_cursor.fetchall()
+        watermarks = watermarks or {}
+        results = {}
+        costs = []
 
-            # organize the data by dates
-            parameter_data_by_date = {}
+        for cluster in _overlapping_windows(groups):
+            owners = {}
+            for key in cluster:
+                for tag_id in groups[key][0]:
+                    owners.setdefault(tag_id, []).append(key)
+
+            window_start = min(groups[key][1] for key in cluster)
+            window_end = max(groups[key][2] for key in cluster)
+
+            window_after = None
+            if all(watermarks.get(key) is not None for key in cluster):
+                window_after = min(watermarks[key] for key in cluster)
+
+            rows_by_key = {key: [] for key in cluster}
+            dropped_by_key = {key: 0 for key in cluster}
+            positions = {key: position for position, key in enumerate(cluster, start=1)}
+            windows = [[groups[key][1] for key in cluster], [groups[key][2] for key in cluster],
+                       [watermarks.get(key) for key in cluster]]
+            columns = None
+            cost = FetchCost()
+
+            tag_ids = list(owners)
+            for offset in range(0, len(tag_ids), max_tags_per_query):
+                chunk = tag_ids[offset:offset + max_tags_per_query]
+                owned = [(tag_id, positions[key]) for tag_id in chunk for key in owners[tag_id]]
+
+                with _stamping(), self.connection.cursor() as conn_cursor:
+                    with cost.phase("execute"):
+                        _execute_prepared(
+                            conn_cursor, _group_data_query(after=window_after is not None),
+                            _data_parameters(chunk, window_start, window_end, window_after, sampling_interval)
+                            + [[tag_id for tag_id, _position in owned], [position for _tag_id, position in owned]]
+                            + windows + list(sampling_interval))
+
+                    with cost.phase("fetch"):
+                        data = conn_cursor.fetchall()
+                    columns = [column.name for column in conn_cursor.description]
+
+                tag_index = columns.index("tag_id")
+                start_index = columns.index("startdate")
+                end_index = columns.index("enddate")
+
+                for data_point in data:
+                    if data_point[tag_index] < 0:
+                        dropped_by_key[cluster[-data_point[tag_index] - 1]] += data_point[end_index]
+                        continue
+
+                    cost.rows += 1
+                    for key in owners[data_point[tag_index]]:
+                        _parameter_ids, start_date, end_date, _tz = groups[key]
+                        after = watermarks.get(key)
+                        if data_point[start_index] >= start_date and data_point[end_index] <= end_date \
+                                and (after is None or data_point[end_index] > after):
+                            rows_by_key[key].append(data_point)
+
+            with cost.phase("reshape"):
+                for key, rows in rows_by_key.items():
+                    results[key] = (RESHAPE_ENGINES[engine](rows, columns, groups[key][3], compact),
+                                    len(rows) + dropped_by_key[key])
+
+            cost.rows_dropped = sum(dropped_by_key.values())
+            self._finish(cost)
+            costs.append(cost)
+
+        # The batch's cost as a whole, rather than its last query's.
+        self.last_cost = FetchCost.total(costs)
+
+        return results
+
+    def get_tag_activity(self, adcon_station_id, since):
+        """``{tag_id: (last value, last enddate, rows)}`` for a station's tags,
+        over their valid rows ending after ``since``, an epoch.
+
+        One query for the whole station, however many tags it has: the tags
+        are read from ``node_60`` by the server, and each tag's latest row and
+        row count taken in the same pass. Tags without such rows are left out.
+        """
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute(
+                """SELECT DISTINCT ON (tag_id) tag_id, measuringvalue, enddate,
+                          count(*) OVER (PARTITION BY tag_id)
+                   FROM historiandata
+                   WHERE tag_id IN (SELECT id FROM node_60
+                                    WHERE dtype = 'AnalogTagNode' AND parent_id = %s)
+                     AND enddate > %s
+                     AND status = 0
+                   ORDER BY tag_id, enddate DESC, id DESC""", (adcon_station_id, since)
+            )
+            rows = cursor.fetchall()
+
+        return {tag_id: (value, end_date, count) for tag_id, value, end_date, count in rows}
+
+    def get_bucket_digests(self, parameter_ids, start_date, end_date, bucket_seconds, cut=None,
+                           sampling_interval=DEFAULT_SAMPLING_INTERVAL):
+        """How many rows the window holds per tag and per bucket of
+        ``enddate``, and the highest row id among them — computed by the
+        server, so only the digests cross the network.
+
+        A bucket holds the rows ending in ``(bucket_start, bucket_start +
+        bucket_seconds]``, with bucket starts on multiples of
+        ``bucket_seconds``. A row arriving late, or replaced, changes its
+        bucket's count or highest id without anything else being read.
+
+        Returns ``{bucket_start: {tag_id: (count, max_id, cut_count,
+        cut_max_id)}}``, the last two over only the bucket's rows ending by
+        ``cut``: what an earlier digest taken at ``cut`` saw of the same
+        bucket. They are the first two where no ``cut`` is given.
+        """
+        if not parameter_ids:
+            raise ValueError("No parameter ids provided")
+
+        if cut is None:
+            cut = end_date
+
+        bucket_seconds = int(bucket_seconds)
+        select = (f"tag_id, (enddate - 1) / {bucket_seconds} * {bucket_seconds} AS bucket, count(*), max(id), "
+                  f"count(*) FILTER (WHERE enddate <= %s), max(id) FILTER (WHERE enddate <= %s)")
+
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute(
+                _data_query(select=select) + " GROUP BY 1, 2",
+                [cut, cut] + _window_parameters(parameter_ids, start_date, end_date) + list(sampling_interval))
+            rows = cursor.fetchall()
 
-            for data_point in data:
-                data_point = dict(zip([column.name for column in conn_cursor.description], data_point))
+        digests = {}
+        for tag_id, bucket_start, count, max_id, cut_count, cut_max_id in rows:
+            digests.setdefault(bucket_start, {})[tag_id] = (count, max_id, cut_count, cut_max_id)
 
-                end_date = datetime.fromtimestamp(data_point['enddate'], tz=station_timezone)
-                start_date = datetime.fromtimestamp(data_point['startdate'], tz=station_timezone)
-                tag_id = data_point['tag_id']
+        return digests
 
-                time_diff = (end_date - start_date).total_seconds() / 60
+    def explain(self, query, parameters, analyze=True):
+        """The server's plan for a query, as ``EXPLAIN``'s JSON document.
 
-                # 10 and 15 minutes interval,
-                # take obs with greater than 3 minutes sampling and less than 20
-                if 3 <= time_diff < 20:
-                    data_point["enddate"] = end_date
-                    data_point["startdate"] = start_date
+        With ``analyze`` the query is run, and the plan carries the actual rows,
+        timings and buffers of each node. It is run inside a transaction that
+        is then rolled back, though the queries explained here only read.
+        """
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+
+        try:
+            with _stamping(), self.connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN ({options}) {query}", parameters)
+                plan = cursor.fetchone()[0]
+        finally:
+            self.connection.rollback()
+
+        return plan[0]
+
+    def get_table_indexes(self, table="historiandata"):
+        """``[(name, definition, key columns)]`` of a table's indexes, the key
+        columns in index order and without any ``INCLUDE`` columns."""
+        with _stamping(), self.connection.cursor() as cursor:
+            cursor.execute(
+                """SELECT i.indexrelid::regclass::text,
+                          pg_get_indexdef(i.indexrelid),
+                          array(SELECT a.attname
+                                FROM unnest(i.indkey[0:i.indnkeyatts - 1]) WITH ORDINALITY AS k(attnum, n)
+                                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                                ORDER BY k.n)
+                   FROM pg_index i
+                   WHERE i.indrelid = to_regclass(%s)
+                   ORDER BY 1""", (table,)
+            )
+            return cursor.fetchall()
+
+    def _copy_window(self, cursor, query, parameters, cost):
+        """A data query's rows as NumPy columns, read by a binary COPY.
+
+        ``COPY`` takes no bound parameters, so the query is bound client-side
+        with ``mogrify`` first — the same quoting ``execute`` would have used.
+        The stream is held as received, about 43 bytes a row, and parsed
+        without ever building a Python tuple per row.
+
+        Returns None where the server refuses the COPY, having rolled the
+        refused statement back so the session can run the query instead. Any
+        other error propagates as it would from the query.
+        """
+        dsn = self.connection.dsn
+        if dsn in _copy_refused:
+            return None
+
+        query = cursor.mogrify(query, parameters).decode()
+        stream = io.BytesIO()
+
+        try:
+            with cost.phase("execute"):
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", stream)
+        except psycopg2.Error as e:
+            if e.pgcode not in COPY_REFUSED_SQLSTATES:
+                raise
+
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] The server refused a binary COPY ({e.pgcode}); "
+                           f"reading by query instead. {e}")
+            self.connection.rollback()
+            _copy_refused.add(dsn)
+            return None
+
+        cost.bytes = stream.getbuffer().nbytes
+        with cost.phase("fetch"):
+            return _parse_copy_binary(stream.getbuffer())
+
+
+class ObservationStream:
+    """The records of one window, read from a server-side cursor.
+
+    Iterate it once. The rows arrive ordered by ``enddate``, so a record is
+    complete as soon as a row with a later ``enddate`` turns up.
+
+    Read to the end, its ``cost`` is complete and handed to ``on_complete``.
+    The time the caller spends between records is not the stream's, and is
+    left out.
+
+    With ``compact`` it yields ``records.CompactRecord``s, sharing one map of
+    tag positions across the window.
+    """
+
+    def __init__(self, connection, parameter_ids, start_date, end_date, station_timezone, itersize,
+                 sampling_interval, after=None, on_complete=None, compact=False):
+        self.connection = connection
+        self.parameter_ids = parameter_ids
+        self.start_date = start_date
+        self.end_date = end_date
+        self.station_timezone = station_timezone
+        self.itersize = itersize
+        self.sampling_interval = sampling_interval
+        self.after = after
+        self.sources_count = None
+        self.cost = FetchCost()
+        self.on_complete = on_complete
+        self.compact = compact
+
+    def __iter__(self):
+        record = None
+        builder = CompactRecords() if self.compact else None
+        cost = self.cost
+        rows = 0
+        dropped = 0
+
+        with _stamping():
+            with self.connection.cursor(name=f"adl_adcon_stream_{next(_cursor_names)}") as cursor:
+                cursor.itersize = self.itersize
+                with cost.phase("execute"):
+                    # The count row's enddate is a count, far below any
+                    # observation's, so it is the first row.
+                    cursor.execute(
+                        _data_query(after=self.after is not None, dropped=_DROPPED_SELECT) + " ORDER BY enddate",
+                        _data_parameters(self.parameter_ids, self.start_date, self.end_date, self.after,
+                                         self.sampling_interval, dropped=True))
+
+                positions = None
+                current = None
+                reading_since = time.perf_counter()
+
+                for data_point in cursor:
+                    if positions is None:
+                        # A named cursor only describes its result once the
+                        # first batch has been fetched.
+                        positions = _positions([column.name for column in cursor.description])
+                    tag_index, end_index, value_index = positions
+
+                    end_date = data_point[end_index]
+
+                    if data_point[tag_index] < 0:
+                        dropped += end_date
+                        continue
+                    rows += 1
+
+                    if record is not None and end_date != current:
+                        cost.seconds["fetch"] += time.perf_counter() - reading_since
+                        yield builder.records()[0] if builder is not None else record
+                        reading_since = time.perf_counter()
+                        record = None
+
+                    if record is None:
+                        current = end_date
+                        observation_time = _observation_time(end_date, self.station_timezone)
+                        record = builder.add(observation_time) if builder is not None else {"observation_time": observation_time}
+
+                    if builder is not None:
+                        builder.set(record, data_point[tag_index], data_point[value_index])
+                    else:
+                        record[data_point[tag_index]] = data_point[value_index]
+
+                cost.seconds["fetch"] += time.perf_counter() - reading_since
+
+        cost.rows = rows
+        cost.rows_dropped = dropped
+
+        if record is not None:
+            yield builder.records()[0] if builder is not None else record
+
+        self.sources_count = rows + dropped
+        if self.on_complete is not None:
+            self.on_complete(cost)
+
+
+def _data_query(select="tag_id, enddate, startdate, measuringvalue", after=False, dropped=None):
+    # tag_id is the ADCON parameter id
+    # status=0 means the data is valid
+    # the interval bounds take the place of the sampling filter that used to
+    # run here, in Python, after every row had been transferred
+    # the tag ids are one array parameter, so the text is the same however
+    # many a station has, and the server can reuse one plan for all of them
+    # with dropped, the window is read once, into a materialised CTE, and both
+    # the rows kept and the count of what the bounds left out are taken from
+    # it: historiandata is scanned once, and the interval bounds are taken
+    # twice, after the window's parameters
+    window = f"""
+        FROM historiandata
+        WHERE tag_id = ANY(%s::int8[])
+        AND startdate >= %s
+        AND enddate <= %s
+        {_AFTER_BOUND if after else ""}
+        AND status = 0"""
+    if dropped is None:
+        return f"""
+        SELECT {select}{window}
+        AND enddate - startdate >= %s
+        AND enddate - startdate < %s
+    """
+
+    count = "count(*) FILTER (WHERE NOT (enddate - startdate >= %s AND enddate - startdate < %s))"
+    return f"""
+        WITH window_rows AS MATERIALIZED (
+            SELECT tag_id, enddate, startdate, measuringvalue{window}
+        )
+        SELECT {select}
+        FROM window_rows
+        WHERE enddate - startdate >= %s
+        AND enddate - startdate < %s
+        UNION ALL
+        SELECT {dropped.format(count=count)}
+        FROM window_rows
+    """
+
+
+def _group_data_query(after=False):
+    """``_data_query`` over many windows' union, with the rows each window's
+    interval bounds left out counted as it counts them.
+
+    The windows' bounds and watermarks are arrays, and which windows each tag
+    belongs to two parallel arrays of tag ids and window positions, so the text
+    is the same whatever the number of windows.
+    """
+    return _data_query(after=after) + """UNION ALL
+        SELECT -w.window_position, count(*), NULL, NULL
+        FROM unnest(%s::int8[], %s::int8[]) AS o(tag_id, window_position)
+        JOIN unnest(%s::int8[], %s::int8[], %s::int8[])
+            WITH ORDINALITY AS w(startdate, enddate, watermark, window_position)
+            USING (window_position)
+        JOIN historiandata h ON h.tag_id = o.tag_id
+        AND h.startdate >= w.startdate
+        AND h.enddate <= w.enddate
+        AND (w.watermark IS NULL OR h.enddate > w.watermark)
+        AND h.status = 0
+        AND NOT (h.enddate - h.startdate >= %s AND h.enddate - h.startdate < %s)
+        GROUP BY w.window_position
+    """
+
+
+def _window_parameters(parameter_ids, start_date, end_date, after=None):
+    """The parameters of a window's tag ids and bounds, in the order the
+    queries above take them; ``after`` only where there is one."""
+    parameters = [list(parameter_ids), start_date, end_date]
+    if after is not None:
+        parameters.append(after)
+    return parameters
+
+
+def _data_parameters(parameter_ids, start_date, end_date, after, sampling_interval, dropped=False):
+    """The parameters of ``_data_query`` for a window, the interval bounds
+    twice over where it counts what it drops."""
+    parameters = _window_parameters(parameter_ids, start_date, end_date, after) + list(sampling_interval)
+    return parameters + list(sampling_interval) if dropped else parameters
+
+
+def _take_dropped(data, tag_index, end_index):
+    """Take a window's count row out of its data query's rows, returning the
+    count. The server appends a UNION ALL's branches in order, so it is the
+    last row but for a plan that interleaves them."""
+    if data and data[-1][tag_index] < 0:
+        return data.pop()[end_index]
+
+    for position, data_point in enumerate(data):
+        if data_point[tag_index] < 0:
+            return data.pop(position)[end_index]
+
+    return 0
+
+
+def _take_copy_dropped(window):
+    """``_take_dropped`` for the columns ``_parse_copy_binary`` returns."""
+    counted = window["tag_id"] < 0
+    if not counted.any():
+        return 0
+
+    dropped = int(window["enddate"][counted].sum())
+    for name, column in window.items():
+        window[name] = column[~counted]
+    return dropped
+
+
+def _statement_name(query):
+    return f"adl_adcon_{hashlib.md5(query.encode()).hexdigest()[:16]}"
+
+
+def _numbered(query):
+    """A query's ``%s`` placeholders as the ``$1``, ``$2``… PREPARE takes."""
+    head, *rest = query.split("%s")
+    return head + "".join(f"${number}{part}" for number, part in enumerate(rest, 1))
+
+
+def _execute_prepared(cursor, query, parameters):
+    """Execute a query as a server-side prepared statement of the cursor's
+    session, preparing it there on its first use.
+
+    The server then plans it once per session rather than once per run, for
+    every station link fetched over a pooled session. A session that lost its
+    statements forgets them all and prepares the query once more. One that
+    refuses prepared statements, or loses them again straight away, has the
+    failed statement rolled back and the query run as it is, as do all later
+    ones to the same server.
+    """
+    connection = cursor.connection
+    dsn = connection.dsn
+
+    if dsn not in _prepare_refused:
+        name = _statement_name(query)
+        for attempt in range(2):
+            prepared = _prepared.setdefault(connection, set())
+            try:
+                if name not in prepared:
+                    _prepared_queries[name] = query
+                    cursor.execute(f"PREPARE {name} AS {_numbered(query)}")
+                    prepared.add(name)
+                cursor.execute(f"EXECUTE {name}({', '.join(['%s'] * len(parameters))})", parameters)
+                return
+            except psycopg2.Error as e:
+                if e.pgcode not in PREPARE_LOST_SQLSTATES | PREPARE_REFUSED_SQLSTATES:
+                    raise
+
+                connection.rollback()
+                prepared.clear()
+
+                if e.pgcode in PREPARE_LOST_SQLSTATES and attempt == 0:
+                    logger.debug(f"[ADL_ADCON_DB_PLUGIN] The session lost its prepared statements "
+                                 f"({e.pgcode}); preparing them again.")
+                    continue
+
+                logger.warning(f"[ADL_ADCON_DB_PLUGIN] The server refused a prepared statement "
+                               f"({e.pgcode}); running queries as they are instead. {e}")
+                _prepare_refused.add(dsn)
+                break
+
+    cursor.execute(query, parameters)
+
+
+def _positions(columns):
+    """Where a row holds its ``(tag_id, enddate, measuringvalue)``, read once
+    per window rather than a dict made of every row."""
+    return columns.index("tag_id"), columns.index("enddate"), columns.index("measuringvalue")
+
+
+@lru_cache(maxsize=OBSERVATION_TIME_CACHE_SIZE)
+def _observation_time(end_date, station_timezone):
+    """An epoch ``enddate`` as an aware datetime in the station's timezone.
+
+    Each window converts a time once however many tags share it. The cache
+    spares the conversion across windows too: the links of a batch, a run's
+    slices and its late-data re-fetch mostly end on the same times, and a
+    zoneinfo conversion costs a microsecond or so. The datetimes are immutable,
+    so records may share them.
+    """
+    return datetime.fromtimestamp(end_date, tz=station_timezone)
+
+
+def _reshape(data, columns, station_timezone, compact=False):
+    """Collapse historiandata rows into one record per observation time.
+
+    Rows are grouped by their epoch ``enddate``, as the columnar engine groups
+    them, and each distinct time is converted to an aware datetime once. With
+    ``compact`` the records are ``records.CompactRecord``s rather than dicts.
+    """
+    if not data:
+        return []
+
+    tag_index, end_index, value_index = _positions(columns)
+
+    if compact:
+        builder = CompactRecords()
+        positions = {}
+
+        for data_point in data:
+            end_date = data_point[end_index]
+            position = positions.get(end_date)
+            if position is None:
+                position = positions[end_date] = builder.add(_observation_time(end_date, station_timezone))
+            builder.set(position, data_point[tag_index], data_point[value_index])
+
+        return builder.records()
+
+    # organize the data by dates
+    parameter_data_by_date = {}
+
+    for data_point in data:
+        end_date = data_point[end_index]
+        record = parameter_data_by_date.get(end_date)
+        if record is None:
+            record = parameter_data_by_date[end_date] = {
+                "observation_time": _observation_time(end_date, station_timezone)
+            }
+
+        record[data_point[tag_index]] = data_point[value_index]
+
+    return list(parameter_data_by_date.values())
+
+
+def _reshape_columnar(data, columns, station_timezone, compact=False):
+    """``_reshape``, column-wise with NumPy.
+
+    The rows are split into columns once, grouped by ``enddate`` with a single
+    ``np.unique``, and only the distinct timestamps are converted to aware
+    datetimes — one conversion per observation time instead of one per row.
+    Records come out in the order their first row arrived and later rows for
+    the same tag and time win, exactly as in the row engine.
+    """
+    # Imported here rather than at module level: NumPy is only needed by the
+    # connections that select this engine, and ADCONDBConnection.clean()
+    # refuses the selection where it is missing.
+    import numpy as np
+
+    if not data:
+        return []
+
+    by_name = dict(zip(columns, zip(*data)))
+
+    return _records_from_columns(by_name["tag_id"], np.asarray(by_name["enddate"]),
+                                 by_name["measuringvalue"], station_timezone, compact)
+
+
+def _records_from_columns(tag_ids, end_dates, values, station_timezone, compact=False):
+    """The records of a window given as columns: ``end_dates`` an array,
+    ``tag_ids`` and ``values`` sequences of the same length."""
+    import numpy as np
+
+    times, first_seen, inverse = np.unique(end_dates, return_index=True, return_inverse=True)
+
+    # np.unique sorts; put the times back in order of first appearance.
+    order = np.argsort(first_seen, kind="stable")
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+
+    observation_times = [_observation_time(time, station_timezone) for time in times[order].tolist()]
+
+    if compact:
+        builder = CompactRecords()
+        for observation_time in observation_times:
+            builder.add(observation_time)
+        for record_index, tag_id, value in zip(position[inverse.ravel()].tolist(), tag_ids, values):
+            builder.set(record_index, tag_id, value)
+        return builder.records()
+
+    records = [{"observation_time": observation_time} for observation_time in observation_times]
+
+    for record_index, tag_id, value in zip(position[inverse.ravel()].tolist(), tag_ids, values):
+        records[record_index][tag_id] = value
+
+    return records
+
+
+def _parse_copy_binary(buffer):
+    """Read a binary COPY of ``_COPY_SELECT`` into NumPy columns.
+
+    The stream is a fixed header, one tuple per row and a two-byte trailer.
+    With every field of fixed width each tuple is the same 43 bytes, so the
+    body is read in place as a record array; the field counts and lengths in
+    it are then checked rather than trusted.
+    """
+    import numpy as np
+
+    if bytes(buffer[:len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE or bytes(buffer[-2:]) != b"\xff\xff":
+        raise ValueError("Not a binary COPY stream")
+
+    # signature, flags, then the length of the header extension that follows
+    header_length = len(_COPY_SIGNATURE) + 8 + int.from_bytes(buffer[15:19], "big")
+
+    row = np.dtype([
+        ("fields", ">i2"),
+        ("tag_id_length", ">i4"), ("tag_id", ">i8"),
+        ("enddate_length", ">i4"), ("enddate", ">i8"),
+        ("value_length", ">i4"), ("value", ">f8"),
+        ("is_null_length", ">i4"), ("is_null", "u1"),
+    ])
+    rows = np.frombuffer(buffer[header_length:-2], dtype=row)
+
+    expected = {"fields": 4, "tag_id_length": 8, "enddate_length": 8, "value_length": 8,
+                "is_null_length": 1}
+    for name, value in expected.items():
+        if (rows[name] != value).any():
+            raise ValueError(f"Unexpected binary COPY layout: {name} is not {value}")
+
+    return {
+        "tag_id": rows["tag_id"],
+        "enddate": rows["enddate"],
+        "measuringvalue": rows["value"],
+        "is_null": rows["is_null"].astype(bool),
+    }
+
+
+def _records_from_copy(window, station_timezone, compact=False):
+    """``_reshape`` for the columns ``_parse_copy_binary`` returns."""
+    if not len(window["tag_id"]):
+        return []
+
+    values = window["measuringvalue"].tolist()
+    for index in window["is_null"].nonzero()[0].tolist():
+        values[index] = None
+
+    return _records_from_columns(window["tag_id"].tolist(), window["enddate"], values, station_timezone, compact)
+
+
+# How a materialised window is turned into records, by the name a connection
+# selects: each is called as (rows, column names, station timezone, compact).
+# All engines return identical records. "copy" reshapes like "columnar"
+# wherever it reads by query.
+RESHAPE_ENGINES = {
+    "rows": _reshape,
+    "columnar": _reshape_columnar,
+    "copy": _reshape_columnar,
+}
+
+
+def _overlapping_windows(groups):
+    """Partition group keys into clusters whose windows overlap or touch.
+
+    A link backfilling from last year and one collecting the last hour would
+    otherwise share a query over the whole year.
+    """
+    clusters = []
+    cluster_end = None
 
-                    if not parameter_data_by_date.get(end_date):
-                        parameter_data_by_date[end_date] = {
-                            "observation_time": end_date
-                        }
+    for key in sorted(groups, key=lambda k: groups[k][1]):
+        _parameter_ids, start_date, end_date, _tz = groups[key]
 
-                    parameter_data_by_date[end_date][tag_id] = data_point["measuringvalue"]
+        if clusters and start_date <= cluster_end:
+            clusters[-1].append(key)
+            cluster_end = max(cluster_end, end_date)
+        else:
+            clusters.append([key])
+            cluster_end = end_date
 
-        return list(parameter_data_by_date.values()), len(data)
+    return clusters
@@ -0,0 +1,133 @@
+"""
+Detection of rows that reach an ADCON server after the window they belong to
+was collected — a logger that was offline uploading its backlog — without
+re-reading the whole window to find them.
+
+Before each fetch the link's lookback is digested by the server: per tag and
+per hour of ``enddate``, how many rows there are and the highest row id (see
+``ADCONDBClient.get_bucket_digests``). The digests are kept on the station
+link, and the next run compares its own against them. Only the hours of the
+tags whose digest changed are fetched again, each as a small query of its own.
+Those hours were counted as the source's rows when first fetched, so only the
+rows they gained since (``late_rows``) are counted again.
+
+The digests are taken before the fetch, not after: a row arriving in between
+is then fetched now and seen as late next run, which costs one more small
+query. Taken after, it would be in the digest without ever having been read.
+"""
+
+import logging
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# The digest's bucket. On an hour boundary, rows of a 10- or 15-minute logger
+# never straddle two buckets.
+BUCKET_SECONDS = 60 * 60
+
+
+def watch(station_link, parameter_ids, end_timestamp):
+    """
+    Digest the link's lookback ending at ``end_timestamp``, before it is
+    fetched. Returns what ``late_windows`` and ``recorded`` take, or None
+    where the connection does not look back or the digest failed.
+    """
+    network_connection = station_link.network_connection
+    lookback_seconds = network_connection.late_data_lookback_hours * 3600
+    if not lookback_seconds:
+        return None
+
+    region_start = (end_timestamp - lookback_seconds) // BUCKET_SECONDS * BUCKET_SECONDS
+    previous = station_link.late_data_digests or {}
+
+    try:
+        db = network_connection.get_db_connection(pooled=True)
+        try:
+            digests = db.get_bucket_digests(
+                parameter_ids, region_start, end_timestamp, BUCKET_SECONDS, cut=previous.get("until"),
+                sampling_interval=network_connection.get_sampling_interval())
+        finally:
+            db.close()
+    except psycopg2.Error as e:
+        # The fetch itself goes ahead; the lookback is watched next run.
+        logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not digest the lookback of {station_link.station.name}. {e}")
+        return None
+
+    return {"from": region_start, "until": end_timestamp, "digests": digests}
+
+
+def late_windows(recorded, watched, fetched_from):
+    """
+    The ``(start, end, tag_ids)`` windows, in epoch seconds, holding rows that
+    reached the server since the previous run recorded its digests.
+
+    Only what the previous run saw is compared: buckets within its region,
+    each up to where its digest stopped. A bucket it saw no row in has no
+    digest, and any row there now is late. Nothing from ``fetched_from`` on is
+    returned, since this run's own fetch reads it. Adjacent hours of the same
+    tags make one window.
+    """
+    if not recorded:
+        return []
+
+    buckets = recorded["buckets"]
+    windows = []
+
+    for bucket_start, tags in sorted(watched["digests"].items()):
+        if not recorded["from"] <= bucket_start < recorded["until"]:
+            continue
+
+        window_end = min(bucket_start + BUCKET_SECONDS, recorded["until"], fetched_from)
+        if window_end <= bucket_start:
+            continue
+
+        seen = buckets.get(str(bucket_start), {})
+        tag_ids = sorted(tag_id for tag_id, (_count, _max_id, cut_count, cut_max_id) in tags.items()
+                         if cut_count and seen.get(str(tag_id)) != [cut_count, cut_max_id])
+        if not tag_ids:
+            continue
+
+        if windows and windows[-1][1] == bucket_start and windows[-1][2] == tag_ids:
+            windows[-1] = (windows[-1][0], window_end, tag_ids)
+        else:
+            windows.append((bucket_start, window_end, tag_ids))
+
+    return windows
+
+
+def late_rows(recorded, watched, windows):
+    """
+    How many rows the hours and tags of ``windows`` gained since the previous
+    run recorded its digests: each one's count up to where that run stopped,
+    less the count it recorded. The rest of each window's rows were counted
+    when first fetched. Like the digests, it counts only rows within the
+    sampling interval.
+    """
+    buckets = recorded["buckets"]
+    count = 0
+
+    for start, end, tag_ids in windows:
+        for bucket_start, tags in watched["digests"].items():
+            if not start <= bucket_start < end:
+                continue
+
+            seen = buckets.get(str(bucket_start), {})
+            for tag_id in tag_ids:
+                if tag_id in tags:
+                    cut_count = tags[tag_id][2]
+                    count += max(cut_count - seen.get(str(tag_id), [0])[0], 0)
+
+    return count
+
+
+def recorded(watched):
+    """The digests to keep on the station link for the next run, as JSON."""
+    return {
+        "from": watched["from"],
+        "until": watched["until"],
+        "buckets": {
+            str(bucket_start): {str(tag_id): [count, max_id] for tag_id, (count, max_id, _cc, _cm) in tags.items()}
+            for bucket_start, tags in watched["digests"].items()
+        },
+    }
@@ -0,0 +1,69 @@
+"""
+Loading the station links of a whole collection cycle, with everything
+``get_station_data`` reads from the ORM, in a fixed number of queries however
+many links there are.
+
+Unloaded, each link costs a query for its station, one for its connection and
+one for its variable mappings, and core's reading of a mapping's parameter and
+unit costs two more per mapping. ``load_station_links`` selects the stations
+with the links and prefetches the mappings with their parameters and units;
+``prefetch_station_links`` does the same for links core has already loaded,
+which is how the plugin's many-link entry points use it.
+
+Connections are not joined in with ``select_related``: a link's
+``network_connection`` is declared against core's ``NetworkConnection``, and a
+join reads the row as that model, not as the ``ADCONDBConnection`` the plugin
+needs. They are read once per cycle, in one query, and each shared by
+all of its links.
+"""
+
+from django.db.models import prefetch_related_objects
+
+MAPPING_LOOKUPS = ("variable_mappings__adl_parameter", "variable_mappings__adcon_parameter_unit")
+
+
+def _attach_connections(station_links):
+    """Give each link whose connection is not loaded yet its connection, all
+    read in one query."""
+    from .models import ADCONDBConnection, ADCONStationLink
+
+    unloaded = [link for link in station_links if not ADCONStationLink.network_connection.is_cached(link)]
+    if not unloaded:
+        return
+
+    connections = ADCONDBConnection.objects.in_bulk({link.network_connection_id for link in unloaded})
+    for link in unloaded:
+        network_connection = connections.get(link.network_connection_id)
+        if network_connection is not None:
+            link.network_connection = network_connection
+
+
+def prefetch_station_links(station_links):
+    """Load the stations, connections and variable mappings of already loaded
+    links in place, skipping whatever each already holds. Returns the links as
+    a list.
+
+    An unsaved link keeps its relations in memory, and is left as it is.
+    """
+    station_links = list(station_links)
+
+    saved = [link for link in station_links if link.pk is not None]
+    if saved:
+        prefetch_related_objects(saved, "station", *MAPPING_LOOKUPS)
+        _attach_connections(saved)
+
+    return station_links
+
+
+def load_station_links(queryset=None):
+    """The links of ``queryset``, all ADCON station links unless given, loaded
+    for a collection cycle."""
+    from .models import ADCONStationLink
+
+    if queryset is None:
+        queryset = ADCONStationLink.objects.all()
+
+    station_links = list(queryset.select_related("station").prefetch_related(*MAPPING_LOOKUPS))
+    _attach_connections(station_links)
+
+    return station_links
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from adl_adcon_db_plugin.benchmarks import CASES
+from adl_adcon_db_plugin.models import ADCONStationLink
+
+
+class Command(BaseCommand):
+    help = "Benchmark the ingestion hot path against a station link's ADCON server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("case", choices=sorted(CASES), help="The benchmark to run.")
+        parser.add_argument("--station-link", type=int, required=True,
+                            help="The ADCON station link whose mappings and window are fetched.")
+        parser.add_argument("--hours", type=int, default=24,
+                            help="The length of the window, ending now. Defaults to 24.")
+
+    def handle(self, *args, **options):
+        try:
+            station_link = ADCONStationLink.objects.get(pk=options["station_link"])
+        except ADCONStationLink.DoesNotExist:
+            raise CommandError(f"No ADCON station link with id {options['station_link']}.")
+
+        end_date = timezone.now()
+        start_date = end_date - timedelta(hours=options["hours"])
+
+        client = station_link.network_connection.get_db_connection()
+
+        try:
+            results = CASES[options["case"]](
+                client, station_link, int(start_date.timestamp()), int(end_date.timestamp()))
+        finally:
+            client.close()
+
+        self.stdout.write(f"{options['case']}: {station_link} over {options['hours']}h")
+        for name, value in results.items():
+            self.stdout.write(f"  {name}: {value}")
@@ -0,0 +1,132 @@
+from importlib.util import find_spec
+
+import psycopg2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from adl_adcon_db_plugin import synthetic
+from adl_adcon_db_plugin.benchmarks import (
+    REGRESSION_TOLERANCE,
+    benchmark_suite,
+    keep_suite_run,
+    last_suite_run,
+    suite_regressions,
+    suite_run,
+)
+from adl_adcon_db_plugin.db import RESHAPE_ENGINES, ADCONDBClient
+from adl_adcon_db_plugin.query_plans import SUGGESTED_INDEX
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the ingestion hot path on a synthetic ADCON dataset, in a PostgreSQL database of "
+            "its own or in memory, and compare the run with the last one at the same scale.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stations", type=int, default=10, help="Synthetic stations. Defaults to 10.")
+        parser.add_argument("--tags", type=int, default=10, help="Tags per station. Defaults to 10.")
+        parser.add_argument("--days", type=int, default=7,
+                            help="Days of ten-minute rows per tag, all fetched. Defaults to 7.")
+        parser.add_argument("--in-memory", action="store_true",
+                            help="Serve the rows from memory rather than a database: the query and transfer "
+                                 "then cost only the rows' making, and the reshape is what is measured.")
+        parser.add_argument("--database", default="adcon_benchmark",
+                            help="The database the dataset is loaded into, on ADL's own server, created "
+                                 "when missing. Defaults to adcon_benchmark.")
+        parser.add_argument("--reload", action="store_true",
+                            help="Load the dataset again even where it is loaded at this scale already.")
+        parser.add_argument("--with-index", action="store_true",
+                            help="Load the dataset with the index adcon_db_explain suggests; without it "
+                                 "historiandata has its primary key only.")
+        parser.add_argument("--engines", nargs="+", choices=sorted(RESHAPE_ENGINES),
+                            help="The engines to benchmark. Defaults to every engine that can run here.")
+        parser.add_argument("--results", default="adcon_db_benchmarks.jsonl",
+                            help="The file the run is kept in, one JSON line per run. "
+                                 "Defaults to adcon_db_benchmarks.jsonl.")
+        parser.add_argument("--fail-on-regression", action="store_true",
+                            help="Fail where an engine's rows per second fell by more than "
+                                 f"{REGRESSION_TOLERANCE:.0%} since the last run at this scale.")
+
+    def handle(self, *args, **options):
+        scale = {"stations": options["stations"], "tags": options["tags"], "days": options["days"]}
+        engines = options["engines"] or self.default_engines(options["in_memory"])
+
+        try:
+            if options["in_memory"]:
+                source = "memory"
+                client = ADCONDBClient(None, None, None, None, None, pool=synthetic.SyntheticPool(**scale))
+            else:
+                # Runs with and without the index are not compared.
+                source = "postgresql+index" if options["with_index"] else "postgresql"
+                client = self.database_client(options, scale)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        try:
+            results = benchmark_suite(client, engines=engines, **scale)
+        finally:
+            client.close()
+
+        run = suite_run(source, results=results, **scale)
+        previous = last_suite_run(options["results"], source, scale)
+        keep_suite_run(options["results"], run)
+
+        self.stdout.write(f"{source}: {scale['stations']} stations x {scale['tags']} tags x {scale['days']} days")
+        for engine, measurements in results.items():
+            self.stdout.write(f"{engine}:")
+            for name, value in measurements.items():
+                self.stdout.write(f"  {name}: {value}")
+
+        if previous is None:
+            self.stdout.write(f"No earlier run at this scale in {options['results']} to compare with.")
+            return
+
+        self.stdout.write(f"Compared with the run of {previous['recorded_at']}:")
+        for engine, measurements in results.items():
+            before = previous["results"].get(engine, {}).get("rows_per_second")
+            if before and measurements["rows_per_second"]:
+                self.stdout.write(f"  {engine}: {before} -> {measurements['rows_per_second']} rows/s "
+                                  f"({measurements['rows_per_second'] / before - 1:+.1%})")
+
+        regressions = suite_regressions(previous, run)
+        for engine, (before, after) in regressions.items():
+            self.stderr.write(f"Regression: {engine} fell from {before} to {after} rows/s.")
+
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} engine(s) regressed.")
+
+    @staticmethod
+    def default_engines(in_memory):
+        if not find_spec("numpy"):
+            return ["rows"]
+        # Only a server can answer a COPY.
+        return ["rows", "columnar"] if in_memory else list(RESHAPE_ENGINES)
+
+    def database_client(self, options, scale):
+        database = settings.DATABASES["default"]
+        connect_kwargs = dict(host=database["HOST"], port=database["PORT"] or 5432,
+                              user=database["USER"], password=database["PASSWORD"])
+
+        connection = psycopg2.connect(dbname=database["NAME"], **connect_kwargs)
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (options["database"],))
+                if cursor.fetchone() is None:
+                    self.stdout.write(f"Creating the database {options['database']}.")
+                    cursor.execute(f'CREATE DATABASE "{options["database"]}"')
+        finally:
+            connection.close()
+
+        connection = psycopg2.connect(dbname=options["database"], **connect_kwargs)
+        try:
+            wanted = (scale["stations"], scale["tags"], scale["days"], options["with_index"])
+            if options["reload"] or synthetic.loaded_scale(connection) != wanted:
+                self.stdout.write(f"Loading the synthetic dataset into {options['database']}.")
+                rows = synthetic.load(connection, *wanted[:3],
+                                      index=SUGGESTED_INDEX if options["with_index"] else None)
+                self.stdout.write(f"Loaded {rows} historiandata rows.")
+        finally:
+            connection.close()
+
+        return ADCONDBClient(connect_kwargs["host"], connect_kwargs["port"], options["database"],
+                             connect_kwargs["user"], connect_kwargs["password"])
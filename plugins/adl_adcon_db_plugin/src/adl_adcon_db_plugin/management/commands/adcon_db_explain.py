@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from adl_adcon_db_plugin.models import ADCONStationLink
+from adl_adcon_db_plugin.query_plans import explain_station_link
+
+
+class Command(BaseCommand):
+    help = "Explain how a station link's ADCON server executes its fetch, and which index it needs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--station-link", type=int, required=True,
+                            help="The ADCON station link whose fetch is explained.")
+        parser.add_argument("--hours", type=int, default=24,
+                            help="The length of the window, ending now. Defaults to 24.")
+        parser.add_argument("--no-analyze", action="store_true",
+                            help="Only plan the queries rather than run them, for a window too long "
+                                 "to read on a busy server. Actual rows and timings are then left out.")
+
+    def handle(self, *args, **options):
+        try:
+            station_link = ADCONStationLink.objects.get(pk=options["station_link"])
+        except ADCONStationLink.DoesNotExist:
+            raise CommandError(f"No ADCON station link with id {options['station_link']}.")
+
+        end_date = timezone.now()
+        start_date = end_date - timedelta(hours=options["hours"])
+
+        client = station_link.network_connection.get_db_connection()
+
+        try:
+            summaries, indexes, advice = explain_station_link(
+                client, station_link, int(start_date.timestamp()), int(end_date.timestamp()),
+                analyze=not options["no_analyze"])
+        finally:
+            client.close()
+
+        self.stdout.write(f"{station_link} over {options['hours']}h")
+
+        for name, summary in summaries.items():
+            self.stdout.write(f"{name} query:")
+            self.stdout.write(f"  planning_ms: {summary['planning_ms']}")
+            if summary["execution_ms"] is not None:
+                self.stdout.write(f"  execution_ms: {summary['execution_ms']}")
+            for scan in summary["scans"]:
+                line = f"  {scan['node']}"
+                if scan["index"]:
+                    line += f" using {scan['index']}"
+                line += f": estimated {scan['estimated_rows']} rows"
+                if "actual_rows" in scan:
+                    line += (f", actual {scan['actual_rows']} rows in {scan['ms']}ms, "
+                             f"{scan['buffers_hit']} buffers hit, {scan['buffers_read']} read")
+                self.stdout.write(line)
+
+        self.stdout.write("indexes:")
+        for name, definition, _columns in indexes:
+            self.stdout.write(f"  {name}: {definition}")
+
+        self.stdout.write("advice:")
+        for line in advice:
+            self.stdout.write(f"  {line}")
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from adl_adcon_db_plugin.mapping_import import import_mappings, load_rules, plan_mappings
+from adl_adcon_db_plugin.models import ADCONDBConnection, ADCONStationLink
+
+
+class Command(BaseCommand):
+    help = ("Map the tags of a connection's ADCON stations to ADL parameters in bulk, by rules on the "
+            "tags' names.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connection", type=int, required=True,
+                            help="The ADCON connection whose station links are mapped.")
+        parser.add_argument("--rules", required=True,
+                            help='A JSON file of rules, tried in order: [{"match": "<regex on the tag\'s '
+                                 'name>", "parameter": <ADL parameter id or name>, "unit": <unit id or '
+                                 'name>}, ...].')
+        parser.add_argument("--station-link", type=int, action="append", dest="station_links",
+                            help="Only map this station link. Can be repeated. Defaults to all of the "
+                                 "connection's.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would be created without creating it.")
+
+    def handle(self, *args, **options):
+        try:
+            network_conn = ADCONDBConnection.objects.get(pk=options["connection"])
+        except ADCONDBConnection.DoesNotExist:
+            raise CommandError(f"No ADCON connection with id {options['connection']}.")
+
+        try:
+            with open(options["rules"]) as f:
+                rules = load_rules(json.load(f))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read the rules in {options['rules']}. {e}")
+
+        station_links = None
+        if options["station_links"]:
+            station_links = list(ADCONStationLink.objects.filter(
+                network_connection=network_conn, pk__in=options["station_links"]).order_by("pk"))
+            unknown = set(options["station_links"]) - {link.pk for link in station_links}
+            if unknown:
+                raise CommandError(f"No station link(s) {sorted(unknown)} on connection {network_conn.name}.")
+
+        plan = plan_mappings(network_conn, rules, station_links)
+
+        for link in plan.missing_stations:
+            self.stdout.write(f"no tags: station link {link.pk}, ADCON station {link.adcon_station_id}")
+        for link, tag in plan.unmatched:
+            self.stdout.write(f"unmatched: station link {link.pk}, tag {tag['id']} {tag['displayname']!r}")
+        for link, tag, reason in plan.conflicts:
+            self.stdout.write(f"conflict: station link {link.pk}, tag {tag['id']} {tag['displayname']!r}, "
+                              f"{reason}")
+        for mapping in plan.mappings:
+            self.stdout.write(f"map: station link {mapping.station_link.pk}, tag {mapping.adcon_parameter_id} "
+                              f"to {mapping.adl_parameter} in {mapping.adcon_parameter_unit}")
+
+        self.stdout.write(f"{len(plan.mappings)} to create, {len(plan.existing)} already mapped, "
+                          f"{len(plan.unmatched)} unmatched, {len(plan.conflicts)} in conflict, "
+                          f"{len(plan.missing_stations)} station link(s) without tags")
+
+        if options["dry_run"] or not plan.mappings:
+            return
+
+        created = import_mappings(plan)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} mapping(s)."))
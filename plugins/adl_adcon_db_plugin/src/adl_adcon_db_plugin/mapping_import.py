@@ -0,0 +1,143 @@
+"""
+Bulk import of station variable mappings from a connection's ADCON tag
+catalogue, for onboarding many stations at once rather than picking each
+tag in the admin's select widget.
+
+``plan_mappings`` reads the AnalogTagNode rows of every linked station in one
+query and gives each tag the ADL parameter and unit of the first rule whose
+pattern its display name matches. Nothing is written: the plan holds the
+mappings to create and, up front, every tag left out — matched by no rule,
+already mapped on its link, or in conflict, since ``adcon_parameter_id`` is
+unique across all station links. ``import_mappings`` then creates the
+planned mappings with ``bulk_create``.
+
+``adl adcon_db_import_mappings`` runs both from a JSON file of rules.
+"""
+
+import logging
+import re
+from collections import namedtuple
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+BULK_CREATE_BATCH_SIZE = 500
+
+MappingRule = namedtuple("MappingRule", ["pattern", "parameter", "unit"])
+
+# Each list holds (station link, tag) pairs, conflicts a reason as well;
+# missing_stations the links whose ADCON station has no tags on the server.
+MappingPlan = namedtuple("MappingPlan", ["mappings", "existing", "unmatched", "conflicts", "missing_stations"])
+
+
+def _resolve(model, value, label):
+    """A DataParameter or Unit by primary key, or by name regardless of case."""
+    lookup = {"pk": value} if isinstance(value, int) else {"name__iexact": value}
+    try:
+        return model.objects.get(**lookup)
+    except (model.DoesNotExist, model.MultipleObjectsReturned, ValueError):
+        raise ValueError(f"No single {label} matches {value!r}.")
+
+
+def load_rules(entries):
+    """Rules from ``[{"match": regex, "parameter": id or name, "unit": id or
+    name}, ...]``, in order. Patterns are searched for in a tag's display
+    name, regardless of case. Raises ValueError naming the first bad entry."""
+    from .models import DataParameter, Unit
+
+    rules = []
+    for position, entry in enumerate(entries, start=1):
+        try:
+            pattern = re.compile(entry["match"], re.IGNORECASE)
+            parameter = _resolve(DataParameter, entry["parameter"], "ADL parameter")
+            unit = _resolve(Unit, entry["unit"], "unit")
+        except KeyError as e:
+            raise ValueError(f"Rule {position} has no {e.args[0]!r}.")
+        except re.error as e:
+            raise ValueError(f"Rule {position}'s pattern is not a regular expression: {e}")
+        except ValueError as e:
+            raise ValueError(f"Rule {position}: {e}")
+
+        rules.append(MappingRule(pattern, parameter, unit))
+
+    return rules
+
+
+def match_rule(rules, displayname):
+    """The first rule whose pattern is found in the display name, or None."""
+    for rule in rules:
+        if rule.pattern.search(displayname or ""):
+            return rule
+    return None
+
+
+def plan_mappings(network_conn, rules, station_links=None):
+    """The mappings the rules would create for the connection's station links,
+    all of them unless ``station_links`` is given, and the tags they leave
+    out, as a ``MappingPlan``."""
+    from .models import ADCONStationLink, ADCONStationVariableMapping
+
+    if station_links is None:
+        station_links = ADCONStationLink.objects.filter(network_connection=network_conn).order_by("pk")
+
+    links_by_station = {}
+    for link in station_links:
+        links_by_station.setdefault(link.adcon_station_id, []).append(link)
+
+    tags = []
+    if links_by_station:
+        db = network_conn.get_db_connection()
+        try:
+            tags = db.get_adcon_parameters_for_stations(list(links_by_station))
+        finally:
+            db.close()
+    tags.sort(key=lambda tag: (tag["parent_id"], tag["id"]))
+
+    # The links each tag is already mapped on, read in one query.
+    owners = dict(ADCONStationVariableMapping.objects.filter(
+        adcon_parameter_id__in=[tag["id"] for tag in tags]).values_list("adcon_parameter_id", "station_link_id"))
+
+    plan = MappingPlan([], [], [], [], [])
+    claimed = {}
+    for tag in tags:
+        rule = match_rule(rules, tag["displayname"])
+
+        for link in links_by_station[tag["parent_id"]]:
+            owner = owners.get(tag["id"])
+            if owner == link.pk:
+                plan.existing.append((link, tag))
+            elif rule is None:
+                plan.unmatched.append((link, tag))
+            elif owner is not None:
+                plan.conflicts.append((link, tag, f"already mapped on station link {owner}"))
+            elif tag["id"] in claimed:
+                # Two links to the same station: the tag can be only one's.
+                plan.conflicts.append((link, tag, f"also planned for station link {claimed[tag['id']]}"))
+            else:
+                claimed[tag["id"]] = link.pk
+                plan.mappings.append(ADCONStationVariableMapping(
+                    station_link=link,
+                    adl_parameter=rule.parameter,
+                    adcon_parameter_id=tag["id"],
+                    adcon_parameter_unit=rule.unit,
+                ))
+
+    stations_with_tags = {tag["parent_id"] for tag in tags}
+    for station_id, links in links_by_station.items():
+        if station_id not in stations_with_tags:
+            plan.missing_stations.extend(links)
+
+    return plan
+
+
+def import_mappings(plan):
+    """Create the plan's mappings, all or none. Returns how many."""
+    from .models import ADCONStationVariableMapping
+
+    with transaction.atomic():
+        created = ADCONStationVariableMapping.objects.bulk_create(plan.mappings, batch_size=BULK_CREATE_BATCH_SIZE)
+
+    logger.info(f"[ADL_ADCON_DB_PLUGIN] Imported {len(created)} station variable mapping(s).")
+
+    return len(created)
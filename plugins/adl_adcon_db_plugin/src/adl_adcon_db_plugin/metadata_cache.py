@@ -0,0 +1,111 @@
+"""
+A cache of the ADCON station and parameter listings behind the admin's select
+widgets, so editing a station link does not re-scan ``node_60`` on the remote
+server for every widget that loads.
+
+Entries live in Django's cache backend, keyed per connection under a
+generation token that ``invalidate()`` replaces whenever the connection is
+saved or deleted, so edited credentials are never answered from the old
+server's listings. An entry older than the connection's TTL is still served,
+and re-read in a background thread, so the admin only ever waits on the remote
+database when nothing at all is cached.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# How long past its TTL an entry may still be served while it is re-read. Past
+# this the next widget load reads the listing itself.
+STALE_FOR_SECONDS = 24 * 60 * 60
+
+# How long one process's background re-read holds off the others. Longer than
+# a re-read of node_60 ever takes, short enough that one killed halfway does
+# not pin a stale listing for long.
+REFRESH_LOCK_SECONDS = 5 * 60
+
+KEY_PREFIX = "adl_adcon_db:metadata"
+
+
+def _generation(connection_id):
+    return cache.get_or_set(f"{KEY_PREFIX}:{connection_id}:generation", uuid.uuid4().hex, None)
+
+
+def invalidate(connection_id):
+    """Forget every cached listing of a connection, in every process."""
+    cache.set(f"{KEY_PREFIX}:{connection_id}:generation", uuid.uuid4().hex, None)
+
+
+def _store(key, value, ttl):
+    cache.set(key, (value, time.time() + ttl), ttl + STALE_FOR_SECONDS)
+
+
+def _refresh(key, load, ttl):
+    try:
+        _store(key, load(), ttl)
+    except Exception as e:
+        # The stale listing stays in place; the next load past the TTL tries
+        # again once the lock has gone.
+        logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not refresh {key}. {e}")
+    finally:
+        cache.delete(f"{key}:refreshing")
+        # This thread's own Django connections, if the cache backend opened
+        # any; they would otherwise outlive the thread.
+        connections.close_all()
+
+
+def _cached(network_conn, name, load):
+    ttl = network_conn.metadata_cache_minutes * 60
+    if not ttl:
+        return load()
+
+    key = f"{KEY_PREFIX}:{network_conn.pk}:{_generation(network_conn.pk)}:{name}"
+    entry = cache.get(key)
+
+    if entry is None:
+        value = load()
+        _store(key, value, ttl)
+        return value
+
+    value, fresh_until = entry
+
+    # cache.add is the lock: only the caller that creates the key re-reads, so
+    # a page of widgets past the TTL starts one re-read, not one each.
+    if time.time() >= fresh_until and cache.add(f"{key}:refreshing", True, REFRESH_LOCK_SECONDS):
+        threading.Thread(target=_refresh, args=(key, load, ttl), daemon=True).start()
+
+    return value
+
+
+def get_stations(network_conn):
+    """``ADCONDBClient.get_stations`` for a connection, cached."""
+    only_stations_with_coords = network_conn.only_stations_with_coords
+
+    def load():
+        db = network_conn.get_admin_db_connection()
+        try:
+            return db.get_stations(only_stations_with_coords=only_stations_with_coords)
+        finally:
+            db.close()
+
+    return _cached(network_conn, f"stations:{int(only_stations_with_coords)}", load)
+
+
+def get_station_parameters(network_conn, adcon_station_id):
+    """``ADCONDBClient.get_adcon_parameters_for_station`` for a connection,
+    cached."""
+
+    def load():
+        db = network_conn.get_admin_db_connection()
+        try:
+            return db.get_adcon_parameters_for_station(adcon_station_id)
+        finally:
+            db.close()
+
+    return _cached(network_conn, f"parameters:{adcon_station_id}", load)
@@ -0,0 +1,217 @@
+"""
+What ingestion costs, per ADCON connection: the time fetches spent connecting,
+executing, fetching and reshaping, and the rows and bytes they moved.
+
+A client made for a connection (``ADCONDBConnection.get_db_connection``) adds
+every fetch's ``FetchCost`` to counters in Django's cache, so the Celery
+workers that fetch and the web process that serves the metrics endpoint count
+into the same totals. ``render`` writes them in Prometheus's text exposition
+format, labelled by connection.
+
+A run of the plugin counts its fetches inside ``batched()``: they are added up
+in the process and written to the cache once, when the run ends, rather than a
+round trip per counter per fetch.
+
+The phases are those of the client's own calls. "execute" is the query's
+round trip, the server's work and, for a plain cursor, the transfer of the
+whole result, which libpq receives before ``execute`` returns. "fetch" is
+turning that result into Python rows; for a stream, which reshapes as it reads,
+it is the whole read. Bytes are counted only where they are known exactly: for
+the binary COPY, by the size of its stream.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("connect", "execute", "fetch", "reshape")
+
+KEY_PREFIX = "adl_adcon_db:metrics"
+
+# The counters of a connection, by name: what each counts, and the help text
+# of its Prometheus metric. Seconds are kept in whole microseconds, since the
+# cache only increments integers.
+COUNTERS = {
+    "fetches": "Fetches made from the ADCON server.",
+    "rows": "Rows transferred from historiandata.",
+    "rows_dropped": "Rows in the fetched windows left out by the sampling-interval filter.",
+    "bytes": "Bytes transferred by binary COPY.",
+}
+PHASE_HELP = "Seconds fetches spent in each phase."
+
+# What the fetches inside ``batched()`` have counted, by cache key, until the
+# outermost batch ends. Shared by the threads of a run, hence the lock.
+_pending = {}
+_batches = 0
+_lock = threading.Lock()
+
+
+class FetchCost:
+    """The phases and rows of one fetch, or of several added together."""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.fetches = 1
+        self.rows = 0
+        self.rows_dropped = 0
+        self.bytes = 0
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    @classmethod
+    def total(cls, costs):
+        total = cls()
+        total.fetches = 0
+        for cost in costs:
+            for name, seconds in cost.seconds.items():
+                total.seconds[name] += seconds
+            total.fetches += cost.fetches
+            total.rows += cost.rows
+            total.rows_dropped += cost.rows_dropped
+            total.bytes += cost.bytes
+        return total
+
+    def as_dict(self):
+        return {
+            **{f"{name}_seconds": round(seconds, 4) for name, seconds in self.seconds.items()},
+            "fetches": self.fetches,
+            "rows": self.rows,
+            "rows_dropped": self.rows_dropped,
+            "bytes": self.bytes,
+        }
+
+
+def _key(connection_id, name):
+    return f"{KEY_PREFIX}:{connection_id}:{name}"
+
+
+def _increment(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted since it was read, or never there: add() is a no-op where
+        # the key exists, so two processes racing to create it still both count.
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def _write(counts):
+    """Add ``{key: delta}`` to the counters, in a read of which exist and one
+    increment per counter that moved.
+
+    The counters are a report on ingestion, not part of it: a cache that cannot
+    be reached costs their update, never the fetch.
+    """
+    if not counts:
+        return
+
+    try:
+        stored = cache.get_many(list(counts))
+        for key, delta in counts.items():
+            if key in stored:
+                _increment(key, delta)
+            elif not cache.add(key, delta, None):
+                cache.incr(key, delta)
+    except Exception as e:
+        logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not record the cost of the fetches. {e}")
+
+
+def _take():
+    counts = dict(_pending)
+    _pending.clear()
+    return counts
+
+
+@contextmanager
+def batched():
+    """Hold the costs recorded inside the block, from any thread, and write
+    them to the cache when it ends. Nested batches write when the outermost
+    ends."""
+    global _batches
+
+    with _lock:
+        _batches += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _batches -= 1
+            counts = _take() if not _batches else {}
+        _write(counts)
+
+
+def record(connection_id, cost):
+    """Add a fetch's cost to its connection's counters: at once, or when the
+    ``batched()`` block around it ends."""
+    deltas = {_key(connection_id, name): getattr(cost, name) for name in COUNTERS}
+    for phase, seconds in cost.seconds.items():
+        deltas[_key(connection_id, f"{phase}_us")] = round(seconds * 1_000_000)
+
+    with _lock:
+        for key, delta in deltas.items():
+            if delta:
+                _pending[key] = _pending.get(key, 0) + delta
+        if _batches:
+            return
+        counts = _take()
+
+    _write(counts)
+
+
+def totals(connection_ids):
+    """``{connection id: {counter: value}}``, the phases in seconds under
+    ``<phase>_seconds``."""
+    names = list(COUNTERS) + [f"{phase}_us" for phase in PHASES]
+    stored = cache.get_many([_key(connection_id, name) for connection_id in connection_ids for name in names])
+
+    result = {}
+    for connection_id in connection_ids:
+        values = {name: stored.get(_key(connection_id, name), 0) for name in COUNTERS}
+        for phase in PHASES:
+            values[f"{phase}_seconds"] = stored.get(_key(connection_id, f"{phase}_us"), 0) / 1_000_000
+        result[connection_id] = values
+
+    return result
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(connections):
+    """The counters of ``[(connection id, name)]`` in Prometheus's text
+    exposition format."""
+    connections = list(connections)
+    by_id = totals([connection_id for connection_id, _name in connections])
+
+    lines = []
+
+    def labels(connection_id, name, **extra):
+        pairs = {"connection_id": connection_id, "connection": name, **extra}
+        return ",".join(f'{key}="{_label(value)}"' for key, value in pairs.items())
+
+    for counter, help_text in COUNTERS.items():
+        metric = f"adl_adcon_db_{counter}_total"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for connection_id, name in connections:
+            lines.append(f"{metric}{{{labels(connection_id, name)}}} {by_id[connection_id][counter]}")
+
+    metric = "adl_adcon_db_phase_seconds_total"
+    lines += [f"# HELP {metric} {PHASE_HELP}", f"# TYPE {metric} counter"]
+    for connection_id, name in connections:
+        for phase in PHASES:
+            lines.append(f"{metric}{{{labels(connection_id, name, phase=phase)}}} "
+                         f"{by_id[connection_id][f'{phase}_seconds']:.6f}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.7 on 2026-10-18 09:12
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0007_alter_adconstationlink_start_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='pool_max_size',
+            field=models.PositiveSmallIntegerField(default=4, help_text="The most connections ingestion opens to this server at once. Keep it below the server's own connection limit.", validators=[django.core.validators.MinValueValidator(1)], verbose_name='Maximum Connections'),
+        ),
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='pool_min_size',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Connections kept open between ingestion runs even when idle.', verbose_name='Minimum Idle Connections'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.7 on 2026-10-18 10:04
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0008_adcondbconnection_pool_max_size_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='stream_itersize',
+            field=models.PositiveIntegerField(blank=True, help_text='Read each window through a server-side cursor, this many rows per round trip, so long backfills never hold the whole window in memory. Leave empty to read each window at once.', null=True, validators=[django.core.validators.MinValueValidator(100)], verbose_name='Streaming Batch Size'),
+        ),
+    ]
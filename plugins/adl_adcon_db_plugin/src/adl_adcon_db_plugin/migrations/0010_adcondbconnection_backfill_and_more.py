@@ -0,0 +1,29 @@
+# Generated by Django 6.0.7 on 2026-10-18 11:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0009_adcondbconnection_stream_itersize'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='backfill_parallelism',
+            field=models.PositiveSmallIntegerField(default=1, help_text='How many slices of one backfill are fetched at once. Capped by the maximum connections above.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Backfill Parallel Slices'),
+        ),
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='backfill_slice_hours',
+            field=models.PositiveIntegerField(default=24, help_text='Windows longer than this are fetched as slices of this length, so a long backfill is never one query the server can time out on.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Backfill Slice Length (hours)'),
+        ),
+        migrations.AddField(
+            model_name='adconstationlink',
+            name='backfill_checkpoint',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
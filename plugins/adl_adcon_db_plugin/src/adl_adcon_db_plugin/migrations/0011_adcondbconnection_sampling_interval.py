@@ -0,0 +1,24 @@
+# Generated by Django 6.0.7 on 2026-10-18 12:31
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0010_adcondbconnection_backfill_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='max_sampling_interval_minutes',
+            field=models.PositiveIntegerField(default=20, help_text='Rows sampled over this interval or longer are not ingested.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Maximum Sampling Interval (minutes)'),
+        ),
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='min_sampling_interval_minutes',
+            field=models.PositiveIntegerField(default=3, help_text='Rows sampled over a shorter interval than this are not ingested.', verbose_name='Minimum Sampling Interval (minutes)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0011_adcondbconnection_sampling_interval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='fetch_engine',
+            field=models.CharField(choices=[('rows', 'Row by row'), ('columnar', 'Columnar (NumPy)')], default='rows', help_text='How fetched rows are turned into records. The columnar engine needs NumPy and is much faster on long windows; both produce the same records.', max_length=20, verbose_name='Fetch Engine'),
+        ),
+    ]
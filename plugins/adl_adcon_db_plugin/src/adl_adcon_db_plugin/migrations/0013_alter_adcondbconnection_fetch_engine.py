@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0012_adcondbconnection_fetch_engine'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adcondbconnection',
+            name='fetch_engine',
+            field=models.CharField(choices=[('rows', 'Row by row'), ('columnar', 'Columnar (NumPy)'), ('copy', 'Binary COPY (NumPy)')], default='rows', help_text='How fetched rows are read and turned into records. The columnar engine needs NumPy and is much faster on long windows; the binary COPY engine also reads each window as one binary COPY, falling back to a query where the server refuses it. All produce the same records.', max_length=20, verbose_name='Fetch Engine'),
+        ),
+    ]
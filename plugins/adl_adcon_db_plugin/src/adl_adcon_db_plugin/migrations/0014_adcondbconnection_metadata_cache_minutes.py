@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0013_alter_adcondbconnection_fetch_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='metadata_cache_minutes',
+            field=models.PositiveIntegerField(default=15, help_text='How long the station and parameter lists shown while editing are reused before being re-read in the background. 0 reads them on every load.', verbose_name='Station Listing Cache (minutes)'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.7 on 2026-10-18 16:02
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0014_adcondbconnection_metadata_cache_minutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='metadata_mirrored_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ADCONStation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('adcon_id', models.BigIntegerField()),
+                ('has_coordinates', models.BooleanField(default=False)),
+                ('attributes', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('row_digest', models.CharField(max_length=32)),
+                ('parameters_digest', models.CharField(blank=True, max_length=32)),
+                ('network_connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mirrored_stations', to='adl_adcon_db_plugin.adcondbconnection')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('network_connection', 'adcon_id'), name='unique_mirrored_adcon_station')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ADCONParameter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('station_adcon_id', models.BigIntegerField()),
+                ('adcon_id', models.BigIntegerField()),
+                ('attributes', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('network_connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mirrored_parameters', to='adl_adcon_db_plugin.adcondbconnection')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['network_connection', 'station_adcon_id'], name='adcon_parameter_station_idx')],
+            },
+        ),
+    ]
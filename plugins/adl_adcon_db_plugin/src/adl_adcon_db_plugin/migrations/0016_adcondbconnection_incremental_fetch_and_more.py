@@ -0,0 +1,23 @@
+# Generated by Django 6.0.7 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0015_adcondbconnection_metadata_mirrored_at_adconstation_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='incremental_fetch',
+            field=models.BooleanField(default=False, help_text='Remember the latest observation handed over for each station link and fetch only the rows ending after it, so a routine run transfers only what is new. Rows that reach the server late, ending before that observation, are then not read.', verbose_name='Fetch Only New Rows'),
+        ),
+        migrations.AddField(
+            model_name='adconstationlink',
+            name='fetch_watermark',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.7 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0016_adcondbconnection_incremental_fetch_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='late_data_lookback_hours',
+            field=models.PositiveIntegerField(default=0, help_text='Watch this many hours behind each run for rows that reach the server late, such as a logger uploading its backlog, and fetch again only the hours of the parameters that gained rows. 0 turns it off.', verbose_name='Late Data Lookback (hours)'),
+        ),
+        migrations.AddField(
+            model_name='adconstationlink',
+            name='late_data_digests',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.7 on 2026-10-18 19:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0017_adcondbconnection_late_data_lookback_hours_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='profile_statements',
+            field=models.BooleanField(default=False, help_text='Note every statement sent to this server, with its duration and row count, and show the latest next to the connection. Costs a little on every statement; turn it on while looking for a slow station link.', verbose_name='Profile Statements'),
+        ),
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='slow_statement_ms',
+            field=models.PositiveIntegerField(default=1000, help_text='Profiled statements taking at least this long are flagged, and logged as a warning.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Slow Statement Threshold (ms)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0018_adcondbconnection_profile_statements_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='compact_records',
+            field=models.BooleanField(default=False, help_text='Hold fetched records as compact read-only mappings rather than dictionaries, in about half the memory on stations with many parameters. Worth it for long backfills.', verbose_name='Compact Records'),
+        ),
+    ]
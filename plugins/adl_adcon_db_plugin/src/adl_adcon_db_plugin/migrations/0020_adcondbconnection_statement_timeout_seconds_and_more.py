@@ -0,0 +1,24 @@
+# Generated by Django 6.0.7 on 2026-10-18 20:50
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0019_adcondbconnection_compact_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='statement_timeout_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='The longest one query may run on the server before the server cancels it. A window whose query is cancelled is fetched again in halves, down to an hour. Leave empty for no limit.', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Query Time Limit (seconds)'),
+        ),
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='run_deadline_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='The longest collecting one station link may take in a run. When it passes, the query in flight is cancelled and the slices completed so far are handed over. Set it below the run time limit of the ingestion task. Leave empty for no limit.', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Station Link Time Limit (minutes)'),
+        ),
+    ]
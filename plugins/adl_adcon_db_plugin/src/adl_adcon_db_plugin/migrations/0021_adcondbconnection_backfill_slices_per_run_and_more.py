@@ -0,0 +1,24 @@
+# Generated by Django 6.0.7 on 2026-10-18 21:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0020_adcondbconnection_statement_timeout_seconds_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adcondbconnection',
+            name='backfill_slices_per_run',
+            field=models.PositiveIntegerField(default=30, help_text='At most this many slices of a backfill are fetched and handed over in one run, so a run never holds more than their records; the next run goes on from the last of them.', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Backfill Slices per Run'),
+        ),
+        migrations.AddField(
+            model_name='adconstationlink',
+            name='backfill_checkpoint_latest',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.7 on 2026-10-18 22:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_adcon_db_plugin', '0021_adcondbconnection_backfill_slices_per_run_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adcondbconnection',
+            name='stream_itersize',
+            field=models.PositiveIntegerField(blank=True, help_text="Read each window through a server-side cursor, this many rows per round trip, so the raw rows of one round trip are held at a time rather than the whole window's. The records of a run are still all held until they are handed over; Backfill Slices per Run bounds how many that is. Leave empty to read each window at once.", null=True, validators=[django.core.validators.MinValueValidator(100)], verbose_name='Streaming Batch Size'),
+        ),
+    ]
@@ -0,0 +1,142 @@
+"""
+A local mirror of each connection's ADCON station and parameter metadata — the
+DeviceNode and AnalogTagNode rows of ``node_60`` — so the admin's lookups are
+local indexed queries rather than scans of the remote table.
+
+``refresh_mirror`` is run periodically by ``tasks.refresh_metadata_mirrors``.
+It asks the server for digests first — one per station row and one per
+station's tags taken together — and then pulls only the stations and the tag
+sets whose digest no longer matches what the mirror holds, so a refresh of an
+unchanged server transfers digests and nothing else.
+
+The readers return None wherever the mirror cannot answer, and callers fall
+back to asking the server.
+"""
+
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _changes(mirrored, current):
+    """The keys whose digest changed or is new, and the keys that are gone,
+    given ``{key: digest}`` as mirrored and as the server has it now."""
+    changed = [key for key, digest in current.items() if mirrored.get(key) != digest]
+    removed = [key for key in mirrored if key not in current]
+    return changed, removed
+
+
+def refresh_mirror(network_conn):
+    """Bring a connection's mirror up to date, pulling only what changed.
+
+    Returns ``(stations pulled, stations whose parameters were pulled,
+    stations removed)``.
+    """
+    from .models import ADCONParameter, ADCONStation
+
+    mirrored = {station.adcon_id: station for station in network_conn.mirrored_stations.all()}
+
+    db = network_conn.get_db_connection()
+
+    try:
+        station_digests = db.get_station_digests()
+        # Only the tags of stations are mirrored: a tag hanging off any other
+        # node is never offered by the widgets.
+        parameter_digests = {station_id: digest for station_id, digest in db.get_parameter_digests().items()
+                             if station_id in station_digests}
+
+        changed_stations, removed_stations = _changes(
+            {adcon_id: station.row_digest for adcon_id, station in mirrored.items()}, station_digests)
+        changed_parameters, _removed = _changes(
+            {adcon_id: station.parameters_digest for adcon_id, station in mirrored.items()},
+            {station_id: parameter_digests.get(station_id, "") for station_id in station_digests})
+
+        stations = db.get_stations_by_ids(changed_stations) if changed_stations else []
+        parameters = db.get_adcon_parameters_for_stations(changed_parameters) if changed_parameters else []
+    finally:
+        db.close()
+
+    parameters_by_station = {}
+    for parameter in parameters:
+        station_id = parameter.pop("parent_id")
+        parameters_by_station.setdefault(station_id, []).append(parameter)
+
+    new_stations = []
+    for row in stations:
+        station = mirrored.get(row["id"]) or ADCONStation(network_connection=network_conn, adcon_id=row["id"])
+        station.attributes = row
+        station.has_coordinates = row["latitude"] is not None and row["longitude"] is not None
+        station.row_digest = station_digests[row["id"]]
+        if station.pk is None:
+            new_stations.append(station)
+        mirrored[row["id"]] = station
+
+    # A station deleted between the digests and the pull is not mirrored;
+    # the next refresh sees it gone.
+    changed_parameters = [station_id for station_id in changed_parameters if station_id in mirrored]
+    for station_id in changed_parameters:
+        mirrored[station_id].parameters_digest = parameter_digests.get(station_id, "")
+
+    new_ids = {station.adcon_id for station in new_stations}
+    updated = [mirrored[station_id] for station_id in set(changed_stations + changed_parameters)
+               if station_id in mirrored and station_id not in new_ids]
+
+    with transaction.atomic():
+        network_conn.mirrored_stations.filter(adcon_id__in=removed_stations).delete()
+        network_conn.mirrored_parameters.filter(
+            station_adcon_id__in=removed_stations + changed_parameters).delete()
+
+        ADCONStation.objects.bulk_create(new_stations)
+        ADCONStation.objects.bulk_update(
+            updated, ["attributes", "has_coordinates", "row_digest", "parameters_digest"])
+
+        ADCONParameter.objects.bulk_create([
+            ADCONParameter(network_connection=network_conn, station_adcon_id=station_id,
+                           adcon_id=parameter["id"], attributes=parameter)
+            for station_id in changed_parameters
+            for parameter in parameters_by_station.get(station_id, [])
+        ])
+
+        # .update() rather than save(): saving the connection would close its
+        # pool and drop its cached listings.
+        type(network_conn).objects.filter(pk=network_conn.pk).update(metadata_mirrored_at=timezone.now())
+
+    logger.info(f"[ADL_ADCON_DB_PLUGIN] Refreshed the metadata mirror of {network_conn.name}: "
+                f"{len(changed_stations)} station(s) and the parameters of {len(changed_parameters)} "
+                f"pulled, {len(removed_stations)} removed.")
+
+    return len(changed_stations), len(changed_parameters), len(removed_stations)
+
+
+def get_stations(network_conn):
+    """The connection's stations as ``ADCONDBClient.get_stations`` lists them,
+    or None while there is no usable mirror."""
+    if network_conn.metadata_mirrored_at is None:
+        return None
+
+    stations = network_conn.mirrored_stations.order_by("adcon_id")
+    if network_conn.only_stations_with_coords:
+        stations = stations.filter(has_coordinates=True)
+
+    return list(stations.values_list("attributes", flat=True))
+
+
+def get_station_parameters(network_conn, adcon_station_id):
+    """A station's parameters as ``ADCONDBClient.get_adcon_parameters_for_station``
+    lists them, or None where the mirror does not know the station."""
+    if network_conn.metadata_mirrored_at is None:
+        return None
+
+    try:
+        adcon_station_id = int(adcon_station_id)
+    except (TypeError, ValueError):
+        return None
+
+    if not network_conn.mirrored_stations.filter(adcon_id=adcon_station_id).exists():
+        return None
+
+    return list(network_conn.mirrored_parameters.filter(station_adcon_id=adcon_station_id)
+                .order_by("adcon_id").values_list("attributes", flat=True))
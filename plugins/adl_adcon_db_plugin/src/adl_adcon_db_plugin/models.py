@@ -1,11 +1,20 @@
+import time
+from importlib.util import find_spec
+
 import psycopg2
 from adl.core.models import NetworkConnection, StationLink, DataParameter, Unit
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.translation import gettext, gettext_lazy as _
 from modelcluster.fields import ParentalKey
-from wagtail.admin.panels import FieldPanel, MultiFieldPanel, InlinePanel
+from wagtail.admin.panels import FieldPanel, HelpPanel, MultiFieldPanel, InlinePanel
 
+from .aio import AsyncADCONDBClient
 from .db import ADCONDBClient, category_for_sqlstate
+from .pool import get_pool
+from .profiling import StatementProfiler
 from .validators import validate_start_date
 from .widgets import AdconStationSelectWidget, AdconVariableSelectWidget
 
@@ -17,6 +26,51 @@ from .widgets import AdconStationSelectWidget, AdconVariableSelectWidget
 # re-break the probe.
 SOURCE_CHECK_CONNECT_TIMEOUT_SECONDS = 5
 
+# What the admin's pages allow the server: a page view waits on a web worker,
+# so an unreachable or overloaded server costs it seconds, never the worker.
+ADMIN_CONNECT_TIMEOUT_SECONDS = 3
+ADMIN_STATEMENT_TIMEOUT_MS = 2000
+ADMIN_POOL_MAX_SIZE = 2
+
+
+def _station_not_found(adcon_station_id):
+    from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
+
+    # Absent from the authoritative station table is proof, not suspicion:
+    # this station link can never ingest anything.
+    return SourceCheckResult(
+        status=SourceCheckStatus.FAILED,
+        category="PATH_NOT_FOUND",
+        message=gettext("Station %(station)s was not found in the source's "
+                        "station table.") % {
+            "station": adcon_station_id,
+        },
+    )
+
+
+def _station_found(adcon_station_id, label, count):
+    from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
+
+    # The upstream's own label is what catches a valid-but-wrong id — a real
+    # station belonging to a different site — which is the failure that yields
+    # plausible wrong data rather than an outage. Zero parameters is still OK,
+    # stated plainly, and left for the operator to judge.
+    if label:
+        message = gettext('Station %(station)s found upstream as "%(label)s", '
+                          'offering %(count)s parameter(s).') % {
+            "station": adcon_station_id,
+            "label": label,
+            "count": count,
+        }
+    else:
+        message = gettext("Station %(station)s was found in the source's station "
+                          "table, offering %(count)s parameter(s).") % {
+            "station": adcon_station_id,
+            "count": count,
+        }
+
+    return SourceCheckResult(status=SourceCheckStatus.OK, message=message)
+
 
 class ADCONDBConnection(NetworkConnection):
     station_link_model_string_label = "adl_adcon_db_plugin.ADCONStationLink"
@@ -28,6 +82,149 @@ class ADCONDBConnection(NetworkConnection):
 
     only_stations_with_coords = models.BooleanField(default=False,
                                                     verbose_name=_("List Only Stations with Coordinates"))
+    metadata_cache_minutes = models.PositiveIntegerField(
+        default=15,
+        verbose_name=_("Station Listing Cache (minutes)"),
+        help_text=_("How long the station and parameter lists shown while editing are reused "
+                    "before being re-read in the background. 0 reads them on every load."),
+    )
+    # When the local mirror of the server's station and parameter metadata was
+    # last brought up to date, or None while there is no usable mirror: never
+    # refreshed yet, or the connection now points at another database.
+    metadata_mirrored_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    pool_min_size = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("Minimum Idle Connections"),
+        help_text=_("Connections kept open between ingestion runs even when idle."),
+    )
+    pool_max_size = models.PositiveSmallIntegerField(
+        default=4,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Maximum Connections"),
+        help_text=_("The most connections ingestion opens to this server at once. Keep it "
+                    "below the server's own connection limit."),
+    )
+
+    stream_itersize = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(100)],
+        verbose_name=_("Streaming Batch Size"),
+        help_text=_("Read each window through a server-side cursor, this many rows per round "
+                    "trip, so the raw rows of one round trip are held at a time rather than "
+                    "the whole window's. The records of a run are still all held until they "
+                    "are handed over; Backfill Slices per Run bounds how many that is. Leave "
+                    "empty to read each window at once."),
+    )
+
+    min_sampling_interval_minutes = models.PositiveIntegerField(
+        default=3,
+        verbose_name=_("Minimum Sampling Interval (minutes)"),
+        help_text=_("Rows sampled over a shorter interval than this are not ingested."),
+    )
+    max_sampling_interval_minutes = models.PositiveIntegerField(
+        default=20,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Maximum Sampling Interval (minutes)"),
+        help_text=_("Rows sampled over this interval or longer are not ingested."),
+    )
+
+    fetch_engine = models.CharField(
+        max_length=20,
+        choices=[
+            ("rows", _("Row by row")),
+            ("columnar", _("Columnar (NumPy)")),
+            ("copy", _("Binary COPY (NumPy)")),
+        ],
+        default="rows",
+        verbose_name=_("Fetch Engine"),
+        help_text=_("How fetched rows are read and turned into records. The columnar engine "
+                    "needs NumPy and is much faster on long windows; the binary COPY engine "
+                    "also reads each window as one binary COPY, falling back to a query where "
+                    "the server refuses it. All produce the same records."),
+    )
+    compact_records = models.BooleanField(
+        default=False,
+        verbose_name=_("Compact Records"),
+        help_text=_("Hold fetched records as compact read-only mappings rather than dictionaries, "
+                    "in about half the memory on stations with many parameters. Worth it for "
+                    "long backfills."),
+    )
+
+    incremental_fetch = models.BooleanField(
+        default=False,
+        verbose_name=_("Fetch Only New Rows"),
+        help_text=_("Remember the latest observation handed over for each station link and "
+                    "fetch only the rows ending after it, so a routine run transfers only what "
+                    "is new. Rows that reach the server late, ending before that observation, "
+                    "are then not read."),
+    )
+
+    late_data_lookback_hours = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Late Data Lookback (hours)"),
+        help_text=_("Watch this many hours behind each run for rows that reach the server late, "
+                    "such as a logger uploading its backlog, and fetch again only the hours of "
+                    "the parameters that gained rows. 0 turns it off."),
+    )
+
+    profile_statements = models.BooleanField(
+        default=False,
+        verbose_name=_("Profile Statements"),
+        help_text=_("Note every statement sent to this server, with its duration and row count, "
+                    "and show the latest next to the connection. Costs a little on every "
+                    "statement; turn it on while looking for a slow station link."),
+    )
+    slow_statement_ms = models.PositiveIntegerField(
+        default=1000,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Slow Statement Threshold (ms)"),
+        help_text=_("Profiled statements taking at least this long are flagged, and logged as a "
+                    "warning."),
+    )
+
+    backfill_slice_hours = models.PositiveIntegerField(
+        default=24,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Backfill Slice Length (hours)"),
+        help_text=_("Windows longer than this are fetched as slices of this length, so a long "
+                    "backfill is never one query the server can time out on."),
+    )
+    backfill_parallelism = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Backfill Parallel Slices"),
+        help_text=_("How many slices of one backfill are fetched at once. Capped by the maximum "
+                    "connections above."),
+    )
+    backfill_slices_per_run = models.PositiveIntegerField(
+        default=30,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Backfill Slices per Run"),
+        help_text=_("At most this many slices of a backfill are fetched and handed over in one "
+                    "run, so a run never holds more than their records; the next run goes on "
+                    "from the last of them."),
+    )
+
+    statement_timeout_seconds = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Query Time Limit (seconds)"),
+        help_text=_("The longest one query may run on the server before the server cancels it. "
+                    "A window whose query is cancelled is fetched again in halves, down to an "
+                    "hour. Leave empty for no limit."),
+    )
+    run_deadline_minutes = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Station Link Time Limit (minutes)"),
+        help_text=_("The longest collecting one station link may take in a run. When it passes, the "
+                    "query in flight is cancelled and the slices completed so far are handed over. "
+                    "Set it below the run time limit of the ingestion task. Leave empty for no limit."),
+    )
 
     panels = NetworkConnection.panels + [
         MultiFieldPanel([
@@ -38,13 +235,41 @@ class ADCONDBConnection(NetworkConnection):
             FieldPanel("db_password"),
         ], heading=_("Database Credentials")),
         FieldPanel("only_stations_with_coords"),
+        FieldPanel("metadata_cache_minutes"),
+        MultiFieldPanel([
+            FieldPanel("pool_min_size"),
+            FieldPanel("pool_max_size"),
+        ], heading=_("Connection Pool")),
+        MultiFieldPanel([
+            FieldPanel("min_sampling_interval_minutes"),
+            FieldPanel("max_sampling_interval_minutes"),
+        ], heading=_("Sampling Interval")),
+        MultiFieldPanel([
+            FieldPanel("fetch_engine"),
+            FieldPanel("compact_records"),
+            FieldPanel("incremental_fetch"),
+            FieldPanel("late_data_lookback_hours"),
+            FieldPanel("stream_itersize"),
+            FieldPanel("backfill_slice_hours"),
+            FieldPanel("backfill_parallelism"),
+            FieldPanel("backfill_slices_per_run"),
+        ], heading=_("Fetching")),
+        MultiFieldPanel([
+            FieldPanel("statement_timeout_seconds"),
+            FieldPanel("run_deadline_minutes"),
+        ], heading=_("Time Limits")),
+        MultiFieldPanel([
+            FieldPanel("profile_statements"),
+            FieldPanel("slow_statement_ms"),
+            HelpPanel(template="adl_adcon_db_plugin/panels/statement_profile_link.html"),
+        ], heading=_("Profiling")),
     ]
 
     class Meta:
         verbose_name = _("ADCON Database Connection")
         verbose_name_plural = _("ADCON Database Connections")
 
-    def get_db_connection(self, connect_timeout=None):
+    def get_db_connection(self, connect_timeout=None, pooled=False, deadline=None):
         """
         Returns the ADCON database client.
 
@@ -52,16 +277,161 @@ class ADCONDBConnection(NetworkConnection):
         connect. The diagnostic's on-demand checks pass a bound instead, so they
         come back inside core's probe budget without changing what ingestion
         does.
+
+        Ingestion asks for a pooled client, which borrows a connection from
+        this process's pool for the connection and hands it back on close().
+        The checks never do: for them the connect is the thing being checked.
+
+        The client's fetches are counted against this connection in
+        ``metrics``, and its statements profiled where the connection asks for
+        it. Its session cancels any statement past the connection's query time
+        limit, and its fetches are cancelled at ``deadline``, a
+        ``time.monotonic()`` such as ``get_run_deadline`` returns.
+        """
+        pool = None
+        if pooled:
+            pool = get_pool(self.pk, min_size=self.pool_min_size, max_size=self.pool_max_size)
+
+        return self._client(connect_timeout=connect_timeout, pool=pool, deadline=deadline,
+                            statement_timeout=self.get_statement_timeout_ms())
+
+    def get_statement_timeout_ms(self):
+        if self.statement_timeout_seconds is None:
+            return None
+        return self.statement_timeout_seconds * 1000
+
+    def get_run_deadline(self):
+        """When a station link's collection starting now must be done by, as a
+        ``time.monotonic()``, or None."""
+        if self.run_deadline_minutes is None:
+            return None
+        return time.monotonic() + self.run_deadline_minutes * 60
+
+    @property
+    def admin_pool_key(self):
+        return self.pk, "admin"
+
+    def get_admin_db_connection(self):
+        """
+        Returns an ADCON database client for the admin's pages: its connect
+        and its statements bounded, so a page fails in seconds where the
+        server does not answer, and borrowed from a small pool of its own, so
+        page views reuse sessions rather than open one each. Ingestion's pool
+        is kept apart, its sessions being opened without those bounds.
         """
+        pool = get_pool(self.admin_pool_key, max_size=ADMIN_POOL_MAX_SIZE,
+                        acquire_timeout=ADMIN_CONNECT_TIMEOUT_SECONDS)
+
+        return self._client(connect_timeout=ADMIN_CONNECT_TIMEOUT_SECONDS, pool=pool,
+                            statement_timeout=ADMIN_STATEMENT_TIMEOUT_MS)
+
+    def _client(self, **options):
+        profiler = None
+        if self.profile_statements:
+            profiler = StatementProfiler(self.pk, self.slow_statement_ms)
+
         return ADCONDBClient(
+            db_host=self.db_host,
+            db_port=self.db_port,
+            db_user=self.db_user,
+            db_password=self.db_password,
+            db_name=self.db_name,
+            connection_id=self.pk,
+            profiler=profiler,
+            **options,
+        )
+
+    async def get_async_db_connection(self, connect_timeout=None):
+        """
+        Returns an asyncio ADCON database client, for fetching from many
+        servers at once. Never pooled: the run that opens it bounds and reuses
+        its own sessions to this server.
+        """
+        return await AsyncADCONDBClient.connect(
             db_host=self.db_host,
             db_port=self.db_port,
             db_user=self.db_user,
             db_password=self.db_password,
             db_name=self.db_name,
             connect_timeout=connect_timeout,
+            statement_timeout=self.get_statement_timeout_ms(),
         )
 
+    def clean(self):
+        super().clean()
+
+        if self.min_sampling_interval_minutes >= self.max_sampling_interval_minutes:
+            raise ValidationError({
+                "max_sampling_interval_minutes": _("Must be greater than the minimum sampling interval."),
+            })
+
+        if self.fetch_engine in ("columnar", "copy") and find_spec("numpy") is None:
+            raise ValidationError({
+                "fetch_engine": _("This engine needs NumPy, which is not installed."),
+            })
+
+    def get_sampling_interval(self):
+        """
+        The ``[min, max)`` sampling interval, in seconds, of the rows ingestion
+        keeps.
+        """
+        return self.min_sampling_interval_minutes * 60, self.max_sampling_interval_minutes * 60
+
+    def get_fetch_options(self):
+        """
+        The keyword arguments ingestion passes to the client's fetch for this
+        connection.
+        """
+        return {
+            "itersize": self.stream_itersize,
+            "sampling_interval": self.get_sampling_interval(),
+            "engine": self.fetch_engine,
+            "compact": self.compact_records,
+        }
+
+    def check_station_links(self, station_links=None):
+        """
+        ``check_station_source`` for many of this connection's station links at
+        once — all of them unless ``station_links`` is given — over one connect
+        and one query, however many links. Returns their results in the same
+        order.
+
+        The query reads each station's row and counts its parameters in the same
+        scan of ``node_60``, so a missing grant surfaces here as it does in the
+        single-link check. A failed read fails every link alike: it is proof of
+        nothing about any one station.
+        """
+        from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
+
+        if station_links is None:
+            station_links = list(ADCONStationLink.objects.filter(network_connection=self))
+
+        client = None
+
+        try:
+            client = self.get_db_connection(connect_timeout=SOURCE_CHECK_CONNECT_TIMEOUT_SECONDS)
+            summaries = client.get_station_summaries({link.adcon_station_id for link in station_links})
+        except psycopg2.Error as e:
+            failed = SourceCheckResult(
+                status=SourceCheckStatus.FAILED,
+                category=category_for_sqlstate(e.pgcode),
+                message=str(e),
+            )
+            return [failed for _link in station_links]
+        finally:
+            if client is not None:
+                client.close()
+
+        results = []
+        for link in station_links:
+            summary = summaries.get(link.adcon_station_id)
+            if summary is None:
+                results.append(_station_not_found(link.adcon_station_id))
+            else:
+                results.append(_station_found(link.adcon_station_id, summary[0] or "", summary[1]))
+
+        return results
+
     def get_source_endpoint(self):
         """
         The (host, port) core's generic DNS -> TCP probe dials (layer 4 of the
@@ -123,6 +493,54 @@ class ADCONDBConnection(NetworkConnection):
         )
 
 
+class ADCONStation(models.Model):
+    """
+    A DeviceNode row of a connection's ``node_60``, mirrored locally by
+    ``mirror.refresh_mirror``.
+    """
+    network_connection = models.ForeignKey(ADCONDBConnection, on_delete=models.CASCADE,
+                                           related_name="mirrored_stations")
+    adcon_id = models.BigIntegerField()
+    has_coordinates = models.BooleanField(default=False)
+    # The row as ADCONDBClient.get_stations returns it, so a lookup answered
+    # from the mirror is exactly the one answered live.
+    attributes = models.JSONField(encoder=DjangoJSONEncoder)
+    # The server's digests of this row and of its tags as last mirrored; a
+    # refresh pulls only what no longer matches.
+    row_digest = models.CharField(max_length=32)
+    parameters_digest = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["network_connection", "adcon_id"],
+                                    name="unique_mirrored_adcon_station"),
+        ]
+
+    def __str__(self):
+        return f"{self.adcon_id} - {self.attributes.get('displayname')}"
+
+
+class ADCONParameter(models.Model):
+    """
+    An AnalogTagNode row of a connection's ``node_60``, mirrored locally.
+    """
+    network_connection = models.ForeignKey(ADCONDBConnection, on_delete=models.CASCADE,
+                                           related_name="mirrored_parameters")
+    station_adcon_id = models.BigIntegerField()
+    adcon_id = models.BigIntegerField()
+    # The row as ADCONDBClient.get_adcon_parameters_for_station returns it.
+    attributes = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["network_connection", "station_adcon_id"],
+                         name="adcon_parameter_station_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.adcon_id} - {self.attributes.get('displayname')}"
+
+
 class ADCONStationLink(StationLink):
     adcon_station_id = models.PositiveIntegerField(verbose_name=_("ADCON Station ID"),
                                                    help_text=_("Select an ADCON Station ID"))
@@ -138,6 +556,23 @@ class ADCONStationLink(StationLink):
             "last hour."
         ),
     )
+    # The end of the last slice of an interrupted backfill that was handed to
+    # core, so the next run resumes there even when the slices behind it held
+    # no records for core to count from. Cleared once a backfill completes and
+    # whenever start_date is edited.
+    backfill_checkpoint = models.DateTimeField(blank=True, null=True, editable=False)
+    # The latest observation handed to core from the slices behind the
+    # checkpoint, or None where they held none: a run only resumes from the
+    # checkpoint once core has saved up to it.
+    backfill_checkpoint_latest = models.DateTimeField(blank=True, null=True, editable=False)
+    # The latest observation time handed to core, when the connection fetches
+    # incrementally: the next run only reads rows ending after it, or after the
+    # latest observation core has saved where that is earlier. Cleared
+    # whenever start_date or the station is edited.
+    fetch_watermark = models.DateTimeField(blank=True, null=True, editable=False)
+    # The per-hour digests of the lookback the last run saw, so the next one
+    # can tell which hours gained rows since; see late_data.
+    late_data_digests = models.JSONField(blank=True, null=True, editable=False)
 
     panels = StationLink.panels + [
         FieldPanel("adcon_station_id", widget=AdconStationSelectWidget("get_adcon_stations_for_connection")),
@@ -171,13 +606,15 @@ class ADCONStationLink(StationLink):
         the ingestion diagnostic, station-scoped).
 
         Two queries, because they answer different questions. The station table
-        is authoritative, so a membership test over it gives positive proof of
-        absence and the upstream's own label for free. The per-station
-        parameters query is then run **for its error, not its result**: it is
-        the only place in the whole diagnostic that can see a missing per-table
-        SELECT grant, which is an ordinary fault that otherwise produces a
-        permanently silent connection — layer 4 fine, layer 5 fine, and layer 6
-        watching no records arrive with nothing to blame.
+        is authoritative, so a lookup of the id in it gives positive proof of
+        absence and the upstream's own label for free — by primary key, so
+        only the matching row is read however many nodes the server has. The
+        per-station parameters query is then run **for its error, not its
+        result**: it is the only place in the whole diagnostic that can see a
+        missing per-table SELECT grant, which is an ordinary fault that
+        otherwise produces a permanently silent connection — layer 4 fine,
+        layer 5 fine, and layer 6 watching no records arrive with nothing to
+        blame.
         """
         from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
 
@@ -187,22 +624,10 @@ class ADCONStationLink(StationLink):
         try:
             client = connection.get_db_connection(
                 connect_timeout=SOURCE_CHECK_CONNECT_TIMEOUT_SECONDS)
-            stations = client.get_stations()
-
-            station = next(
-                (s for s in stations if s.get("id") == self.adcon_station_id), None)
+            station = client.get_station(self.adcon_station_id)
 
             if station is None:
-                # Absent from the authoritative station table is proof, not
-                # suspicion: this station link can never ingest anything.
-                return SourceCheckResult(
-                    status=SourceCheckStatus.FAILED,
-                    category="PATH_NOT_FOUND",
-                    message=gettext("Station %(station)s was not found in the source's "
-                                    "station table.") % {
-                        "station": self.adcon_station_id,
-                    },
-                )
+                return _station_not_found(self.adcon_station_id)
 
             parameters = client.get_adcon_parameters_for_station(self.adcon_station_id)
         except psycopg2.Error as e:
@@ -219,29 +644,8 @@ class ADCONStationLink(StationLink):
             if client is not None:
                 client.close()
 
-        # The upstream's own label is what catches a valid-but-wrong id — a real
-        # station belonging to a different site — which is the failure that
-        # yields plausible wrong data rather than an outage. The parameter count
-        # is a byproduct of a query we had to run anyway; zero is still OK,
-        # stated plainly, and left for the operator to judge.
-        label = station.get("displayname") or ""
-        count = len(parameters)
-
-        if label:
-            message = gettext('Station %(station)s found upstream as "%(label)s", '
-                              'offering %(count)s parameter(s).') % {
-                "station": self.adcon_station_id,
-                "label": label,
-                "count": count,
-            }
-        else:
-            message = gettext("Station %(station)s was found in the source's station "
-                              "table, offering %(count)s parameter(s).") % {
-                "station": self.adcon_station_id,
-                "count": count,
-            }
-
-        return SourceCheckResult(status=SourceCheckStatus.OK, message=message)
+        # The parameter count is a byproduct of a query we had to run anyway.
+        return _station_found(self.adcon_station_id, station.get("displayname") or "", len(parameters))
 
 
 class ADCONStationVariableMapping(models.Model):
@@ -1,16 +1,37 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
 
+import psycopg2
 from adl.core.registries import Plugin
+from asgiref.sync import async_to_sync, sync_to_async
+
+from . import late_data, metrics
+from .aio import AsyncServerSessions
+from .loading import prefetch_station_links
+from .metrics import FetchCost
+from .runner import DEFAULT_MAX_WORKERS, as_station_data, run_station_links
 
 logger = logging.getLogger(__name__)
 
+# The shortest window a timed-out fetch is split into.
+MIN_SPLIT_SECONDS = 3600
+
 
 class ADCONDBPlugin(Plugin):
     type = "adl_adcon_db_plugin"
     label = "ADL ADCON DB Plugin"
 
     def get_urls(self):
-        return []
+        from django.urls import path
+
+        from .views import adcon_db_metrics
+
+        # Outside the admin, for Prometheus to scrape; the view guards itself.
+        return [
+            path("adl-db-plugin/metrics/", adcon_db_metrics, name="adcon_db_metrics"),
+        ]
 
     def get_station_data(self, station_link, start_date=None, end_date=None):
         network_connection = station_link.network_connection
@@ -18,40 +39,743 @@ class ADCONDBPlugin(Plugin):
 
         logger.info(f"[ADL_ADCON_DB_PLUGIN] Starting data processing for {network_conn_name}.")
 
-        db = network_connection.get_db_connection()
-
         try:
-            station_name = station_link.station.name
+            logger.debug(f"[ADL_ADCON_DB_PLUGIN] Getting latest data for {station_link.station.name}.")
 
-            logger.debug(f"[ADL_ADCON_DB_PLUGIN] Getting latest data for {station_name}.")
+            windows = self._windows(station_link, start_date, end_date)
+            [after] = self._watermarks([station_link])
+            # The cost of the run's fetches goes to the cache once, at its end.
+            with metrics.batched():
+                return self._get_windows_data(station_link, windows, int(end_date.timestamp()), after,
+                                              network_connection.get_run_deadline())
 
-            station_timezone = station_link.timezone
+        except Exception as e:
+            logger.error(f"[ADL_ADCON_DB_PLUGIN] Error processing data for {network_conn_name}. {e}")
+            raise e
 
-            station_variable_mappings = station_link.get_variable_mappings()
-            station_adcon_parameter_ids = [mapping.adcon_parameter_id for mapping in station_variable_mappings]
+    def _get_windows_data(self, station_link, windows, end_timestamp, after, deadline):
+        """
+        The records of the link's ``windows``, as ``_windows`` planned them,
+        read after ``after``, with the sources count, checkpoint, watermark and
+        late data seen to. ``end_timestamp`` is the end of the window core
+        asked for, which a run of a long backfill stops short of.
+        """
+        network_connection = station_link.network_connection
+        station_adcon_parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
 
-            start_timestamp = int(start_date.timestamp())
-            end_timestamp = int(end_date.timestamp())
+        costs = []
+        fetch = self._fetcher(station_link, station_adcon_parameter_ids, after, deadline, costs)
+
+        watched = late_data.watch(station_link, station_adcon_parameter_ids, windows[-1][1])
+
+        if len(windows) == 1 and windows[0][1] == end_timestamp:
+            records = self._hand_over_window(station_link, *fetch(windows[0]))
+        else:
+            records = self._get_sliced_station_data(station_link, windows, end_timestamp, fetch)
+
+        records = self._finish_station_data(station_link, records, windows[0][0], after, watched, fetch)
+
+        self._log_cost(f"{station_link.station.name} ({network_connection.name})", costs,
+                       connection_id=network_connection.pk, station_link_id=station_link.pk)
+
+        return records
+
+    @staticmethod
+    def _fetcher(station_link, parameter_ids, after, deadline, costs):
+        """
+        The ``fetch(window, parameter_ids, after)`` every query of the link's
+        run goes through, defaulting to the link's own tags and watermark. A
+        window the statement timeout cancels is fetched again in halves, and
+        each fetch's cost is added to ``costs``.
+        """
+        network_connection = station_link.network_connection
+        station_timezone = station_link.timezone
+
+        def fetch(window, parameter_ids=parameter_ids, after=after):
+            # Borrowed from the connection's pool, so a connection with
+            # hundreds of station links pays its handshakes once rather
+            # than once per link, and parallel slices each get their own.
+            db = network_connection.get_db_connection(pooled=True, deadline=deadline)
+
+            def fetch_window(window):
+                fetched = db.get_data_for_parameters(
+                    parameter_ids, window[0], window[1], station_timezone,
+                    after=after, **network_connection.get_fetch_options())
+                if db.last_cost is not None:
+                    costs.append(db.last_cost)
+                return fetched
 
-            records, sources_count = db.get_data_for_parameters(
-                station_adcon_parameter_ids, start_timestamp, end_timestamp, station_timezone)
-
-            # Duck-typed sources-count handover: core stores this on the run's
-            # activity log so "looked, found nothing" (0) stays distinguishable
-            # from "never looked" (None). Committed only here, once the fetch
-            # has returned — a query that raised leaves the attribute None, and
-            # core's evidence rule abstains on NULL rather than blaming the
-            # source for a run that never got an answer. The accumulate idiom is
-            # used even though this plugin makes one query: there is no
-            # straight-assignment variant.
-            if getattr(station_link, "adl_sources_count", None) is None:
-                station_link.adl_sources_count = 0
-            station_link.adl_sources_count += sources_count
+            try:
+                return split_on_timeout(fetch_window, window)
+            finally:
+                db.close()
 
+        return fetch
+
+    def _hand_over_window(self, station_link, records, sources_count):
+        """The records of a run that fitted one window, its count added and an
+        old checkpoint cleared: the window reached past it."""
+        self._add_sources_count(station_link, sources_count)
+        if station_link.backfill_checkpoint is not None:
+            self._save_checkpoint(station_link, None)
+        return records
+
+    def _finish_station_data(self, station_link, records, start_timestamp, after, watched, fetch):
+        """Advance the link's watermark past ``records``, and add the late data
+        of its lookback."""
+        self._advance_watermark(station_link, records)
+
+        if watched is None:
             return records
 
+        # Rows from the watermark on were read by the fetch itself.
+        fetched_from = max(start_timestamp, after) if after is not None else start_timestamp
+        return records + self._get_late_station_data(station_link, watched, fetched_from, fetch)
+
+    @classmethod
+    def _windows(cls, station_link, start_date, end_date):
+        """
+        The windows, in epoch seconds, that collecting ``[start_date,
+        end_date]`` fetches this run: the whole of it where it fits in one
+        slice, otherwise its first slices, as many as the connection fetches
+        per run — either way starting from an interrupted backfill's
+        checkpoint when there is one inside it that core has saved up to.
+        """
+        start_timestamp = int(start_date.timestamp())
+        end_timestamp = int(end_date.timestamp())
+
+        checkpoint = station_link.backfill_checkpoint
+        if checkpoint is not None and start_date < checkpoint < end_date and cls._checkpoint_saved(station_link):
+            logger.info(f"[ADL_ADCON_DB_PLUGIN] Resuming the backfill of {station_link.station.name} "
+                        f"from {checkpoint}.")
+            start_timestamp = int(checkpoint.timestamp())
+
+        network_connection = station_link.network_connection
+        slice_seconds = network_connection.backfill_slice_hours * 3600
+
+        if end_timestamp - start_timestamp <= slice_seconds:
+            return [(start_timestamp, end_timestamp)]
+
+        slices = time_slices(start_timestamp, end_timestamp, slice_seconds)
+
+        slices_per_run = network_connection.backfill_slices_per_run
+        if len(slices) > slices_per_run:
+            logger.info(f"[ADL_ADCON_DB_PLUGIN] Fetching the first {slices_per_run} of the {len(slices)} slices "
+                        f"of the backfill of {station_link.station.name}; the rest follow in the next runs.")
+            slices = slices[:slices_per_run]
+
+        return slices
+
+    @classmethod
+    def _checkpoint_saved(cls, station_link):
+        """
+        Whether core has saved the records handed over up to the link's
+        checkpoint, so a run may resume from it. The checkpoint is written as
+        the slices behind it complete, before core has saved any of them.
+        """
+        latest = station_link.backfill_checkpoint_latest
+        if latest is None:
+            # The slices behind it held nothing for core to save.
+            return True
+
+        [saved_until] = cls._saved_until([station_link])
+        if saved_until is not None and saved_until >= latest:
+            return True
+
+        logger.info(f"[ADL_ADCON_DB_PLUGIN] The records of the backfill of {station_link.station.name} up to "
+                    f"{station_link.backfill_checkpoint} were not saved; fetching them again.")
+        return False
+
+    def _get_sliced_station_data(self, station_link, slices, end_timestamp, fetch):
+        """
+        Fetch a long window slice by slice, handing back whatever leading run
+        of slices completed.
+
+        The checkpoint follows the leading run as each slice completes, with
+        the latest observation in it, so a run that is killed still moves past
+        the slices that held nothing; the slices that held records are only
+        resumed after once core has saved them (see ``_checkpoint_saved``).
+
+        A slice that fails after others have completed ends the run early
+        instead of failing it: the completed slices' records are returned, and
+        the next run resumes from the checkpoint at the end of the last of
+        them. So does the run after one that fetched only the first slices of a
+        backfill longer than the connection fetches per run. Only a failure of
+        the very first slice raises, since there is then nothing to hand over.
+        """
+        network_connection = station_link.network_connection
+        parallelism = min(network_connection.backfill_parallelism, network_connection.pool_max_size)
+
+        logger.info(f"[ADL_ADCON_DB_PLUGIN] Fetching {len(slices)} slices for {station_link.station.name} "
+                    f"({parallelism} at a time).")
+
+        records = []
+        sources_count = 0
+        completed_until = None
+        latest = None
+
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = [executor.submit(fetch, window) for window in slices]
+
+            for window, future in zip(slices, futures):
+                try:
+                    slice_records, slice_count = future.result()
+                except Exception as e:
+                    for pending in futures:
+                        pending.cancel()
+
+                    if completed_until is None:
+                        raise
+
+                    logger.warning(f"[ADL_ADCON_DB_PLUGIN] Backfill of {station_link.station.name} stopped at "
+                                   f"{completed_until}; it resumes there next run. {e}")
+                    break
+
+                records.extend(slice_records)
+                sources_count += slice_count
+                completed_until = window[1]
+                latest = self._latest(slice_records, latest)
+                self._save_checkpoint(station_link, completed_until, latest)
+
+        if completed_until == end_timestamp:
+            # Every slice is in hand, so from here on core's own record of
+            # what it has saved is the better guide.
+            completed_until = latest = None
+
+        self._add_sources_count(station_link, sources_count)
+        self._save_checkpoint(station_link, completed_until, latest)
+
+        return records
+
+    def _get_late_station_data(self, station_link, watched, fetched_from, fetch):
+        """
+        Fetch again the hours of the lookback that gained rows since the last
+        run, and record the digests this run saw. Only the rows those hours
+        gained count towards the sources count (``late_data.late_rows``); the
+        rest were counted when first fetched.
+
+        A failure here costs only the late rows: the fetch's own records are
+        still handed over, and the old digests are kept, so the next run finds
+        the same hours changed and tries again.
+        """
+        windows = late_data.late_windows(station_link.late_data_digests, watched, fetched_from)
+
+        records = []
+
+        if windows:
+            logger.info(f"[ADL_ADCON_DB_PLUGIN] Fetching {len(windows)} window(s) of late data for "
+                        f"{station_link.station.name}.")
+
+        try:
+            for start_timestamp, end_timestamp, parameter_ids in windows:
+                window_records, _window_count = fetch((start_timestamp, end_timestamp), parameter_ids, None)
+                records.extend(window_records)
         except Exception as e:
-            logger.error(f"[ADL_ADCON_DB_PLUGIN] Error processing data for {network_conn_name}. {e}")
-            raise e
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not fetch the late data of {station_link.station.name}; "
+                           f"it is tried again next run. {e}")
+            return []
+
+        if windows:
+            self._add_sources_count(station_link,
+                                    late_data.late_rows(station_link.late_data_digests, watched, windows))
+
+        digests = late_data.recorded(watched)
+        station_link.late_data_digests = digests
+        if station_link.pk is not None:
+            type(station_link).objects.filter(pk=station_link.pk).update(late_data_digests=digests)
+
+        return records
+
+    @staticmethod
+    def _latest(records, latest=None):
+        """The latest observation time of ``records``, or ``latest`` where it is
+        later or there are none."""
+        times = [record["observation_time"] for record in records]
+        if latest is not None:
+            times.append(latest)
+        return max(times, default=None)
+
+    @staticmethod
+    def _save_checkpoint(station_link, timestamp, latest=None):
+        checkpoint = None
+        if timestamp is not None:
+            checkpoint = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+        station_link.backfill_checkpoint = checkpoint
+        station_link.backfill_checkpoint_latest = latest
+
+        # Written before core has saved the records behind it, with the latest
+        # of them: a worker killed halfway through must not resume from slices
+        # whose records never reached core, and the next run checks that they
+        # did (see ``_checkpoint_saved``).
+        if station_link.pk is not None:
+            type(station_link).objects.filter(pk=station_link.pk).update(
+                backfill_checkpoint=checkpoint, backfill_checkpoint_latest=latest)
+
+    @classmethod
+    def _watermarks(cls, station_links):
+        """
+        The epoch ``enddate`` a fetch for each link only reads rows after, or
+        None where the whole window is read, in the same order.
+
+        ``fetch_watermark`` is the latest observation handed to core, written
+        before core has saved anything. It only bounds a fetch as far as core
+        confirms it: up to the latest observation core holds for the link,
+        read here at the start of the next run. A run whose records core never
+        saved is then read again rather than skipped.
+        """
+        watched = [link for link in station_links
+                   if link.network_connection.incremental_fetch and link.fetch_watermark is not None]
+        saved = dict(zip(map(id, watched), cls._saved_until(watched))) if watched else {}
+
+        watermarks = []
+        for station_link in station_links:
+            saved_until = saved.get(id(station_link))
+            if saved_until is None:
+                watermarks.append(None)
+            else:
+                watermarks.append(int(min(station_link.fetch_watermark, saved_until).timestamp()))
+        return watermarks
+
+    @staticmethod
+    def _saved_until(station_links):
+        """
+        The time of the latest observation core has saved for each link's
+        station over the link's mapped parameters, or None where it has none,
+        read in one query for all of them.
+
+        Where core's records cannot be read, every link gets None: reading a
+        whole window again costs a query, skipping one costs data.
+        """
+        from django.core.exceptions import FieldError
+        from django.db import DatabaseError
+        from django.db.models import Max
+
+        parameters = [{mapping.adl_parameter_id for mapping in link.get_variable_mappings()}
+                      for link in station_links]
+
+        try:
+            from adl.core.models import ObservationRecord
+
+            latest = {
+                (row["station_id"], row["parameter_id"]): row["latest"]
+                for row in ObservationRecord.objects.filter(
+                    station_id__in={link.station_id for link in station_links},
+                    parameter_id__in=set().union(*parameters),
+                ).values("station_id", "parameter_id").annotate(latest=Max("time"))
+            }
+        except (ImportError, FieldError, DatabaseError) as e:
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not read the observations core saved; "
+                           f"fetching whole windows. {e}")
+            return [None] * len(station_links)
+
+        return [
+            max((latest[key] for key in ((link.station_id, parameter_id) for parameter_id in link_parameters)
+                 if key in latest), default=None)
+            for link, link_parameters in zip(station_links, parameters)
+        ]
+
+    @staticmethod
+    def _advance_watermark(station_link, records):
+        """Move the link's watermark up to the latest observation handed over.
+
+        Never down: a run that found nothing new, or re-read older rows after
+        a checkpoint, leaves it where it was. Written when the records are
+        handed over, like the checkpoint, and only trusted as far as core has
+        saved them since (see ``_watermarks``).
+        """
+        if not station_link.network_connection.incremental_fetch or not records:
+            return
+
+        latest = max(record["observation_time"] for record in records)
+        if station_link.fetch_watermark is not None and latest <= station_link.fetch_watermark:
+            return
+
+        station_link.fetch_watermark = latest
+        if station_link.pk is not None:
+            type(station_link).objects.filter(pk=station_link.pk).update(fetch_watermark=latest)
+
+    def get_stations_data(self, requests):
+        """
+        Collect many station links at once, one batched fetch per ADCON
+        connection instead of one query per link.
+
+        ``requests`` is a sequence of ``(station_link, start_date, end_date)``;
+        the result is the list of records for each, in the same order. Each
+        link goes through the same steps as in ``get_station_data`` — its
+        checkpoint, watermark, late data and sources count — and only its
+        window's fetch is shared:
+
+        * a link whose window is sliced, resuming or starting a backfill, and
+          every link of a streaming connection, is collected alone by
+          ``get_station_data``: a batch is one materialised query, which is
+          what slicing and streaming are there to avoid;
+        * a batch the statement timeout cancels is fetched again link by link,
+          each split on timeout as it would be alone; the run's deadline is the
+          connection's, shared by its batch and its links;
+        * the late data of a link's lookback is digested and fetched per link,
+          as alone.
+
+        Connections are fetched one after another. One that fails raises, as
+        ``get_station_data`` would; the links of connections fetched before it
+        keep the counts they were given, and the rest are left None.
+        """
+        requests = list(requests)
+        results = [None] * len(requests)
+        prefetch_station_links(station_link for station_link, _start_date, _end_date in requests)
+
+        by_connection = {}
+        for index, (station_link, _start_date, _end_date) in enumerate(requests):
+            by_connection.setdefault(station_link.network_connection_id, []).append(index)
+
+        with metrics.batched():
+            for indexes in by_connection.values():
+                network_connection = requests[indexes[0]][0].network_connection
+                network_conn_name = network_connection.name
+
+                logger.info(f"[ADL_ADCON_DB_PLUGIN] Starting batched data processing for {network_conn_name} "
+                            f"({len(indexes)} station links).")
+
+                try:
+                    self._get_batched_station_data(network_connection, requests, indexes, results)
+                except Exception as e:
+                    logger.error(f"[ADL_ADCON_DB_PLUGIN] Error processing data for {network_conn_name}. {e}")
+                    raise e
+
+        return results
+
+    def _get_batched_station_data(self, network_connection, requests, indexes, results):
+        """The records of one connection's links, into ``results`` at their
+        indexes."""
+        deadline = network_connection.get_run_deadline()
+        watermarks = self._watermarks([requests[index][0] for index in indexes])
+
+        plans = {}
+        for index, after in zip(indexes, watermarks):
+            station_link, start_date, end_date = requests[index]
+            windows = self._windows(station_link, start_date, end_date)
+
+            end_timestamp = int(end_date.timestamp())
+
+            if network_connection.stream_itersize or len(windows) > 1 or windows[0][1] != end_timestamp:
+                results[index] = self._get_windows_data(station_link, windows, end_timestamp, after, deadline)
+                continue
+
+            parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+            costs = []
+            plans[index] = {
+                "window": windows[0],
+                "after": after,
+                "costs": costs,
+                "fetch": self._fetcher(station_link, parameter_ids, after, deadline, costs),
+                "watched": late_data.watch(station_link, parameter_ids, windows[0][1]),
+                "group": (parameter_ids, *windows[0], station_link.timezone),
+            }
+
+        if not plans:
+            return
+
+        db = network_connection.get_db_connection(pooled=True, deadline=deadline)
+
+        try:
+            fetched = db.get_data_for_parameter_groups(
+                {index: plan["group"] for index, plan in plans.items()},
+                sampling_interval=network_connection.get_sampling_interval(),
+                engine=network_connection.fetch_engine,
+                watermarks={index: plan["after"] for index, plan in plans.items()},
+                compact=network_connection.compact_records)
+        except psycopg2.extensions.QueryCanceledError as e:
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] The batched query for {network_connection.name} timed out; "
+                           f"fetching its {len(plans)} station links one by one. {e}")
+            fetched = {index: plan["fetch"](plan["window"]) for index, plan in plans.items()}
         finally:
             db.close()
+
+        if db.last_cost is not None:
+            self._log_cost(f"{network_connection.name}, batched", [db.last_cost],
+                           connection_id=network_connection.pk,
+                           station_link_ids=[requests[index][0].pk for index in plans])
+
+        for index, (records, sources_count) in fetched.items():
+            station_link = requests[index][0]
+            plan = plans[index]
+
+            records = self._hand_over_window(station_link, records, sources_count)
+            results[index] = self._finish_station_data(
+                station_link, records, plan["window"][0], plan["after"], plan["watched"], plan["fetch"])
+
+            self._log_cost(f"{station_link.station.name} ({network_connection.name})", plan["costs"],
+                           connection_id=network_connection.pk, station_link_id=station_link.pk)
+
+    def run_station_links(self, requests, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Collect many station links in parallel on a bounded thread pool, each
+        through ``get_station_data``, never holding more of a server's
+        connections at once than its connection allows.
+
+        ``requests`` is a sequence of ``(station_link, start_date, end_date)``.
+        The result is core's per-link shape, as ``aget_stations_data`` gives
+        it: in the same order, each link's records or the exception it raised
+        (``runner.as_station_data``). Each link's time is logged as it
+        finishes. Sources counts and checkpoints are left on the links exactly
+        as ``get_station_data`` leaves them.
+        """
+        # One write of the whole run's costs, not one per worker's fetch.
+        with metrics.batched():
+            results = run_station_links(self, requests, max_workers=max_workers)
+
+        return as_station_data(results)
+
+    def get_stations_data_concurrently(self, requests):
+        """
+        ``aget_stations_data`` for synchronous callers.
+        """
+        return async_to_sync(self.aget_stations_data)(requests)
+
+    async def aget_stations_data(self, requests):
+        """
+        Collect many station links concurrently, across any number of ADCON
+        connections, so one slow server only delays its own links.
+
+        ``requests`` is a sequence of ``(station_link, start_date, end_date)``.
+        Each link is fetched as ``get_station_data`` would fetch it — the same
+        windows, checkpoint, watermark, late data and sources count — but on
+        asyncio clients, with at most the connection's maximum connections open
+        to each server at once.
+
+        The result is, in the same order, each link's records or the exception
+        its fetch raised: one failing server does not cost the others their
+        records. A link that failed keeps a None count, as it would alone.
+
+        Streaming is not available on asynchronous connections; each window is
+        read whole. The time limits are the blocking path's: each connection's
+        statement timeout, and its run deadline from the start of the run.
+        """
+        requests = list(requests)
+
+        # The ORM is only used before and after the fetch, never from inside
+        # the event loop.
+        plans = await sync_to_async(self._plan_requests)(requests)
+        outcomes = await self._fetch_plans(plans)
+
+        # The late data fetches of the hand-over are counted in one write.
+        with metrics.batched():
+            return await sync_to_async(self._hand_over)(requests, plans, outcomes)
+
+    def _plan_requests(self, requests):
+        prefetch_station_links(station_link for station_link, _start_date, _end_date in requests)
+
+        watermarks = self._watermarks([station_link for station_link, _start_date, _end_date in requests])
+
+        plans = []
+        for (station_link, start_date, end_date), after in zip(requests, watermarks):
+            network_connection = station_link.network_connection
+            parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+            windows = self._windows(station_link, start_date, end_date)
+            plans.append({
+                "station_link": station_link,
+                "network_connection": network_connection,
+                "station_name": station_link.station.name,
+                "parameter_ids": parameter_ids,
+                "timezone": station_link.timezone,
+                "windows": windows,
+                "end": int(end_date.timestamp()),
+                "deadline": network_connection.get_run_deadline(),
+                "watched": late_data.watch(station_link, parameter_ids, windows[-1][1]),
+                "options": {
+                    "sampling_interval": network_connection.get_sampling_interval(),
+                    "engine": network_connection.fetch_engine,
+                    "compact": network_connection.compact_records,
+                    "after": after,
+                },
+            })
+        return plans
+
+    async def _fetch_plans(self, plans):
+        sessions = {}
+        for plan in plans:
+            network_connection = plan["network_connection"]
+            if network_connection.pk not in sessions:
+                sessions[network_connection.pk] = AsyncServerSessions(
+                    network_connection.get_async_db_connection, network_connection.pool_max_size)
+
+        try:
+            return await asyncio.gather(
+                *[self._fetch_windows(plan, sessions[plan["network_connection"].pk]) for plan in plans],
+                return_exceptions=True)
+        finally:
+            for server_sessions in sessions.values():
+                server_sessions.close()
+
+    async def _fetch_windows(self, plan, sessions):
+        """
+        One link's windows, one after another, ending early and checkpointed
+        as ``_get_sliced_station_data`` does: a failure after some windows have
+        completed hands those over, and only a failure of the first raises.
+        Each window is split on timeout and held to the run's deadline, as on
+        the blocking path.
+        """
+        records = []
+        sources_count = 0
+        completed_until = None
+        latest = None
+        backfill = len(plan["windows"]) > 1 or plan["windows"][0][1] != plan["end"]
+
+        async def fetch_window(window):
+            # A session per query, so the halves of a window split on timeout
+            # wait their turn for the server like any other fetch.
+            async with sessions.session() as client:
+                return await client.get_data_for_parameters(
+                    plan["parameter_ids"], window[0], window[1], plan["timezone"],
+                    deadline=plan["deadline"], **plan["options"])
+
+        for window in plan["windows"]:
+            try:
+                window_records, window_count = await asplit_on_timeout(fetch_window, window)
+            except Exception as e:
+                if completed_until is None:
+                    raise
+
+                logger.warning(f"[ADL_ADCON_DB_PLUGIN] Backfill of {plan['station_name']} stopped at "
+                               f"{completed_until}; it resumes there next run. {e}")
+                break
+
+            records.extend(window_records)
+            sources_count += window_count
+            completed_until = window[1]
+            latest = self._latest(window_records, latest)
+            if backfill:
+                await sync_to_async(self._save_checkpoint)(plan["station_link"], completed_until, latest)
+
+        if completed_until == plan["end"]:
+            completed_until = latest = None
+
+        return records, sources_count, completed_until, latest
+
+    def _hand_over(self, requests, plans, outcomes):
+        results = []
+
+        for (station_link, _start_date, _end_date), plan, outcome in zip(requests, plans, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"[ADL_ADCON_DB_PLUGIN] Error processing data for {plan['station_name']}. {outcome}")
+                results.append(outcome)
+                continue
+
+            records, sources_count, completed_until, latest = outcome
+
+            self._add_sources_count(station_link, sources_count)
+            if completed_until is not None or station_link.backfill_checkpoint is not None:
+                self._save_checkpoint(station_link, completed_until, latest)
+
+            # The few late windows are read on the synchronous client, as
+            # alone: they are small, and this is off the event loop already.
+            after = plan["options"]["after"]
+            costs = []
+            fetch = self._fetcher(station_link, plan["parameter_ids"], after, plan["deadline"], costs)
+            records = self._finish_station_data(station_link, records, plan["windows"][0][0], after,
+                                                plan["watched"], fetch)
+            self._log_cost(f"{plan['station_name']} ({plan['network_connection'].name}), late data", costs,
+                           connection_id=plan["network_connection"].pk, station_link_id=station_link.pk)
+
+            results.append(records)
+
+        return results
+
+    @staticmethod
+    def _log_cost(subject, costs, **fields):
+        """One line of what the fetches behind ``subject`` cost, its figures
+        also passed as the record's ``adcon_fetch_cost`` for log pipelines
+        that keep structured fields."""
+        if not costs:
+            return
+
+        fields.update(FetchCost.total(costs).as_dict())
+        logger.info(f"[ADL_ADCON_DB_PLUGIN] Fetch cost for {subject}: "
+                    + " ".join(f"{name}={value}" for name, value in fields.items()),
+                    extra={"adcon_fetch_cost": fields})
+
+    @staticmethod
+    def _add_sources_count(station_link, sources_count):
+        # Duck-typed sources-count handover: core stores this on the run's
+        # activity log so "looked, found nothing" (0) stays distinguishable
+        # from "never looked" (None). Committed only once the fetch has
+        # returned — a query that raised leaves the attribute None, and core's
+        # evidence rule abstains on NULL rather than blaming the source for a
+        # run that never got an answer. The accumulate idiom is used even
+        # though a link is fetched once per run: there is no
+        # straight-assignment variant.
+        if getattr(station_link, "adl_sources_count", None) is None:
+            station_link.adl_sources_count = 0
+        station_link.adl_sources_count += sources_count
+
+
+def split_on_timeout(fetch_window, window):
+    """
+    ``fetch_window(window)``, the window fetched again as two halves where the
+    server cancelled its query for running past the statement timeout, and
+    each half split again in turn, down to ``MIN_SPLIT_SECONDS``.
+
+    The halves meet on a multiple of ``MIN_SPLIT_SECONDS``, so as with
+    ``time_slices`` no row on a 10- or 15-minute grid straddles them and their
+    records and counts add up to the window's. A window too short to split
+    raises, as does a fetch cancelled by the run's deadline.
+    """
+    try:
+        return fetch_window(window)
+    except psycopg2.extensions.QueryCanceledError as e:
+        first, second = _halves(window, e)
+
+        first_records, first_count = split_on_timeout(fetch_window, first)
+        second_records, second_count = split_on_timeout(fetch_window, second)
+
+        return first_records + second_records, first_count + second_count
+
+
+async def asplit_on_timeout(fetch_window, window):
+    """
+    ``split_on_timeout`` for an asynchronous ``fetch_window``.
+    """
+    try:
+        return await fetch_window(window)
+    except psycopg2.extensions.QueryCanceledError as e:
+        first, second = _halves(window, e)
+
+        first_records, first_count = await asplit_on_timeout(fetch_window, first)
+        second_records, second_count = await asplit_on_timeout(fetch_window, second)
+
+        return first_records + second_records, first_count + second_count
+
+
+def _halves(window, error):
+    """The two halves a window whose query timed out is fetched again as, or
+    ``error`` raised again where the window is too short to split."""
+    start_timestamp, end_timestamp = window
+    middle = (start_timestamp + end_timestamp) // 2 // MIN_SPLIT_SECONDS * MIN_SPLIT_SECONDS
+    if middle <= start_timestamp:
+        raise error
+
+    logger.warning(f"[ADL_ADCON_DB_PLUGIN] The query for {start_timestamp}-{end_timestamp} timed out; "
+                   f"fetching it again in halves. {error}")
+
+    return (start_timestamp, middle), (middle, end_timestamp)
+
+
+def time_slices(start_timestamp, end_timestamp, slice_seconds):
+    """
+    Split ``[start_timestamp, end_timestamp]`` into consecutive windows of at
+    most ``slice_seconds``.
+
+    The inner boundaries fall on multiples of the slice length since the epoch
+    rather than on multiples from the start: a row is fetched by the slice that
+    holds both its startdate and its enddate, and rows on a 10- or 15-minute
+    grid never straddle an aligned boundary.
+    """
+    slices = []
+    window_start = start_timestamp
+
+    while window_start < end_timestamp:
+        window_end = min((window_start // slice_seconds + 1) * slice_seconds, end_timestamp)
+        slices.append((window_start, window_end))
+        window_start = window_end
+
+    return slices
@@ -0,0 +1,300 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+# An idle connection above the pool's minimum is closed once it has sat unused
+# this long. Long enough to span the gap between two ingestion cycles on the
+# default ten-minute schedule, short enough that a connection whose runs were
+# disabled does not hold an ADCON backend for the rest of the day.
+IDLE_TIMEOUT_SECONDS = 15 * 60
+
+# A connection that has been idle for longer than this is pinged before it is
+# handed out again. One sitting idle for less is trusted: a round trip per
+# borrow would give back much of what the pool saves, and a connection that
+# died in the last half-minute fails on its first statement like any other.
+HEALTH_CHECK_AFTER_SECONDS = 30
+
+# How long a borrower waits for a connection to come back once the pool is at
+# its maximum before giving up. Ingestion borrows one connection per station
+# link, so waiting at all means the runs of one connection overlap.
+ACQUIRE_TIMEOUT_SECONDS = 60
+
+
+def connection_fingerprint(connect_kwargs):
+    """A digest of everything libpq is told when connecting.
+
+    Credentials are part of it, so an edited password or host empties the pool
+    instead of quietly reusing sessions opened under the old ones. The digest
+    rather than the values themselves is what the pool keeps.
+    """
+    payload = repr(sorted(connect_kwargs.items())).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ADCONConnectionPool:
+    """A bounded, thread-safe pool of psycopg2 connections to one ADCON server.
+
+    Connections are opened lazily up to ``max_size``, with the arguments the
+    borrower passes. Returned ones are rolled back and kept idle; those above
+    ``min_size`` are closed once idle for longer than ``idle_timeout``, by
+    the next borrow or return or, when neither comes, by a timer the pool
+    keeps while it holds any. A borrower at the limit waits up to
+    ``acquire_timeout`` seconds for one to come back and then raises
+    ``PoolError``.
+
+    A borrower whose arguments differ from those the idle connections were
+    opened with empties the pool first, and connections opened under the old
+    arguments are closed when returned. That is what invalidates a pool in a
+    process that never sees the save that changed the credentials — a Celery
+    worker reloads the connection every cycle, but only the process that saved
+    it receives the signal.
+    """
+
+    def __init__(self, min_size=0, max_size=4,
+                 idle_timeout=IDLE_TIMEOUT_SECONDS, acquire_timeout=ACQUIRE_TIMEOUT_SECONDS):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.fingerprint = None
+        self.closed = False
+
+        # (connection, returned_at) pairs, the most recently returned on the
+        # right: reuse takes the warmest connection, eviction the coldest.
+        self._idle = deque()
+        # Idle and borrowed connections together.
+        self._size = 0
+        # The fingerprint each borrowed connection was opened under.
+        self._borrowed = {}
+        # The timer that closes idle connections no borrow or return comes
+        # for, while any above the minimum are idle.
+        self._reaper = None
+        self._cond = threading.Condition()
+
+    def getconn(self, connect_kwargs):
+        fingerprint = connection_fingerprint(connect_kwargs)
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            connection, returned_at = self._reserve(fingerprint, deadline)
+
+            if connection is None:
+                try:
+                    connection = psycopg2.connect(**connect_kwargs)
+                except BaseException:
+                    self._release_slot()
+                    raise
+            elif not self._is_healthy(connection, returned_at):
+                logger.debug("[ADL_ADCON_DB_PLUGIN] Discarding a broken pooled connection.")
+                self._discard(connection)
+                continue
+
+            with self._cond:
+                self._borrowed[id(connection)] = fingerprint
+
+            return connection
+
+    def putconn(self, connection, discard=False):
+        """Hand a borrowed connection back.
+
+        Whatever transaction the borrower left open is rolled back first, so
+        the next borrower starts clean and the server does not see a session
+        idling in a transaction. A connection that cannot be rolled back, or
+        that was opened under credentials the pool has since moved on from, is
+        closed instead of being kept.
+        """
+        with self._cond:
+            fingerprint = self._borrowed.pop(id(connection), None)
+            discard = discard or self.closed or fingerprint != self.fingerprint
+
+        if not discard and not connection.closed:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._discard(connection)
+            return
+
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._evict_idle()
+            self._schedule_reaper()
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse further borrowing.
+
+        Connections still borrowed are closed as they are returned, so a run in
+        progress finishes on the session it started with.
+        """
+        with self._cond:
+            self.closed = True
+            self._drain_idle()
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+            self._cond.notify_all()
+
+    def _reserve(self, fingerprint, deadline):
+        """Take an idle connection, or the right to open one, waiting for
+        either if the pool is at its maximum."""
+        with self._cond:
+            if fingerprint != self.fingerprint:
+                self._drain_idle()
+                self.fingerprint = fingerprint
+
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+
+                self._evict_idle()
+
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(
+                        f"no connection came back within {self.acquire_timeout}s "
+                        f"({self.max_size} in use)")
+                self._cond.wait(remaining)
+
+    def _drain_idle(self):
+        while self._idle:
+            connection, _returned_at = self._idle.popleft()
+            self._size -= 1
+            _close_quietly(connection)
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        while len(self._idle) > self.min_size:
+            connection, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            _close_quietly(connection)
+
+    def _schedule_reaper(self):
+        """Start the timer for the coldest idle connection above the minimum,
+        unless one is running. Called with the lock held."""
+        if self._reaper is not None or self.closed or len(self._idle) <= self.min_size:
+            return
+
+        _connection, returned_at = self._idle[0]
+        delay = max(returned_at + self.idle_timeout - time.monotonic(), 0)
+        self._reaper = threading.Timer(delay, self._reap)
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def _reap(self):
+        with self._cond:
+            self._reaper = None
+            if self.closed:
+                return
+            self._evict_idle()
+            self._schedule_reaper()
+
+    def _is_healthy(self, connection, returned_at):
+        if connection.closed:
+            return False
+
+        if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+
+        if time.monotonic() - returned_at < HEALTH_CHECK_AFTER_SECONDS:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+
+        return True
+
+    def _discard(self, connection):
+        _close_quietly(connection)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+# Pools inherited across a fork. Their sockets belong to the parent, and
+# closing or even collecting one would send the parent's session a Terminate,
+# so they are kept referenced and never touched again.
+_inherited_pools = []
+
+
+def get_pool(key, min_size=0, max_size=4, acquire_timeout=ACQUIRE_TIMEOUT_SECONDS):
+    """The process-wide pool for ``key``, the ADCON connection's primary key,
+    or ``(primary key, purpose)`` for a pool of its own.
+
+    A pool whose sizes no longer match what the caller asks for is closed and
+    replaced; one whose credentials no longer match is emptied by its next
+    borrower.
+    """
+    global _pools_pid
+
+    with _pools_lock:
+        if os.getpid() != _pools_pid:
+            _inherited_pools.extend(_pools.values())
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+
+        if pool is not None and (
+                pool.min_size != min(min_size, max_size) or pool.max_size != max_size):
+            pool.closeall()
+            pool = None
+
+        if pool is None:
+            pool = ADCONConnectionPool(min_size=min_size, max_size=max_size, acquire_timeout=acquire_timeout)
+            _pools[key] = pool
+
+        return pool
+
+
+def close_pool(key):
+    """Close and forget the pool for ``key``, if this process has one."""
+    with _pools_lock:
+        pool = _pools.pop(key, None)
+
+    if pool is not None:
+        pool.closeall()
@@ -0,0 +1,148 @@
+"""
+Opt-in profiling of the statements an ADCON connection's clients send, for
+finding the station links that cost the server most without access to its
+logs.
+
+With ``ADCONDBConnection.profile_statements`` on, each client the connection
+makes runs its cursors through a ``StatementProfiler``. The profiler notes
+every statement's text, the shape of its parameters (never their values),
+its duration and its row count. On close the client adds them to a ring of the
+connection's last ``RING_SIZE`` statements in Django's cache, which the admin
+shows next to the connection. A statement slower than the connection's
+threshold is flagged there, and logged as a warning when it runs.
+
+The ring is a sample rather than a record: two clients closing at the same
+moment may each overwrite the other's additions.
+"""
+
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psycopg2.extensions
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+RING_SIZE = 200
+
+# How much of a statement's text is kept, whitespace collapsed.
+SQL_LENGTH = 500
+
+KEY_PREFIX = "adl_adcon_db:statements"
+
+
+def _key(connection_id):
+    return f"{KEY_PREFIX}:{connection_id}"
+
+
+def _text(sql):
+    from .db import _prepared_queries
+
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    sql = str(sql)
+
+    # A prepared statement's EXECUTE says nothing of what it runs.
+    if sql.startswith("EXECUTE "):
+        name = sql[len("EXECUTE "):].split("(", 1)[0]
+        if name in _prepared_queries:
+            sql = f"EXECUTE {name}: {_prepared_queries[name]}"
+
+    return " ".join(sql.split())[:SQL_LENGTH]
+
+
+def _shape(parameters):
+    """What was bound, without the values: ``"array[120], int, int, int"``."""
+    if parameters is None:
+        return ""
+    if isinstance(parameters, dict):
+        return ", ".join(f"{name}={_shape([value])}" for name, value in parameters.items())
+
+    shapes = []
+    for value in parameters:
+        if isinstance(value, (list, tuple)):
+            shapes.append(f"array[{len(value)}]")
+        else:
+            shapes.append(type(value).__name__)
+    return ", ".join(shapes)
+
+
+class StatementProfiler:
+    """The statements of one client, until ``flush`` hands them to the ring."""
+
+    def __init__(self, connection_id, slow_ms):
+        self.connection_id = connection_id
+        self.slow_ms = slow_ms
+        self.statements = deque(maxlen=RING_SIZE)
+
+    def cursor_factory(self):
+        """A cursor class that notes each of its statements here, for the
+        ``cursor_factory`` of the client's session."""
+        profiler = self
+
+        class ProfilingCursor(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                with profiler.timing(self, query, vars):
+                    return super().execute(query, vars)
+
+            def copy_expert(self, sql, file, size=8192):
+                with profiler.timing(self, sql, None):
+                    return super().copy_expert(sql, file, size)
+
+        return ProfilingCursor
+
+    @contextmanager
+    def timing(self, cursor, sql, parameters):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.add(sql, parameters, time.perf_counter() - started, None,
+                     error=getattr(e, "pgcode", None) or type(e).__name__)
+            raise
+        self.add(sql, parameters, time.perf_counter() - started, cursor.rowcount)
+
+    def add(self, sql, parameters, seconds, rows, error=None):
+        milliseconds = round(seconds * 1000, 1)
+        statement = {
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "sql": _text(sql),
+            "parameters": _shape(parameters),
+            "ms": milliseconds,
+            "rows": rows if rows is not None and rows >= 0 else None,
+            "slow": milliseconds >= self.slow_ms,
+            "error": error,
+        }
+        self.statements.append(statement)
+
+        if statement["slow"]:
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] Slow statement on connection {self.connection_id}: "
+                           f"{milliseconds} ms, {statement['rows']} rows, parameters "
+                           f"({statement['parameters']}). {statement['sql']}")
+
+    def flush(self):
+        """Add the statements noted so far to the connection's ring."""
+        if not self.statements:
+            return
+
+        try:
+            ring = cache.get(_key(self.connection_id)) or []
+            ring.extend(self.statements)
+            cache.set(_key(self.connection_id), ring[-RING_SIZE:], None)
+        except Exception as e:
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not keep the profiled statements of "
+                           f"connection {self.connection_id}. {e}")
+        finally:
+            self.statements.clear()
+
+
+def statements(connection_id):
+    """The connection's profiled statements, latest first."""
+    return list(reversed(cache.get(_key(connection_id)) or []))
+
+
+def clear(connection_id):
+    cache.delete(_key(connection_id))
@@ -0,0 +1,169 @@
+"""
+Inspection of how an ADCON server executes a station link's fetch, run with
+``adl adcon_db_explain --station-link <id>``.
+
+The data query is built exactly as ``ADCONDBClient.get_data_for_parameters``
+builds it for the link, watermark, count of the dropped rows and streaming
+order included, and explained by the server itself, together with a count of
+the window without the interval bounds to judge its estimates against. The
+report says which of them read ``historiandata`` sequentially and where the
+planner's row estimates were off.
+It names the index to ask the ADCON administrator for when none serves the
+fetch: we can read the plan from here, but never change the schema.
+"""
+
+from .db import _DROPPED_SELECT, _data_parameters, _data_query, _window_parameters
+
+TABLE = "historiandata"
+
+# The index the fetch wants: equality on tag_id, then the window's range on
+# startdate, with enddate and status checked in the index rather than the
+# table. INCLUDE needs PostgreSQL 11; without it, measuringvalue is read from
+# the table.
+SUGGESTED_INDEX = (
+    f"CREATE INDEX CONCURRENTLY historiandata_tag_id_startdate_idx ON {TABLE} "
+    f"(tag_id, startdate, enddate, status) INCLUDE (measuringvalue)"
+)
+
+# The sampling-interval bounds are on an expression, which plain statistics
+# know nothing about: without these (PostgreSQL 14 on) the planner guesses the
+# data query returns a row or two, however many it does.
+SUGGESTED_STATISTICS = (
+    f"CREATE STATISTICS historiandata_sampling_interval_stats ON (enddate - startdate) FROM {TABLE}"
+)
+
+# How far the planner's estimate of a scan's rows may be from what it returned
+# before it is reported.
+MISESTIMATE_FACTOR = 10
+
+
+def _window_query(after=False):
+    """A count of the window's rows without the interval bounds: how far off
+    the planner is on the window alone, which the fetch itself does not run."""
+    return f"""
+        SELECT count(*)
+        FROM {TABLE}
+        WHERE tag_id = ANY(%s::int8[])
+        AND startdate >= %s
+        AND enddate <= %s
+        {"AND enddate > %s" if after else ""}
+        AND status = 0
+    """
+
+
+def fetch_queries(station_link, start_date, end_date):
+    """``[(name, query, parameters)]`` of the window's count and of the data
+    query a fetch of the link's window in epoch seconds runs."""
+    from .plugins import ADCONDBPlugin
+
+    network_connection = station_link.network_connection
+    parameter_ids = [mapping.adcon_parameter_id for mapping in station_link.get_variable_mappings()]
+    [after] = ADCONDBPlugin._watermarks([station_link])
+    data_query = _data_query(after=after is not None, dropped=_DROPPED_SELECT)
+    if network_connection.stream_itersize:
+        data_query += " ORDER BY enddate"
+
+    return [
+        ("window", _window_query(after=after is not None),
+         _window_parameters(parameter_ids, start_date, end_date, after)),
+        ("data", data_query, _data_parameters(parameter_ids, start_date, end_date, after,
+                                              network_connection.get_sampling_interval(), dropped=True)),
+    ]
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def summarize(explained):
+    """The parts of an ``EXPLAIN (FORMAT JSON)`` document worth reporting:
+    its timings, and every node that reads the table or one of its indexes."""
+    scans = []
+
+    for node in _nodes(explained["Plan"]):
+        if node.get("Relation Name") != TABLE and "Index Name" not in node:
+            continue
+
+        scan = {
+            "node": node["Node Type"],
+            "index": node.get("Index Name"),
+            "estimated_rows": node["Plan Rows"],
+        }
+
+        if "Actual Rows" in node:
+            # Per loop in the plan; a parallel scan loops once per worker.
+            scan["actual_rows"] = node["Actual Rows"] * node["Actual Loops"]
+            scan["ms"] = node["Actual Total Time"]
+            scan["buffers_hit"] = node.get("Shared Hit Blocks")
+            scan["buffers_read"] = node.get("Shared Read Blocks")
+
+        scans.append(scan)
+
+    return {
+        "planning_ms": explained.get("Planning Time"),
+        "execution_ms": explained.get("Execution Time"),
+        "seq_scan": any(scan["node"] == "Seq Scan" for scan in scans),
+        "scans": scans,
+    }
+
+
+def serving_indexes(indexes):
+    """The names of the indexes, as ``ADCONDBClient.get_table_indexes`` lists
+    them, that a fetch can range-scan: tag_id first, then a date."""
+    return [name for name, _definition, columns in indexes
+            if columns[:1] == ["tag_id"] and columns[1:2] in (["startdate"], ["enddate"])]
+
+
+def _misestimated(scan):
+    actual = scan.get("actual_rows")
+    if actual is None:
+        return False
+
+    estimated, actual = max(scan["estimated_rows"], 1), max(actual, 1)
+    return max(estimated / actual, actual / estimated) >= MISESTIMATE_FACTOR
+
+
+def advise(summaries, indexes):
+    """What to tell the ADCON administrator, given the queries' summaries by
+    name and the table's indexes."""
+    advice = []
+    serving = serving_indexes(indexes)
+
+    if not serving:
+        advice.append(f"No index on {TABLE} starts with tag_id and a date, so every fetch reads the "
+                      f"whole table. Ask the ADCON administrator for:\n    {SUGGESTED_INDEX};")
+    elif any(summary["seq_scan"] for summary in summaries.values()):
+        advice.append(f"{', '.join(serving)} could serve the fetch, but the planner read the table "
+                      f"sequentially instead. Its statistics may be stale: ask for ANALYZE {TABLE};")
+
+    misestimated = {name for name, summary in summaries.items()
+                    if any(_misestimated(scan) for scan in summary["scans"])}
+
+    if "window" in misestimated:
+        advice.append(f"The planner's row estimates for {TABLE} are far from what it read. Refreshed "
+                      f"statistics would plan the fetch better: ask for ANALYZE {TABLE};")
+    elif "data" in misestimated:
+        # The window's count has no interval bounds; if it is estimated well,
+        # they are what the planner cannot see.
+        advice.append(f"The planner cannot estimate the sampling-interval bounds, so it misjudges how "
+                      f"many rows the data query returns. Unless the server already has them, ask for "
+                      f"statistics on the interval, then ANALYZE {TABLE}:\n    {SUGGESTED_STATISTICS};")
+
+    if not advice:
+        advice.append(f"The fetch is served by {', '.join(serving)}.")
+
+    return advice
+
+
+def explain_station_link(client, station_link, start_date, end_date, analyze=True):
+    """Explain a link's fetch of a window in epoch seconds; returns
+    ``(summaries by query name, the table's indexes, advice)``."""
+    summaries = {
+        name: summarize(client.explain(query, parameters, analyze=analyze))
+        for name, query, parameters in fetch_queries(station_link, start_date, end_date)
+    }
+    indexes = client.get_table_indexes(TABLE)
+
+    return summaries, indexes, advise(summaries, indexes)
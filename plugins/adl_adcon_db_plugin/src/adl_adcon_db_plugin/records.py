@@ -0,0 +1,115 @@
+"""
+Compact observation records, for connections whose windows are long enough
+that the records themselves dominate a fetch's memory.
+
+A record is otherwise a dict, ``{"observation_time": datetime, tag_id:
+value, ...}``: a hash table per observation time, its keys repeated in every
+one. A ``CompactRecord`` holds only the time and a list of values, and shares
+the map from tag id to list position with every other record of its window.
+It is a read-only ``Mapping`` with the same keys, so whatever reads a dict
+record — ``record["observation_time"]``, ``record[tag_id]``, ``.get``, ``in``,
+iteration, ``dict(record)`` — reads it alike, and it compares equal to the dict
+it stands for. ``as_dicts`` turns records back into plain dicts wherever a
+caller needs to change them.
+
+``adl adcon_db_benchmark record-memory`` measures both on a live window.
+"""
+
+from collections.abc import Mapping
+
+
+class _Missing:
+    """The value of a tag with no row at a record's time."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+    def __reduce__(self):
+        # Unpickled as this module's MISSING, so `is MISSING` holds in the
+        # process that receives a record, too.
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+class CompactRecord(Mapping):
+    """One observation time's values, read as ``{"observation_time": ...,
+    tag_id: value}``.
+
+    ``slots`` maps tag ids to positions in ``values`` and is shared by the
+    records of a window. A position past the end of ``values``, or holding
+    ``MISSING``, is a tag the record has no value for.
+    """
+
+    __slots__ = ("observation_time", "slots", "values")
+
+    def __init__(self, observation_time, slots, values):
+        self.observation_time = observation_time
+        self.slots = slots
+        self.values = values
+
+    def __getitem__(self, key):
+        if key == "observation_time":
+            return self.observation_time
+
+        slot = self.slots.get(key)
+        if slot is None or slot >= len(self.values) or self.values[slot] is MISSING:
+            raise KeyError(key)
+        return self.values[slot]
+
+    def __iter__(self):
+        yield "observation_time"
+        for tag_id, slot in self.slots.items():
+            if slot < len(self.values) and self.values[slot] is not MISSING:
+                yield tag_id
+
+    def __len__(self):
+        return 1 + sum(1 for value in self.values if value is not MISSING)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactRecords:
+    """Builds a window's ``CompactRecord``s: ``add`` an observation time for
+    a record's position, ``set`` its tags' values, then take the
+    ``records``.
+
+    Tags get their positions in the order they are first set, so no list of
+    the window's tags is needed up front.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.times = []
+        self.values = []
+
+    def add(self, observation_time):
+        self.times.append(observation_time)
+        self.values.append([])
+        return len(self.times) - 1
+
+    def set(self, position, tag_id, value):
+        slot = self.slots.get(tag_id)
+        if slot is None:
+            slot = self.slots[tag_id] = len(self.slots)
+
+        values = self.values[position]
+        if slot >= len(values):
+            values.extend([MISSING] * (slot + 1 - len(values)))
+        values[slot] = value
+
+    def records(self):
+        """The records built since the last call. Those still to come keep
+        the tags' positions, and positions count from 0 again."""
+        records = [CompactRecord(time, self.slots, values) for time, values in zip(self.times, self.values)]
+        self.times, self.values = [], []
+        return records
+
+
+def as_dicts(records):
+    """Records as plain dicts, whatever form they were fetched in."""
+    return [record if type(record) is dict else dict(record) for record in records]
@@ -0,0 +1,142 @@
+"""
+Parallel collection of many station links on a bounded thread pool, each link
+through the plugin's own ``get_station_data``, with a separate cap on how many
+connections are open to each ADCON server at once.
+
+The cap per server is its connection's maximum connections: past it the pool
+would make a link wait for a session — and past the server's own limit the
+server refuses with ``53300 too_many_connections``. Links are only handed to a
+worker once their server has room for them, so a worker never sits blocked on
+a busy server while links of an idle one queue behind it.
+
+The links' stations, connections and variable mappings are loaded once, before
+the workers start (``loading.prefetch_station_links``), so a worker reads them
+from memory instead of querying for each.
+"""
+
+import logging
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import connections
+
+from .loading import prefetch_station_links
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+# One link's outcome: the records get_station_data returned, or None and the
+# exception it raised, and how long it took. The sources count is on the
+# station link itself, as get_station_data leaves it. It stays inside the
+# plugin; as_station_data is what core is handed.
+StationLinkResult = namedtuple("StationLinkResult", ["station_link", "records", "error", "seconds"])
+
+
+def _weight(station_link, start_date, end_date):
+    """How many of its server's connections a collection may hold at once: a
+    backfill long enough to be sliced fetches up to its parallel slices, and
+    never more than the whole server allows."""
+    network_connection = station_link.network_connection
+    if end_date - start_date <= network_connection.backfill_slice_hours * 3600:
+        return 1
+    return min(network_connection.backfill_parallelism, network_connection.pool_max_size)
+
+
+def _collect(plugin, station_link, start_date, end_date):
+    started = time.perf_counter()
+    try:
+        # Free for a link run_station_links has loaded; a link handed in any
+        # other way is loaded here, in a fixed number of queries.
+        prefetch_station_links([station_link])
+        records = plugin.get_station_data(station_link, start_date, end_date)
+        error = None
+    except Exception as e:
+        records = None
+        error = e
+    finally:
+        # This worker thread's own Django connections; they would otherwise
+        # outlive it.
+        connections.close_all()
+
+    return StationLinkResult(station_link, records, error, time.perf_counter() - started)
+
+
+def as_station_data(results):
+    """
+    ``StationLinkResult``s in the shape core has of each link: what
+    ``get_station_data`` returned for it — its records — or, for a link that
+    failed, the exception it raised, as ``aget_stations_data`` gives them.
+
+    The timings are dropped; they were logged as each link finished.
+    """
+    return [result.records if result.error is None else result.error for result in results]
+
+
+def run_station_links(plugin, requests, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Collect ``(station_link, start_date, end_date)`` requests in parallel,
+    returning a ``StationLinkResult`` for each, in the same order.
+
+    A failed link does not stop the others; its exception is in its result.
+    """
+    requests = list(requests)
+    results = [None] * len(requests)
+
+    # Loaded here, once, rather than link by link from the workers.
+    prefetch_station_links(station_link for station_link, _start_date, _end_date in requests)
+
+    # Per server: the requests still to start, and the connections free.
+    queued = {}
+    free = {}
+    for index, (station_link, start_date, end_date) in enumerate(requests):
+        network_connection = station_link.network_connection
+        key = network_connection.pk
+        queued.setdefault(key, deque()).append(
+            (index, _weight(station_link, start_date.timestamp(), end_date.timestamp())))
+        free.setdefault(key, network_connection.pool_max_size)
+
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while queued or running:
+            # Start whatever fits, one link per server per pass so no server
+            # takes every free worker.
+            started = True
+            while started and len(running) < max_workers:
+                started = False
+                for key in list(queued):
+                    if len(running) >= max_workers:
+                        break
+
+                    index, weight = queued[key][0]
+                    if weight > free[key]:
+                        continue
+
+                    queued[key].popleft()
+                    if not queued[key]:
+                        del queued[key]
+
+                    free[key] -= weight
+
+                    future = executor.submit(_collect, plugin, *requests[index])
+                    running[future] = (index, key, weight)
+                    started = True
+
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index, key, weight = running.pop(future)
+                free[key] += weight
+                results[index] = future.result()
+
+                result = results[index]
+                if result.error is None:
+                    logger.info(f"[ADL_ADCON_DB_PLUGIN] Collected {len(result.records)} records for "
+                                f"{result.station_link} in {result.seconds:.2f}s.")
+                else:
+                    logger.error(f"[ADL_ADCON_DB_PLUGIN] Collection for {result.station_link} failed after "
+                                 f"{result.seconds:.2f}s. {result.error}")
+
+    return results
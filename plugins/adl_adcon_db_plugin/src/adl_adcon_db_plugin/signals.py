@@ -0,0 +1,79 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import metadata_cache
+from .models import ADCONDBConnection, ADCONStationLink
+from .pool import close_pool
+
+
+@receiver(post_save, sender=ADCONDBConnection)
+@receiver(post_delete, sender=ADCONDBConnection)
+def close_connection_pool(sender, instance, **kwargs):
+    """
+    Drop this process's pooled sessions for a connection that was edited or
+    deleted, the admin's pages' included. Other processes notice edited
+    credentials on their next borrow.
+    """
+    close_pool(instance.pk)
+    close_pool(instance.admin_pool_key)
+
+
+@receiver(post_save, sender=ADCONDBConnection)
+@receiver(post_delete, sender=ADCONDBConnection)
+def invalidate_metadata_cache(sender, instance, **kwargs):
+    """
+    Forget a connection's cached station and parameter listings once it is
+    edited, so they are re-read from the server it now points at.
+    """
+    metadata_cache.invalidate(instance.pk)
+
+
+@receiver(pre_save, sender=ADCONDBConnection)
+def reset_metadata_mirror(sender, instance, **kwargs):
+    """
+    Stop answering from the metadata mirror once the connection points at
+    another database; its next refresh rebuilds the mirror from there.
+    """
+    if instance.pk is None or instance.metadata_mirrored_at is None:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).values_list("db_host", "db_port", "db_name").first()
+
+    if previous != (instance.db_host, instance.db_port, instance.db_name):
+        instance.metadata_mirrored_at = None
+
+
+@receiver(pre_save, sender=ADCONStationLink)
+def reset_backfill_checkpoint(sender, instance, **kwargs):
+    """
+    Forget an interrupted backfill's progress when the operator moves the
+    collection start date: the checkpoint belonged to the backfill the old
+    date started.
+    """
+    if instance.pk is None or instance.backfill_checkpoint is None:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).values_list("start_date", flat=True).first()
+
+    if previous != instance.start_date:
+        instance.backfill_checkpoint = None
+        instance.backfill_checkpoint_latest = None
+
+
+@receiver(pre_save, sender=ADCONStationLink)
+def reset_fetch_watermark(sender, instance, **kwargs):
+    """
+    Forget an incremental fetch's high-watermark when the operator moves the
+    collection start date or points the link at another station, so the next
+    run reads the whole window core asks for: moving the start date back to
+    re-collect would otherwise fetch nothing older than the watermark, and
+    another station's rows were never read at all.
+    """
+    if instance.pk is None or instance.fetch_watermark is None:
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        "start_date", "network_connection_id", "adcon_station_id").first()
+
+    if previous != (instance.start_date, instance.network_connection_id, instance.adcon_station_id):
+        instance.fetch_watermark = None
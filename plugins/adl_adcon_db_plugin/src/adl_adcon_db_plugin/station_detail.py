@@ -0,0 +1,104 @@
+"""
+What the admin's station detail page shows of an ADCON station: its
+parameters, and each one's latest value and row count over the last
+``ACTIVITY_HOURS``.
+
+The parameters come from the metadata mirror or listing cache, as the select
+widgets' do. The activity is read from ``historiandata`` in one query for the
+whole station, in a thread started before the parameters are looked up, so a
+listing that has to go to the server and the activity query overlap rather
+than add up. Both go through ``ADCONDBConnection.get_admin_db_connection``,
+whose connect and statements are bounded, and the page waits at most
+``ACTIVITY_WAIT_SECONDS`` for the activity before rendering without it.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime
+
+from django.core.cache import cache
+
+from .models import ADMIN_CONNECT_TIMEOUT_SECONDS, ADMIN_STATEMENT_TIMEOUT_MS
+from .utils import get_adcon_parameters
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_HOURS = 24
+
+# How long a station's activity is reused across page views. Short, since it
+# is the point of the page to show what the station sent last.
+ACTIVITY_CACHE_SECONDS = 60
+
+# A borrow or connect, then the query, each already bounded on its own.
+ACTIVITY_WAIT_SECONDS = ADMIN_CONNECT_TIMEOUT_SECONDS + ADMIN_STATEMENT_TIMEOUT_MS / 1000 + 1
+
+KEY_PREFIX = "adl_adcon_db:tag_activity"
+
+
+def _read_activity(network_conn, adcon_station_id, since):
+    db = network_conn.get_admin_db_connection()
+    try:
+        return db.get_tag_activity(adcon_station_id, since)
+    finally:
+        db.close()
+
+
+def get_station_detail(station_link):
+    """The detail page's context for a station link: its ``parameters``, each
+    with its ``activity`` or None, and the errors met reading either."""
+    network_conn = station_link.network_connection
+    adcon_station_id = station_link.adcon_station_id
+
+    key = f"{KEY_PREFIX}:{network_conn.pk}:{adcon_station_id}"
+    activity = cache.get(key)
+    activity_error = None
+
+    executor = future = None
+    if activity is None:
+        since = int(time.time()) - ACTIVITY_HOURS * 3600
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(_read_activity, network_conn, adcon_station_id, since)
+
+    parameters_error = None
+    try:
+        parameters = get_adcon_parameters(network_conn, adcon_station_id)
+    except Exception as e:
+        logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not list the parameters of ADCON station "
+                       f"{adcon_station_id}. {e}")
+        parameters = []
+        parameters_error = str(e)
+
+    if future is not None:
+        try:
+            activity = future.result(timeout=ACTIVITY_WAIT_SECONDS)
+            cache.set(key, activity, ACTIVITY_CACHE_SECONDS)
+        except FuturesTimeoutError:
+            activity_error = f"No answer within {ACTIVITY_WAIT_SECONDS:g} seconds."
+        except Exception as e:
+            logger.warning(f"[ADL_ADCON_DB_PLUGIN] Could not read the activity of ADCON station "
+                           f"{adcon_station_id}. {e}")
+            activity_error = str(e)
+        finally:
+            # A query past its wait is cancelled by its own statement timeout.
+            executor.shutdown(wait=False)
+
+    activity = activity or {}
+    rows = []
+    for parameter in parameters:
+        tag_activity = activity.get(parameter["id"])
+        if tag_activity is not None:
+            value, end_date, count = tag_activity
+            tag_activity = {
+                "last_value": value,
+                "last_observation": datetime.fromtimestamp(end_date, tz=station_link.timezone),
+                "rows": count,
+            }
+        rows.append({**parameter, "activity": tag_activity})
+
+    return {
+        "station_parameters": rows,
+        "parameters_error": parameters_error,
+        "activity_error": activity_error,
+        "activity_hours": ACTIVITY_HOURS,
+    }
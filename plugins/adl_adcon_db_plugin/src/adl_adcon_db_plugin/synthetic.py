@@ -0,0 +1,305 @@
+"""
+A synthetic ADCON dataset for benchmarking the ingestion hot path without an
+ADCON server: ``node_60`` stations and their tags, and the tags'
+``historiandata`` rows, at a scale of stations × tags × days.
+
+``load`` writes it into a PostgreSQL database of our own, the compose stack's
+will do. ``SyntheticPool`` serves the same rows from memory to an
+``ADCONDBClient``, for measuring what becomes of them after the query without
+a database at all.
+
+The rows are a function of the scale alone, so every load of a scale is the
+same dataset and runs at that scale compare:
+
+* each tag logs every ``STEP`` seconds from ``START``, with ``status = 0``;
+* every ``INVALID_EVERY``-th row has ``status = 1``, which no fetch reads;
+* every ``NULL_EVERY``-th row has no value;
+* every ``SHORT_EVERY``-th row comes with a second row over the last minute
+  only, which the sampling-interval bounds drop but the count includes.
+"""
+
+import math
+
+START = 1756684800  # 2025-09-01T00:00:00Z
+
+# A ten-minute logger, inside the default sampling interval.
+STEP = 600
+SHORT_INTERVAL = 60
+
+INVALID_EVERY = 97
+NULL_EVERY = 211
+SHORT_EVERY = 53
+
+# A station's id is a multiple of this, its tags the ids after it.
+STATION_ID_STRIDE = 1000
+
+COLUMNS = ("tag_id", "enddate", "startdate", "measuringvalue")
+
+_SCHEMA = """
+    DROP TABLE IF EXISTS historiandata, node_60, adl_synthetic_scale;
+
+    CREATE TABLE node_60 (
+        id bigint PRIMARY KEY,
+        dtype varchar(64) NOT NULL,
+        displayname varchar(255),
+        latitude double precision,
+        longitude double precision,
+        timezoneid varchar(64),
+        parent_id bigint,
+        subclass integer
+    );
+
+    CREATE TABLE historiandata (
+        id bigserial PRIMARY KEY,
+        tag_id bigint NOT NULL,
+        startdate bigint NOT NULL,
+        enddate bigint NOT NULL,
+        measuringvalue double precision,
+        status integer NOT NULL
+    );
+
+    CREATE TABLE adl_synthetic_scale (
+        stations integer NOT NULL,
+        tags integer NOT NULL,
+        days integer NOT NULL,
+        indexed boolean NOT NULL
+    );
+"""
+
+# One station's rows, the arithmetic of ``_tag_rows`` in SQL.
+_STATION_ROWS = f"""
+    INSERT INTO historiandata (tag_id, startdate, enddate, measuringvalue, status)
+    SELECT tag_id, enddate - %(step)s, enddate,
+           CASE WHEN (step + tag_id) %% {NULL_EVERY} = 0 THEN NULL
+                ELSE round((20 + 10 * sin(step * 2 * pi() / 144 + tag_id))::numeric, 2) END,
+           CASE WHEN (step + tag_id) %% {INVALID_EVERY} = 0 THEN 1 ELSE 0 END
+    FROM (SELECT id AS tag_id FROM node_60 WHERE parent_id = %(station_id)s) tags,
+         generate_series(1, %(steps)s) step,
+         LATERAL (SELECT {START} + step * %(step)s AS enddate) ends
+    UNION ALL
+    SELECT tag_id, enddate - {SHORT_INTERVAL}, enddate, 0, 0
+    FROM (SELECT id AS tag_id FROM node_60 WHERE parent_id = %(station_id)s) tags,
+         generate_series(1, %(steps)s) step,
+         LATERAL (SELECT {START} + step * %(step)s AS enddate) ends
+    WHERE (step + tag_id) %% {SHORT_EVERY} = 0
+"""
+
+
+def station_ids(stations):
+    return [STATION_ID_STRIDE * (number + 1) for number in range(stations)]
+
+
+def tag_ids(station_id, tags):
+    return [station_id + number + 1 for number in range(tags)]
+
+
+def window(days):
+    """The dataset's whole window, ``(start, end)`` in epoch seconds."""
+    return START, START + days * 86400
+
+
+def _check_scale(stations, tags, days):
+    if min(stations, tags, days) < 1:
+        raise ValueError("A synthetic dataset needs at least one station, tag and day.")
+    if tags >= STATION_ID_STRIDE:
+        raise ValueError(f"A synthetic station has fewer than {STATION_ID_STRIDE} tags.")
+
+
+def loaded_scale(connection):
+    """``(stations, tags, days, indexed)`` of the dataset in the database, or
+    None."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('adl_synthetic_scale') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            connection.rollback()
+            return None
+
+        cursor.execute("SELECT stations, tags, days, indexed FROM adl_synthetic_scale")
+        row = cursor.fetchone()
+
+    connection.rollback()
+    return tuple(row) if row else None
+
+
+def load(connection, stations, tags, days, index=None):
+    """(Re)create the dataset in the connection's database, one transaction
+    per station, and return the number of ``historiandata`` rows.
+
+    ``index``, a ``CREATE INDEX`` statement, is built over the loaded rows;
+    without one the table has its primary key only.
+    """
+    _check_scale(stations, tags, days)
+
+    with connection.cursor() as cursor:
+        cursor.execute(_SCHEMA)
+
+        for number, station_id in enumerate(station_ids(stations)):
+            cursor.execute(
+                "INSERT INTO node_60 (id, dtype, displayname, latitude, longitude, timezoneid) "
+                "VALUES (%s, 'DeviceNode', %s, %s, %s, 'UTC')",
+                (station_id, f"Synthetic station {number + 1}", 10 + number % 10, 30 + number // 10))
+            cursor.executemany(
+                "INSERT INTO node_60 (id, dtype, displayname, parent_id, subclass) "
+                "VALUES (%s, 'AnalogTagNode', %s, %s, 0)",
+                [(tag_id, f"Tag {tag_id - station_id}", station_id) for tag_id in tag_ids(station_id, tags)])
+        connection.commit()
+
+        for station_id in station_ids(stations):
+            cursor.execute(_STATION_ROWS, {"station_id": station_id, "step": STEP, "steps": days * 86400 // STEP})
+            connection.commit()
+
+        if index:
+            cursor.execute(index.replace(" CONCURRENTLY", ""))
+
+        cursor.execute("INSERT INTO adl_synthetic_scale VALUES (%s, %s, %s, %s)",
+                       (stations, tags, days, bool(index)))
+        cursor.execute("SELECT count(*) FROM historiandata")
+        rows = cursor.fetchone()[0]
+        connection.commit()
+
+        # Fresh statistics, as a long-running server would have.
+        connection.autocommit = True
+        try:
+            cursor.execute("ANALYZE historiandata")
+        finally:
+            connection.autocommit = False
+
+    return rows
+
+
+def _tag_rows(tag_id, steps):
+    """A tag's ``(tag_id, enddate, startdate, measuringvalue, status)`` rows,
+    as ``load`` writes them."""
+    for step in range(1, steps + 1):
+        end_date = START + step * STEP
+        if (step + tag_id) % NULL_EVERY == 0:
+            value = None
+        else:
+            value = round(20 + 10 * math.sin(step * 2 * math.pi / 144 + tag_id), 2)
+        yield tag_id, end_date, end_date - STEP, value, 1 if (step + tag_id) % INVALID_EVERY == 0 else 0
+
+        if (step + tag_id) % SHORT_EVERY == 0:
+            yield tag_id, end_date, end_date - SHORT_INTERVAL, 0.0, 0
+
+
+class SyntheticCursor:
+    """Answers the data queries of ``ADCONDBClient`` from the dataset, with
+    their count of the dropped rows, plainly or as prepared statements;
+    nothing else."""
+
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.description = None
+        self._rows = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        return self._rows
+
+    def execute(self, sql, params=None):
+        if sql.startswith("PREPARE "):
+            name, query = sql[len("PREPARE "):].split(" AS ", 1)
+            self.connection.prepared[name] = query
+            return
+        if sql.startswith("EXECUTE "):
+            sql = self.connection.prepared[sql[len("EXECUTE "):].split("(", 1)[0]]
+
+        params = list(params)
+        counted = "UNION ALL" in sql
+        if counted:
+            # The count of the dropped rows takes the interval bounds again.
+            params = params[:-2]
+        tag_ids, start_date, end_date = params[:3]
+        after = params[3] if "enddate >" in sql else None
+        interval = params[-2:] if "enddate - startdate" in sql else None
+        rows = list(self.connection.rows(tag_ids, start_date, end_date, after, interval))
+
+        if "ORDER BY enddate" in sql:
+            rows.sort(key=lambda row: row[1])
+
+        if counted:
+            window = sum(1 for _row in self.connection.rows(tag_ids, start_date, end_date, after))
+            count_row = (-1, window - len(rows), None, None)
+            rows = [count_row, *rows] if "ORDER BY enddate" in sql else [*rows, count_row]
+
+        self.description = [_Column(name) for name in COLUMNS]
+        self._rows = iter(rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=None):
+        return [row for _number, row in zip(range(size or self.itersize), self._rows)]
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class _Column:
+    def __init__(self, name):
+        self.name = name
+
+
+class SyntheticConnection:
+    dsn = "synthetic"
+
+    def __init__(self, stations, tags, days):
+        _check_scale(stations, tags, days)
+        self.stations = stations
+        self.tags = tags
+        self.steps = days * 86400 // STEP
+        self.prepared = {}
+
+    def cursor(self, name=None):
+        return SyntheticCursor(self, name)
+
+    def _exists(self, tag_id):
+        station_number, number = divmod(tag_id, STATION_ID_STRIDE)
+        return 1 <= station_number <= self.stations and 1 <= number <= self.tags
+
+    def rows(self, tag_ids, start_date, end_date, after=None, interval=None):
+        """The ``(tag_id, enddate, startdate, measuringvalue)`` rows a fetch
+        of the window reads, as the server would select them."""
+        for tag_id in dict.fromkeys(tag_ids):
+            if not self._exists(tag_id):
+                continue
+
+            for _tag_id, row_end, row_start, value, status in _tag_rows(tag_id, self.steps):
+                if status != 0 or row_start < start_date or row_end > end_date:
+                    continue
+                if after is not None and row_end <= after:
+                    continue
+                if interval is not None and not interval[0] <= row_end - row_start < interval[1]:
+                    continue
+                yield tag_id, row_end, row_start, value
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SyntheticPool:
+    """Lends an ``ADCONDBClient`` a ``SyntheticConnection`` in place of a
+    session: ``ADCONDBClient(None, None, None, None, None,
+    pool=SyntheticPool(stations, tags, days))``."""
+
+    def __init__(self, stations, tags, days):
+        self.connection = SyntheticConnection(stations, tags, days)
+
+    def getconn(self, connect_kwargs):
+        return self.connection
+
+    def putconn(self, connection):
+        pass
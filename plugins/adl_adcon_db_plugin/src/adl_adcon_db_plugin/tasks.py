@@ -0,0 +1,21 @@
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_metadata_mirrors():
+    """
+    Bring every ADCON connection's local metadata mirror up to date. A
+    connection that cannot be reached keeps its mirror as it was.
+    """
+    from .mirror import refresh_mirror
+    from .models import ADCONDBConnection
+
+    for network_conn in ADCONDBConnection.objects.all():
+        try:
+            refresh_mirror(network_conn)
+        except Exception as e:
+            logger.error(f"[ADL_ADCON_DB_PLUGIN] Error refreshing the metadata mirror of {network_conn.name}. {e}")
@@ -0,0 +1,281 @@
+"""
+Tests for the asyncio fetch: ``aio.py``'s event-loop driver and session bound,
+and ``ADCONDBPlugin.aget_stations_data`` across several connections.
+"""
+
+import asyncio
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+from psycopg2.extensions import QueryCanceledError
+
+from adl_adcon_db_plugin import aio
+from adl_adcon_db_plugin.aio import AsyncADCONDBClient, AsyncServerSessions, _wait
+from adl_adcon_db_plugin.db import RunDeadlineExceeded
+from adl_adcon_db_plugin.models import ADCONDBConnection, ADCONStationLink
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import FakeCursor, FakeOperationalError, make_connection, make_station_link
+
+START = datetime(2026, 8, 1, tzinfo=timezone.utc)
+
+
+class PollingConnection:
+    """Reports POLL_READ until its socket has something to read."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.polls = 0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def poll(self):
+        self.polls += 1
+        try:
+            self.sock.recv(1)
+        except BlockingIOError:
+            return extensions.POLL_READ
+        return extensions.POLL_OK
+
+
+class WaitTests(SimpleTestCase):
+
+    def test_yields_to_the_loop_until_the_socket_is_ready(self):
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        ours.setblocking(False)
+        connection = PollingConnection(ours)
+
+        async def run():
+            waiting = asyncio.ensure_future(_wait(connection))
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())
+            theirs.send(b"x")
+            await asyncio.wait_for(waiting, 5)
+
+        asyncio.run(run())
+        self.assertEqual(connection.polls, 2)
+
+
+class StalledConnection(PollingConnection):
+    """A session whose statement never answers until it is cancelled."""
+
+    def __init__(self, sock):
+        super().__init__(sock)
+        self.cancelled = False
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def close(self):
+        self.closed = 1
+
+
+class AsyncClientTimeLimitsTests(SimpleTestCase):
+
+    def setUp(self):
+        ours, self.theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(self.theirs.close)
+        ours.setblocking(False)
+        self.connection = StalledConnection(ours)
+        self.client = AsyncADCONDBClient(self.connection)
+
+    def fetch(self, **options):
+        return self.client.get_data_for_parameters([1], 0, 3600, timezone.utc, **options)
+
+    def test_a_statement_running_past_the_deadline_is_cancelled_on_the_server(self):
+        with self.assertRaises(RunDeadlineExceeded):
+            asyncio.run(self.fetch(deadline=time.monotonic() + 0.05))
+
+        self.assertTrue(self.connection.cancelled)
+        self.assertIsNone(self.client.connection)
+
+    def test_a_cancelled_fetch_cancels_its_statement(self):
+        async def run():
+            fetching = asyncio.ensure_future(self.fetch())
+            await asyncio.sleep(0.01)
+            fetching.cancel()
+            await fetching
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(run())
+        self.assertTrue(self.connection.cancelled)
+
+    def test_the_statement_timeout_is_set_at_connect(self):
+        with mock.patch.object(aio.psycopg2, "connect") as connect, mock.patch.object(aio, "_wait"):
+            asyncio.run(AsyncADCONDBClient.connect("adcon.example.org", 5432, "adcon", "adl", "secret",
+                                                   statement_timeout=30000))
+
+        self.assertEqual(connect.call_args.kwargs["options"], "-c statement_timeout=30000")
+
+
+class FakeAsyncClient:
+    def __init__(self, server):
+        self.server = server
+        self.connection = SimpleNamespace(closed=0)
+
+    async def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
+        server = self.server
+        server.active += 1
+        server.peak = max(server.peak, server.active)
+        server.deadlines.append(options.get("deadline"))
+        try:
+            await asyncio.sleep(0)
+            if server.error is not None or start_date in server.failing:
+                raise server.error or FakeOperationalError("statement timeout", pgcode="57014")
+            if end_date - start_date > server.longest:
+                raise QueryCanceledError("canceling statement due to statement timeout")
+            server.windows.append((start_date, end_date))
+            return [{"observation_time": start_date}], 2
+        finally:
+            server.active -= 1
+
+    def close(self):
+        self.connection.closed = 1
+
+
+class FakeServer:
+    def __init__(self, error=None, failing=(), longest=float("inf")):
+        self.error = error
+        self.failing = set(failing)
+        # The longest window whose query finishes inside the statement timeout.
+        self.longest = longest
+        self.active = 0
+        self.peak = 0
+        self.opened = 0
+        self.windows = []
+        self.deadlines = []
+
+    async def connect(self, connect_timeout=None):
+        self.opened += 1
+        return FakeAsyncClient(self)
+
+
+class ConcurrentStationsDataTests(SimpleTestCase):
+
+    def setUp(self):
+        self.servers = {}
+
+        async def get_async_db_connection(connection, connect_timeout=None):
+            return await self.servers[connection.pk].connect()
+
+        for patcher in (
+                mock.patch.object(ADCONDBConnection, "get_async_db_connection", get_async_db_connection),
+                mock.patch.object(ADCONStationLink, "timezone", timezone.utc),
+                mock.patch.object(ADCONStationLink, "station", SimpleNamespace(name="Wad Medani"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def links(self, pk, count, server, **kwargs):
+        self.servers[pk] = server
+        connection = make_connection(pk=pk, **kwargs)
+        links = []
+        for _ in range(count):
+            link = make_station_link(connection)
+            link.get_variable_mappings = lambda: [mock.Mock(adcon_parameter_id=1)]
+            links.append(link)
+        return links
+
+    def collect(self, links, days=1):
+        return ADCONDBPlugin().get_stations_data_concurrently(
+            [(link, START, START + timedelta(days=days)) for link in links])
+
+    def test_every_link_gets_its_records_and_count(self):
+        links = self.links(1, 3, FakeServer())
+        results = self.collect(links)
+        self.assertEqual([len(records) for records in results], [1, 1, 1])
+        self.assertEqual([link.adl_sources_count for link in links], [2, 2, 2])
+
+    def test_a_failing_server_costs_only_its_own_links(self):
+        error = FakeOperationalError("auth", pgcode="28P01")
+        healthy = self.links(1, 2, FakeServer())
+        failing = self.links(2, 1, FakeServer(error=error))
+
+        results = self.collect(healthy + failing)
+
+        self.assertEqual([len(records) for records in results[:2]], [1, 1])
+        self.assertIs(results[2], error)
+        self.assertIsNone(getattr(failing[0], "adl_sources_count", None))
+
+    def test_each_server_is_held_to_its_maximum_connections(self):
+        server = FakeServer()
+        self.collect(self.links(1, 6, server, pool_max_size=2))
+        self.assertEqual(server.peak, 2)
+        self.assertEqual(server.opened, 2)
+
+    def test_long_windows_are_sliced_and_checkpointed_like_the_blocking_path(self):
+        third_day = int((START + timedelta(days=2)).timestamp())
+        server = FakeServer(failing=[third_day])
+        link, = self.links(1, 1, server)
+
+        records, = self.collect([link], days=3)
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(link.adl_sources_count, 4)
+        self.assertEqual(link.backfill_checkpoint, START + timedelta(days=2))
+
+    def test_a_timed_out_window_is_fetched_again_in_halves(self):
+        server = FakeServer(longest=12 * 3600)
+        link, = self.links(1, 1, server)
+
+        records, = self.collect([link])
+
+        start = int(START.timestamp())
+        self.assertEqual(server.windows, [(start, start + 12 * 3600), (start + 12 * 3600, start + 86400)])
+        self.assertEqual(len(records), 2)
+
+    def test_each_fetch_is_held_to_the_run_deadline(self):
+        server = FakeServer()
+        self.collect(self.links(1, 1, server, run_deadline_minutes=5))
+
+        [deadline] = server.deadlines
+        self.assertAlmostEqual(deadline, time.monotonic() + 300, delta=5)
+
+
+class AsyncServerSessionsTests(SimpleTestCase):
+
+    def test_a_cancelled_fetch_gives_its_session_back(self):
+        server = FakeServer()
+
+        async def run():
+            sessions = AsyncServerSessions(server.connect, 1)
+
+            async def fetch():
+                async with sessions.session():
+                    await asyncio.sleep(60)
+
+            fetching = asyncio.ensure_future(fetch())
+            await asyncio.sleep(0)
+            fetching.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await fetching
+
+            # The slot is free again, and the session it held was not trusted.
+            await asyncio.wait_for(sessions.acquire(), 1)
+
+        asyncio.run(run())
+        self.assertEqual(server.opened, 2)
+
+    def test_a_broken_session_is_not_reused(self):
+        server = FakeServer()
+
+        async def run():
+            sessions = AsyncServerSessions(server.connect, 1)
+            client = await sessions.acquire()
+            sessions.release(client, discard=True)
+            self.assertIsNot(await sessions.acquire(), client)
+
+        asyncio.run(run())
+        self.assertEqual(server.opened, 2)
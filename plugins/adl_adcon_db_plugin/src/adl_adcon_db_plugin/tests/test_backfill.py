@@ -0,0 +1,168 @@
+"""
+Tests for slicing long windows and resuming an interrupted backfill from the
+station link's checkpoint.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import psycopg2
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin.models import ADCONStationLink
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin, time_slices
+
+from .test_source_checks import (
+    FakeDBClient,
+    FakeOperationalError,
+    make_connection,
+    make_station_link,
+    stub_db_client,
+)
+
+DAY = 86400
+START = datetime(2026, 8, 1, tzinfo=timezone.utc)
+
+
+class SlicingDBClient(FakeDBClient):
+    """Answers every slice with one record and two rows, failing the slices
+    that start at the given timestamps."""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.windows = []
+
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
+        self.windows.append((start_date, end_date))
+        if start_date in self.failing:
+            raise FakeOperationalError("canceling statement due to statement timeout", pgcode="57014")
+        return [{"observation_time": start_date}], 2
+
+
+class TimeSlicesTests(SimpleTestCase):
+
+    def test_inner_boundaries_are_aligned_to_the_slice_length(self):
+        start = 10 * DAY + 3600
+        self.assertEqual(time_slices(start, start + 2 * DAY, DAY), [
+            (start, 11 * DAY),
+            (11 * DAY, 12 * DAY),
+            (12 * DAY, start + 2 * DAY),
+        ])
+
+    def test_an_empty_window_has_no_slices(self):
+        self.assertEqual(time_slices(DAY, DAY, DAY), [])
+
+
+class BackfillTests(SimpleTestCase):
+
+    def collect(self, link, client, days=3):
+        patcher, _calls = stub_db_client(client)
+        station = SimpleNamespace(name="Wad Medani")
+        with patcher, \
+                mock.patch.object(ADCONStationLink, "timezone", timezone.utc), \
+                mock.patch.object(ADCONStationLink, "station", station):
+            return ADCONDBPlugin().get_station_data(link, START, START + timedelta(days=days))
+
+    def link(self, **kwargs):
+        link = make_station_link(make_connection(**kwargs))
+        link.get_variable_mappings = lambda: [mock.Mock(adcon_parameter_id=1)]
+        return link
+
+    def test_a_window_within_one_slice_is_one_query(self):
+        client = SlicingDBClient()
+        self.collect(self.link(), client, days=1)
+        self.assertEqual(len(client.windows), 1)
+
+    def test_a_long_window_is_fetched_slice_by_slice(self):
+        client = SlicingDBClient()
+        link = self.link()
+        records = self.collect(link, client)
+
+        self.assertEqual(len(client.windows), 3)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(link.adl_sources_count, 6)
+        self.assertIsNone(link.backfill_checkpoint)
+
+    def test_a_failed_slice_hands_over_the_completed_ones_and_checkpoints(self):
+        third_day = int((START + timedelta(days=2)).timestamp())
+        client = SlicingDBClient(failing=[third_day])
+        link = self.link()
+
+        records = self.collect(link, client)
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(link.adl_sources_count, 4)
+        self.assertEqual(link.backfill_checkpoint, START + timedelta(days=2))
+
+    def test_a_failed_first_slice_raises_and_makes_no_claim(self):
+        client = SlicingDBClient(failing=[int(START.timestamp())])
+        link = self.link()
+        link.adl_sources_count = None
+
+        with self.assertRaises(psycopg2.OperationalError):
+            self.collect(link, client)
+        self.assertIsNone(link.adl_sources_count)
+        self.assertIsNone(link.backfill_checkpoint)
+
+    def test_resumes_from_the_checkpoint(self):
+        client = SlicingDBClient()
+        link = self.link()
+        link.backfill_checkpoint = START + timedelta(days=2)
+
+        self.collect(link, client)
+
+        self.assertEqual(client.windows, [(int((START + timedelta(days=2)).timestamp()),
+                                           int((START + timedelta(days=3)).timestamp()))])
+
+    def test_slices_can_be_fetched_in_parallel(self):
+        client = SlicingDBClient()
+        link = self.link(backfill_parallelism=3)
+        records = self.collect(link, client)
+
+        self.assertEqual(len(client.windows), 3)
+        self.assertEqual([r["observation_time"] for r in records], sorted(w[0] for w in client.windows))
+
+    def test_a_run_fetches_at_most_its_slices_per_run_and_checkpoints_after_them(self):
+        client = SlicingDBClient()
+        link = self.link(backfill_slices_per_run=2)
+
+        records = self.collect(link, client)
+
+        self.assertEqual(len(client.windows), 2)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(link.backfill_checkpoint, START + timedelta(days=2))
+        # The latest observation handed over, the fake's start of the second
+        # slice, for the next run to check core saved.
+        self.assertEqual(link.backfill_checkpoint_latest, int((START + timedelta(days=1)).timestamp()))
+
+    def test_the_checkpoint_follows_each_completed_slice(self):
+        link = self.link()
+        saved = []
+        save_checkpoint = ADCONDBPlugin._save_checkpoint
+
+        def watch(station_link, timestamp, latest=None):
+            saved.append(timestamp)
+            save_checkpoint(station_link, timestamp, latest)
+
+        with mock.patch.object(ADCONDBPlugin, "_save_checkpoint", side_effect=watch):
+            self.collect(link, SlicingDBClient())
+
+        # Written as each slice completes, then cleared once all have.
+        self.assertEqual(saved, [int((START + timedelta(days=days)).timestamp()) for days in (1, 2, 3)] + [None])
+        self.assertIsNone(link.backfill_checkpoint)
+
+    def test_a_checkpoint_is_only_resumed_from_once_core_saved_up_to_it(self):
+        for saved_until, first_window in ((START + timedelta(days=1), START + timedelta(days=2)),
+                                          (START, START)):
+            with self.subTest(saved_until=saved_until):
+                client = SlicingDBClient()
+                link = self.link()
+                link.backfill_checkpoint = START + timedelta(days=2)
+                link.backfill_checkpoint_latest = START + timedelta(days=1)
+
+                with mock.patch.object(ADCONDBPlugin, "_saved_until", return_value=[saved_until]):
+                    self.collect(link, client)
+
+                self.assertEqual(client.windows[0][0], int(first_window.timestamp()))
@@ -0,0 +1,200 @@
+"""
+Tests for the batched fetch: ``ADCONDBClient.get_data_for_parameter_groups``
+and ``ADCONDBPlugin.get_stations_data``. Each link must come back exactly as
+its own query would have returned it, count included.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2.extensions import QueryCanceledError
+
+from adl_adcon_db_plugin.models import ADCONStationLink
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import (
+    FakeCursor,
+    FakeDBClient,
+    client_for,
+    make_connection,
+    make_station_link,
+    prepared_statements,
+    stub_db_client,
+)
+
+COLUMNS = ("tag_id", "enddate", "startdate", "measuringvalue")
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+
+
+class ParameterGroupsTests(SimpleTestCase):
+
+    def test_one_query_serves_every_link_with_its_own_rows_and_count(self):
+        rows = [
+            (1, BASE + 600, BASE, 21.5),           # link a
+            (1, BASE + 1200, BASE + 600, 21.7),    # link a
+            (2, BASE + 600, BASE, 55.0),           # link b
+        ]
+        cursor = FakeCursor(rows=rows, columns=COLUMNS, dropped=[0, 3])
+        client = client_for(cursor)
+
+        results = client.get_data_for_parameter_groups({
+            "a": ([1], BASE, BASE + 3600, timezone.utc),
+            "b": ([2], BASE, BASE + 3600, timezone.utc),
+        })
+
+        # One prepared query, counting what it drops, whatever the number of
+        # links.
+        self.assertEqual(len(prepared_statements(cursor)), 1)
+        self.assertEqual(len(cursor.statements), 2)
+        self.assertEqual(results["a"][1], 2)
+        self.assertEqual(results["b"][1], 4)
+        self.assertEqual(len(results["a"][0]), 2)
+        self.assertEqual(results["b"][0][0][2], 55.0)
+
+    def test_a_row_outside_a_links_own_window_is_not_handed_to_it(self):
+        # The shared query runs over the union of both windows; link a's own
+        # query would never have returned its tag's row from the second hour.
+        rows = [
+            (1, BASE + 600, BASE, 21.5),
+            (1, BASE + 4200, BASE + 3600, 22.0),
+            (2, BASE + 4200, BASE + 3600, 55.0),
+        ]
+        cursor = FakeCursor(rows=rows, columns=COLUMNS)
+        client = client_for(cursor)
+
+        results = client.get_data_for_parameter_groups({
+            "a": ([1], BASE, BASE + 3600, timezone.utc),
+            "b": ([2], BASE, BASE + 7200, timezone.utc),
+        })
+
+        self.assertEqual(len(results["a"][0]), 1)
+        self.assertEqual(len(results["b"][0]), 1)
+
+        # Each link's dropped rows are counted over its own tags and its own
+        # window: tag 1 in the first window, tag 2 in the second.
+        parameters = cursor.parameters[-1]
+        self.assertEqual(parameters[5:10], [[1, 2], [1, 2], [BASE, BASE], [BASE + 3600, BASE + 7200],
+                                            [None, None]])
+        self.assertEqual((results["a"][1], results["b"][1]), (1, 1))
+
+    def test_windows_that_do_not_overlap_are_queried_separately(self):
+        first = FakeCursor(rows=[(1, BASE + 600, BASE, 1.0)], columns=COLUMNS)
+        second = FakeCursor(rows=[(2, BASE + 86400 + 600, BASE + 86400, 2.0)], columns=COLUMNS)
+        client = client_for(first, second)
+
+        results = client.get_data_for_parameter_groups({
+            "a": ([1], BASE, BASE + 3600, timezone.utc),
+            "b": ([2], BASE + 86400, BASE + 90000, timezone.utc),
+        })
+
+        # One session: the second window runs the statement the first prepared.
+        self.assertEqual((len(first.statements), len(second.statements)), (2, 1))
+        self.assertEqual(second.statements, first.statements[1:])
+        self.assertEqual(results["a"][1], 1)
+        self.assertEqual(results["b"][1], 1)
+
+    def test_large_batches_are_chunked(self):
+        # Each chunk counts every link over the chunk's own tags.
+        first = FakeCursor(rows=[(1, BASE + 600, BASE, 1.0)], columns=COLUMNS, dropped=[2])
+        second = FakeCursor(rows=[(2, BASE + 600, BASE, 2.0)], columns=COLUMNS, dropped=[0, 1])
+        client = client_for(first, second)
+
+        results = client.get_data_for_parameter_groups({
+            "a": ([1], BASE, BASE + 3600, timezone.utc),
+            "b": ([2], BASE, BASE + 3600, timezone.utc),
+        }, max_tags_per_query=1)
+
+        # Prepared by the first chunk, executed again by the second.
+        self.assertEqual((len(first.statements), len(second.statements)), (2, 1))
+        self.assertEqual((results["a"][1], results["b"][1]), (3, 2))
+
+    def test_a_link_without_mappings_is_refused(self):
+        client = client_for(FakeCursor(columns=COLUMNS))
+        with self.assertRaises(ValueError):
+            client.get_data_for_parameter_groups({"a": ([], BASE, BASE + 3600, timezone.utc)})
+
+
+class GetStationsDataTests(SimpleTestCase):
+
+    START = datetime.fromtimestamp(BASE, tz=timezone.utc)
+    END = datetime.fromtimestamp(BASE + 3600, tz=timezone.utc)
+
+    def link(self, connection, station_id, parameter_ids):
+        link = make_station_link(connection, adcon_station_id=station_id)
+        link.get_variable_mappings = lambda: [
+            mock.Mock(adcon_parameter_id=pid) for pid in parameter_ids]
+        return link
+
+    def test_every_link_gets_its_records_and_count_in_order(self):
+        connection = make_connection(pk=1)
+        links = [self.link(connection, 42, [1]), self.link(connection, 43, [2])]
+        rows = [(2, BASE + 600, BASE, 55.0), (2, BASE + 1200, BASE + 600, 56.0)]
+        client = client_for(FakeCursor(rows=rows, columns=COLUMNS))
+
+        patcher, calls = stub_db_client(client)
+        with patcher, mock.patch.object(ADCONStationLink, "timezone", timezone.utc), \
+                mock.patch.object(ADCONStationLink, "station", SimpleNamespace(name="Wad Medani")):
+            results = ADCONDBPlugin().get_stations_data(
+                [(link, self.START, self.END) for link in links])
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([len(records) for records in results], [0, 2])
+        self.assertEqual([link.adl_sources_count for link in links], [0, 2])
+
+    def test_a_sliced_link_is_collected_alone(self):
+        connection = make_connection(pk=1, backfill_slice_hours=1)
+        short, long = self.link(connection, 42, [1]), self.link(connection, 43, [2])
+        client = GroupsDBClient()
+
+        results = self.collect(client, [(short, self.START, self.END),
+                                        (long, self.START, self.END + timedelta(hours=1))])
+
+        # The short link in the batch, the long one slice by slice.
+        self.assertEqual(client.groups, [[([1], BASE, BASE + 3600)]])
+        self.assertEqual(client.windows, [([2], BASE, BASE + 3600), ([2], BASE + 3600, BASE + 7200)])
+        self.assertEqual([len(records) for records in results], [1, 2])
+        self.assertEqual([link.adl_sources_count for link in (short, long)], [1, 2])
+
+    def test_a_timed_out_batch_is_fetched_link_by_link(self):
+        connection = make_connection(pk=1)
+        links = [self.link(connection, 42, [1]), self.link(connection, 43, [2])]
+        client = GroupsDBClient(error=QueryCanceledError("canceling statement due to statement timeout"))
+
+        results = self.collect(client, [(link, self.START, self.END) for link in links])
+
+        self.assertEqual(client.windows, [([1], BASE, BASE + 3600), ([2], BASE, BASE + 3600)])
+        self.assertEqual([len(records) for records in results], [1, 1])
+        self.assertEqual([link.adl_sources_count for link in links], [1, 1])
+
+    def collect(self, client, requests):
+        patcher, _calls = stub_db_client(client)
+        with patcher, mock.patch.object(ADCONStationLink, "timezone", timezone.utc), \
+                mock.patch.object(ADCONStationLink, "station", SimpleNamespace(name="Wad Medani")):
+            return ADCONDBPlugin().get_stations_data(requests)
+
+
+class GroupsDBClient(FakeDBClient):
+    """Answers each window, batched or alone, with one record per window,
+    keeping what it was asked."""
+
+    def __init__(self, error=None):
+        super().__init__()
+        self.error = error
+        self.groups = []
+        self.windows = []
+
+    def get_data_for_parameter_groups(self, groups, **options):
+        self.groups.append([(group[0], group[1], group[2]) for group in groups.values()])
+        if self.error is not None:
+            raise self.error
+        return {key: self.window(*group[:3]) for key, group in groups.items()}
+
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
+        self.windows.append((parameter_ids, start_date, end_date))
+        return self.window(parameter_ids, start_date, end_date)
+
+    @staticmethod
+    def window(parameter_ids, start_date, end_date):
+        return [{"observation_time": datetime.fromtimestamp(end_date, tz=timezone.utc)}], 1
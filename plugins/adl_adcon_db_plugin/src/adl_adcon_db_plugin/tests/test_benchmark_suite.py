@@ -0,0 +1,118 @@
+"""
+Tests for the benchmark suite: the synthetic dataset as served from memory,
+and the comparison of a run with the last one kept at its scale.
+"""
+
+import os
+import tempfile
+from datetime import timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import synthetic
+from adl_adcon_db_plugin.benchmarks import (
+    benchmark_suite,
+    keep_suite_run,
+    last_suite_run,
+    suite_regressions,
+    suite_run,
+)
+from adl_adcon_db_plugin.db import ADCONDBClient
+
+
+def synthetic_client(stations, tags, days):
+    return ADCONDBClient(None, None, None, None, None, pool=synthetic.SyntheticPool(stations, tags, days))
+
+
+class SyntheticDatasetTests(SimpleTestCase):
+
+    def test_a_fetch_reads_the_valid_rows_and_counts_the_short_ones(self):
+        client = synthetic_client(2, 3, 1)
+        station_id = synthetic.station_ids(2)[1]
+        tag_ids = synthetic.tag_ids(station_id, 3)
+        start_date, end_date = synthetic.window(1)
+
+        rows = list(synthetic._tag_rows(tag_ids[0], 144))
+        valid = [row for row in rows if row[4] == 0]
+        kept = [row for row in valid if row[1] - row[2] == synthetic.STEP]
+
+        records, sources_count = client.get_data_for_parameters(
+            tag_ids[:1] + [999999], start_date, end_date, timezone.utc)
+
+        self.assertEqual(len(records), len(kept))
+        self.assertEqual(sources_count, len(valid))
+        self.assertLess(len(kept), len(valid))
+        self.assertLess(len(valid), len(rows))
+
+    def test_streams_as_it_fetches(self):
+        client = synthetic_client(1, 3, 1)
+        tag_ids = synthetic.tag_ids(synthetic.station_ids(1)[0], 3)
+        start_date, end_date = synthetic.window(1)
+
+        fetched = client.get_data_for_parameters(tag_ids, start_date, end_date, timezone.utc)
+        streamed = client.get_data_for_parameters(tag_ids, start_date, end_date, timezone.utc, itersize=50)
+
+        self.assertEqual(streamed[1], fetched[1])
+        self.assertEqual(sorted(record["observation_time"] for record in streamed[0]),
+                         sorted(record["observation_time"] for record in fetched[0]))
+
+    def test_the_suite_measures_every_phase(self):
+        results = benchmark_suite(synthetic_client(2, 2, 1), 2, 2, 1, ["rows"])
+
+        measurements = results["rows"]
+        self.assertEqual(measurements["records"], 2 * 144)
+        self.assertGreater(measurements["rows"], measurements["records"])
+        for name in ("seconds", "query_seconds", "transfer_seconds", "reshape_seconds",
+                     "station_peak_mib", "station_records_mib", "station_compact_records_mib",
+                     "rows_per_second"):
+            self.assertIn(name, measurements)
+
+    def test_rows_per_second_is_of_the_timed_fetches_alone(self):
+        client = synthetic_client(2, 2, 1)
+        start_date, end_date = synthetic.window(1)
+        fetched = 0
+        for station_id in synthetic.station_ids(2):
+            client.get_data_for_parameters(synthetic.tag_ids(station_id, 2), start_date, end_date, timezone.utc,
+                                           sampling_interval=(synthetic.STEP // 2, synthetic.STEP * 2))
+            fetched += client.last_cost.rows
+
+        # The phased read is timed apart; its rows count for nothing.
+        with mock.patch("adl_adcon_db_plugin.benchmarks._phased_fetch",
+                        return_value={"query": 0, "transfer": 0, "reshape": 0}):
+            measurements = benchmark_suite(client, 2, 2, 1, ["rows"])["rows"]
+
+        self.assertEqual(measurements["rows"], fetched)
+
+    def test_refuses_more_tags_than_a_station_has_ids_for(self):
+        with self.assertRaises(ValueError):
+            synthetic.SyntheticPool(1, synthetic.STATION_ID_STRIDE, 1)
+
+
+class SuiteResultsTests(SimpleTestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def run_with(self, rows_per_second, source="postgresql", stations=10):
+        return suite_run(source, stations, 10, 7, {"rows": {"rows_per_second": rows_per_second}})
+
+    def test_compares_with_the_last_run_at_the_same_scale(self):
+        keep_suite_run(self.path, self.run_with(1000))
+        keep_suite_run(self.path, self.run_with(900))
+        keep_suite_run(self.path, self.run_with(5000, stations=50))
+        keep_suite_run(self.path, self.run_with(5000, source="memory"))
+
+        previous = last_suite_run(self.path, "postgresql", {"stations": 10, "tags": 10, "days": 7})
+
+        self.assertEqual(previous["results"]["rows"]["rows_per_second"], 900)
+
+    def test_nothing_to_compare_with(self):
+        self.assertIsNone(last_suite_run(f"{self.path}.missing", "postgresql",
+                                         {"stations": 10, "tags": 10, "days": 7}))
+
+    def test_reports_a_fall_beyond_the_tolerance(self):
+        self.assertEqual(suite_regressions(self.run_with(1000), self.run_with(700)), {"rows": (1000, 700)})
+        self.assertEqual(suite_regressions(self.run_with(1000), self.run_with(850)), {})
@@ -0,0 +1,170 @@
+"""
+Tests for late-data detection: which hours of the lookback are fetched again,
+how many of their rows count as the source's anew, and what a station link
+keeps for the next run to compare against.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import late_data
+from adl_adcon_db_plugin.late_data import BUCKET_SECONDS as HOUR
+from adl_adcon_db_plugin.models import ADCONStationLink
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import (
+    FakeDBClient,
+    FakeOperationalError,
+    make_connection,
+    make_station_link,
+    stub_db_client,
+)
+
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+
+
+def watched(digests, start=BASE, end=BASE + 4 * HOUR):
+    return {"from": start, "until": end, "digests": digests}
+
+
+class LateWindowsTests(SimpleTestCase):
+
+    def test_nothing_is_late_on_the_first_run(self):
+        current = watched({BASE: {1: (6, 100, 6, 100)}})
+        self.assertEqual(late_data.late_windows(None, current, BASE + 4 * HOUR), [])
+
+    def test_an_unchanged_lookback_is_not_fetched_again(self):
+        current = watched({BASE: {1: (6, 100, 6, 100)}, BASE + HOUR: {1: (6, 106, 6, 106)}})
+        self.assertEqual(late_data.late_windows(late_data.recorded(current), current, BASE + 4 * HOUR), [])
+
+    def test_only_the_hours_and_tags_that_gained_rows_are_fetched(self):
+        before = late_data.recorded(watched({
+            BASE: {1: (6, 100, 6, 100), 2: (6, 200, 6, 200)},
+            BASE + HOUR: {1: (6, 106, 6, 106), 2: (6, 206, 6, 206)},
+        }))
+        current = watched({
+            BASE: {1: (6, 100, 6, 100), 2: (6, 200, 6, 200)},
+            BASE + HOUR: {1: (6, 106, 6, 106), 2: (6, 900, 6, 900)},
+        }, start=BASE, end=BASE + 5 * HOUR)
+
+        self.assertEqual(late_data.late_windows(before, current, BASE + 4 * HOUR),
+                         [(BASE + HOUR, BASE + 2 * HOUR, [2])])
+
+    def test_an_hour_that_had_no_rows_at_all_is_late_once_it_has_some(self):
+        before = late_data.recorded(watched({BASE: {1: (6, 100, 6, 100)}}))
+        current = watched({BASE: {1: (6, 100, 6, 100)}, BASE + 2 * HOUR: {1: (6, 950, 6, 950)}})
+
+        self.assertEqual(late_data.late_windows(before, current, BASE + 4 * HOUR),
+                         [(BASE + 2 * HOUR, BASE + 3 * HOUR, [1])])
+
+    def test_adjacent_hours_of_the_same_tags_are_one_window(self):
+        before = late_data.recorded(watched({}))
+        current = watched({BASE: {1: (6, 900, 6, 900)}, BASE + HOUR: {1: (6, 906, 6, 906)}})
+
+        self.assertEqual(late_data.late_windows(before, current, BASE + 4 * HOUR),
+                         [(BASE, BASE + 2 * HOUR, [1])])
+
+    def test_an_hour_seen_in_part_is_compared_up_to_where_it_was_seen(self):
+        # The last run ended halfway through the hour and saw 3 rows; 3 more
+        # have arrived since, after where it ended, and are not late.
+        before = late_data.recorded(watched({BASE: {1: (3, 103, 3, 103)}}, end=BASE + HOUR // 2))
+        current = watched({BASE: {1: (6, 106, 3, 103)}}, end=BASE + 2 * HOUR)
+
+        self.assertEqual(late_data.late_windows(before, current, BASE + HOUR // 2), [])
+
+    def test_what_this_runs_fetch_reads_is_not_fetched_again(self):
+        before = late_data.recorded(watched({}))
+        current = watched({BASE + 3 * HOUR: {1: (6, 900, 6, 900)}})
+
+        self.assertEqual(late_data.late_windows(before, current, BASE + 3 * HOUR), [])
+
+
+class LateRowsTests(SimpleTestCase):
+
+    def test_only_the_rows_an_hour_gained_are_counted(self):
+        before = late_data.recorded(watched({
+            BASE: {1: (4, 104, 4, 104), 2: (6, 206, 6, 206)},
+            BASE + HOUR: {1: (6, 110, 6, 110)},
+        }))
+        current = watched({
+            BASE: {1: (6, 900, 6, 900), 2: (6, 206, 6, 206)},
+            BASE + HOUR: {1: (6, 110, 6, 110)},
+            BASE + 2 * HOUR: {1: (3, 950, 3, 950)},
+        })
+        windows = late_data.late_windows(before, current, BASE + 4 * HOUR)
+
+        # Two rows more in the first hour of tag 1; the hour it had none in
+        # is all late.
+        self.assertEqual(windows, [(BASE, BASE + HOUR, [1]), (BASE + 2 * HOUR, BASE + 3 * HOUR, [1])])
+        self.assertEqual(late_data.late_rows(before, current, windows), 2 + 3)
+
+    def test_a_row_replaced_adds_nothing(self):
+        before = late_data.recorded(watched({BASE: {1: (6, 106, 6, 106)}}))
+        current = watched({BASE: {1: (6, 901, 6, 901)}})
+        windows = late_data.late_windows(before, current, BASE + 4 * HOUR)
+
+        self.assertEqual(windows, [(BASE, BASE + HOUR, [1])])
+        self.assertEqual(late_data.late_rows(before, current, windows), 0)
+
+
+class LateDataDBClient(FakeDBClient):
+    """Digests the lookback as given, answering the fetch with one record and
+    every late window by failing, or with ``late`` records."""
+
+    def __init__(self, digests, late=None):
+        super().__init__()
+        self.digests = digests
+        self.late = late
+        self.windows = []
+
+    def get_bucket_digests(self, parameter_ids, start_date, end_date, bucket_seconds, **options):
+        return self.digests
+
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
+        self.windows.append((start_date, end_date, list(parameter_ids)))
+        if len(self.windows) > 1 and self.late is not None:
+            return self.late, len(self.late)
+        if len(self.windows) > 1:
+            raise FakeOperationalError("canceling statement due to statement timeout", pgcode="57014")
+        return [{"observation_time": datetime.fromtimestamp(end_date, tz=timezone.utc)}], 1
+
+
+class LateStationDataTests(SimpleTestCase):
+
+    def collect(self, client, recorded):
+        start = datetime.fromtimestamp(BASE + 4 * HOUR, tz=timezone.utc)
+        link = make_station_link(make_connection(late_data_lookback_hours=24), late_data_digests=recorded)
+        link.get_variable_mappings = lambda: [mock.Mock(adcon_parameter_id=1)]
+
+        patcher, _calls = stub_db_client(client)
+        with patcher, \
+                mock.patch.object(ADCONStationLink, "timezone", timezone.utc), \
+                mock.patch.object(ADCONStationLink, "station", SimpleNamespace(name="Wad Medani")):
+            return link, ADCONDBPlugin().get_station_data(link, start, start + timedelta(hours=1))
+
+    def test_a_late_hour_counts_only_the_rows_it_gained(self):
+        recorded = late_data.recorded(watched({BASE + HOUR: {1: (4, 800, 4, 800)}}))
+        late = [{"observation_time": datetime.fromtimestamp(BASE + HOUR + minutes * 600, tz=timezone.utc)}
+                for minutes in range(1, 7)]
+        client = LateDataDBClient({BASE + HOUR: {1: (6, 900, 6, 900)}}, late=late)
+
+        link, records = self.collect(client, recorded)
+
+        # The hour's six rows are handed over again, but four were counted
+        # when it was first fetched.
+        self.assertEqual(len(records), 1 + 6)
+        self.assertEqual(link.adl_sources_count, 1 + 2)
+
+    def test_a_failed_late_fetch_keeps_the_records_and_the_old_digests(self):
+        recorded = late_data.recorded(watched({}))
+        client = LateDataDBClient({BASE + HOUR: {1: (6, 900, 6, 900)}})
+
+        link, records = self.collect(client, recorded)
+
+        self.assertEqual(client.windows[1], (BASE + HOUR, BASE + 2 * HOUR, [1]))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(link.adl_sources_count, 1)
+        self.assertEqual(link.late_data_digests, recorded)
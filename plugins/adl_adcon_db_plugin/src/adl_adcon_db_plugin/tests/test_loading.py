@@ -0,0 +1,156 @@
+"""
+Tests for loading a cycle's station links: their stations, connections and
+variable mappings read in the same few queries however many links there are,
+and before the runner's workers need them.
+"""
+
+from datetime import datetime, timezone
+from unittest import mock
+
+from adl.core.models import DataParameter, Station, Unit
+from django.test import SimpleTestCase, TestCase
+
+from adl_adcon_db_plugin import loading, runner
+from adl_adcon_db_plugin.models import ADCONDBConnection, ADCONStationLink, ADCONStationVariableMapping
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import make_connection, make_station_link
+
+START = datetime(2026, 8, 1, tzinfo=timezone.utc)
+END = datetime(2026, 8, 2, tzinfo=timezone.utc)
+
+
+class PrefetchStationLinksTests(SimpleTestCase):
+
+    def setUp(self):
+        self.connections = {7: make_connection(pk=7), 8: make_connection(pk=8)}
+
+    def prefetch(self, links):
+        """The links prefetched, and how many times the ORM was asked: each
+        ask is a fixed number of queries, whatever the number of links."""
+        objects = mock.Mock()
+        objects.in_bulk.side_effect = lambda ids: {pk: self.connections[pk] for pk in ids}
+
+        with mock.patch.object(loading, "prefetch_related_objects") as prefetch_related_objects, \
+                mock.patch.object(ADCONDBConnection, "objects", objects):
+            links = loading.prefetch_station_links(links)
+
+        for call in prefetch_related_objects.call_args_list:
+            self.assertEqual(call.args[1:], ("station", *loading.MAPPING_LOOKUPS))
+        return links, prefetch_related_objects.call_count + objects.in_bulk.call_count
+
+    def links(self, count):
+        return [ADCONStationLink(pk=pk, adcon_station_id=pk, network_connection_id=7 + pk % 2)
+                for pk in range(1, count + 1)]
+
+    def test_the_queries_do_not_grow_with_the_links(self):
+        _links, few = self.prefetch(self.links(2))
+        _links, many = self.prefetch(self.links(200))
+
+        # The stations and the mappings with their parameters and units in
+        # one prefetch, the connections in one more query.
+        self.assertEqual(few, 2)
+        self.assertEqual(many, few)
+
+    def test_the_links_of_a_connection_share_it(self):
+        links, _queries = self.prefetch(self.links(4))
+
+        self.assertEqual([link.network_connection for link in links], [
+            self.connections[8], self.connections[7], self.connections[8], self.connections[7]])
+        self.assertIs(links[0].network_connection, links[2].network_connection)
+
+    def test_a_loaded_connection_is_not_read_again(self):
+        links = [make_station_link(self.connections[7], pk=1)]
+
+        links, queries = self.prefetch(links)
+
+        self.assertEqual(queries, 1)
+        self.assertIs(links[0].network_connection, self.connections[7])
+
+    def test_unsaved_links_are_left_alone(self):
+        link = make_station_link(self.connections[7])
+
+        links, queries = self.prefetch([link])
+
+        self.assertEqual(links, [link])
+        self.assertEqual(queries, 0)
+
+
+class RunnerPrefetchTests(SimpleTestCase):
+
+    def test_a_cycle_is_loaded_once_before_the_workers_start(self):
+        requests = [(make_station_link(make_connection(pk=7), pk=pk), START, END) for pk in (1, 2, 3)]
+        calls = []
+
+        with mock.patch.object(runner, "prefetch_station_links",
+                               side_effect=lambda links: calls.append(list(links))), \
+                mock.patch.object(ADCONDBPlugin, "get_station_data", return_value=[]):
+            results = ADCONDBPlugin().run_station_links(requests)
+
+        self.assertEqual(results, [[], [], []])
+
+        # The whole cycle first; each worker then only checks its own link.
+        links = [station_link for station_link, _start, _end in requests]
+        self.assertEqual(calls[0], links)
+        self.assertCountEqual(calls[1:], [[station_link] for station_link in links])
+
+
+class LoadingQueriesTests(TestCase):
+    """The queries loading takes, counted against the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        unit = Unit.objects.create(name="Degrees Celsius", symbol="°C")
+        parameters = [DataParameter.objects.create(name=name, unit=unit) for name in ("Temperature", "Humidity")]
+
+        # ADCON parameter ids are unique across the server's stations.
+        adcon_parameter_ids = iter(range(1000, 2000))
+        for pk in (7, 8):
+            connection = make_connection(pk=pk, name=f"Connection {pk}")
+            connection.save()
+            for adcon_station_id in range(3):
+                station = Station.objects.create(name=f"Station {pk}.{adcon_station_id}")
+                link = ADCONStationLink.objects.create(network_connection=connection, station=station,
+                                                       adcon_station_id=adcon_station_id)
+                for parameter in parameters:
+                    ADCONStationVariableMapping.objects.create(
+                        station_link=link, adl_parameter=parameter, adcon_parameter_id=next(adcon_parameter_ids),
+                        adcon_parameter_unit=unit)
+
+    def read(self, links):
+        """What get_station_data and core read of each link."""
+        return [(link.station.name, link.network_connection.db_host,
+                 [(mapping.adl_parameter.name, mapping.adcon_parameter_unit.symbol)
+                  for mapping in link.get_variable_mappings()])
+                for link in links]
+
+    def test_prefetching_takes_the_same_queries_for_one_link_as_for_all(self):
+        # The stations, the mappings, their parameters and units, and the
+        # connections: one query each.
+        links = list(ADCONStationLink.objects.all())
+        one = list(ADCONStationLink.objects.all()[:1])
+
+        with self.assertNumQueries(5):
+            loading.prefetch_station_links(one)
+
+        with self.assertNumQueries(5):
+            loading.prefetch_station_links(links)
+
+        with self.assertNumQueries(0):
+            self.read(links)
+
+    def test_loading_takes_the_same_queries_however_many_links(self):
+        # The links with their stations, then as above.
+        with self.assertNumQueries(5):
+            links = loading.load_station_links()
+
+        self.assertEqual(len(links), 6)
+        with self.assertNumQueries(0):
+            self.read(links)
+
+    def test_a_loaded_link_costs_a_worker_no_query(self):
+        links = loading.load_station_links()
+
+        with self.assertNumQueries(0):
+            loading.prefetch_station_links(links[:1])
+            self.read(links[:1])
@@ -0,0 +1,117 @@
+"""
+Tests for the bulk import of variable mappings: which tags the rules map,
+and the tags the plan leaves out, conflicts with the unique ADCON parameter
+id among them, before anything is written.
+"""
+
+import re
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin.mapping_import import MappingRule, load_rules, plan_mappings
+from adl_adcon_db_plugin.models import ADCONStationVariableMapping, DataParameter, Unit
+
+from .test_source_checks import FakeDBClient, make_connection, make_station_link, stub_db_client
+
+TAGS = [
+    {"id": 1011, "displayname": "Air Temperature", "subclass": 0, "parent_id": 42},
+    {"id": 1012, "displayname": "Relative Humidity", "subclass": 0, "parent_id": 42},
+    {"id": 1013, "displayname": "Battery Voltage", "subclass": 0, "parent_id": 42},
+    {"id": 1021, "displayname": "AIR TEMP 2m", "subclass": 0, "parent_id": 43},
+]
+
+
+class CatalogueDBClient(FakeDBClient):
+    def __init__(self, tags):
+        super().__init__()
+        self.tags = tags
+        self.queries = []
+
+    def get_adcon_parameters_for_stations(self, adcon_station_ids):
+        self.queries.append(sorted(adcon_station_ids))
+        return [dict(tag) for tag in self.tags if tag["parent_id"] in adcon_station_ids]
+
+
+class PlanMappingsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.connection = make_connection(pk=24)
+        self.temperature = DataParameter(pk=1)
+        self.humidity = DataParameter(pk=2)
+        self.celsius = Unit(pk=1)
+        self.percent = Unit(pk=2)
+        self.rules = [
+            MappingRule(re.compile("air temp", re.IGNORECASE), self.temperature, self.celsius),
+            MappingRule(re.compile("humidity", re.IGNORECASE), self.humidity, self.percent),
+        ]
+        self.client = CatalogueDBClient(TAGS)
+        self.mapped = {}
+
+    def plan(self, *links):
+        patcher, _calls = stub_db_client(self.client)
+        objects = mock.Mock()
+        objects.filter.return_value.values_list.return_value = list(self.mapped.items())
+        with patcher, mock.patch.object(ADCONStationVariableMapping, "objects", objects):
+            return plan_mappings(self.connection, self.rules, list(links))
+
+    def link(self, pk, adcon_station_id):
+        return make_station_link(self.connection, pk=pk, adcon_station_id=adcon_station_id)
+
+    def test_maps_each_tag_by_the_first_rule_its_name_matches(self):
+        first, second = self.link(1, 42), self.link(2, 43)
+
+        plan = self.plan(first, second)
+
+        self.assertEqual([(m.station_link, m.adcon_parameter_id, m.adl_parameter, m.adcon_parameter_unit)
+                          for m in plan.mappings], [
+            (first, 1011, self.temperature, self.celsius),
+            (first, 1012, self.humidity, self.percent),
+            (second, 1021, self.temperature, self.celsius),
+        ])
+        self.assertEqual([(link, tag["id"]) for link, tag in plan.unmatched], [(first, 1013)])
+
+        # The whole catalogue of the linked stations in one query.
+        self.assertEqual(self.client.queries, [[42, 43]])
+
+    def test_a_tag_mapped_elsewhere_is_a_conflict(self):
+        self.mapped = {1011: 1, 1012: 7}
+        link = self.link(1, 42)
+
+        plan = self.plan(link)
+
+        self.assertEqual(plan.mappings, [])
+        self.assertEqual([tag["id"] for _link, tag in plan.existing], [1011])
+        self.assertEqual([(tag["id"], reason) for _link, tag, reason in plan.conflicts],
+                         [(1012, "already mapped on station link 7")])
+
+    def test_two_links_to_one_station_cannot_both_map_a_tag(self):
+        first, second = self.link(1, 43), self.link(2, 43)
+
+        plan = self.plan(first, second)
+
+        self.assertEqual([m.station_link for m in plan.mappings], [first])
+        self.assertEqual([(link, reason) for link, _tag, reason in plan.conflicts],
+                         [(second, "also planned for station link 1")])
+
+    def test_a_station_without_tags_is_reported(self):
+        link = self.link(1, 99)
+
+        plan = self.plan(link)
+
+        self.assertEqual(plan.missing_stations, [link])
+        self.assertEqual(plan.mappings, [])
+
+
+class LoadRulesTests(SimpleTestCase):
+
+    def test_a_rule_without_a_unit_is_refused(self):
+        with mock.patch("adl_adcon_db_plugin.mapping_import._resolve"):
+            with self.assertRaisesMessage(ValueError, "Rule 1 has no 'unit'."):
+                load_rules([{"match": "rain", "parameter": 3}])
+
+    def test_a_pattern_that_is_not_a_regular_expression_is_refused(self):
+        with mock.patch("adl_adcon_db_plugin.mapping_import._resolve"):
+            with self.assertRaisesMessage(ValueError, "Rule 2's pattern is not a regular expression"):
+                load_rules([{"match": "rain", "parameter": 3, "unit": 1},
+                            {"match": "(", "parameter": 3, "unit": 1}])
@@ -0,0 +1,119 @@
+"""
+Tests for the cached station and parameter listings in ``metadata_cache.py``:
+reused within the TTL, served stale and re-read in the background past it, and
+forgotten when the connection is saved.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from adl_adcon_db_plugin import metadata_cache
+from adl_adcon_db_plugin.signals import invalidate_metadata_cache
+
+from .test_source_checks import make_connection
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                      "LOCATION": "adl-adcon-metadata-cache-tests"}}
+
+
+class ListingClient:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def get_stations(self, only_stations_with_coords=False):
+        self.owner.reads += 1
+        if self.owner.error is not None:
+            raise self.owner.error
+        return [{"id": 42, "displayname": f"Wad Medani {self.owner.reads}"}]
+
+    def get_adcon_parameters_for_station(self, adcon_station_id):
+        self.owner.reads += 1
+        return [{"id": 1011, "displayname": "Air Temperature", "subclass": None}]
+
+    def close(self):
+        self.owner.closed += 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class InlineThread:
+    """Runs the background re-read when started, so its effect is visible."""
+
+    def __init__(self, target, args=(), daemon=None):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@override_settings(CACHES=LOCMEM)
+class MetadataCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        metadata_cache.cache.clear()
+        self.addCleanup(metadata_cache.cache.clear)
+
+        self.reads = 0
+        self.closed = 0
+        self.error = None
+
+        self.clock = Clock()
+        # The re-read runs inline, on the test's own thread, so it must not
+        # close the test's database connections on its way out.
+        for patcher in (mock.patch.object(metadata_cache.time, "time", self.clock),
+                        mock.patch.object(metadata_cache.threading, "Thread", InlineThread),
+                        mock.patch.object(metadata_cache, "connections")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.connection = make_connection(pk=31)
+        self.connection.get_admin_db_connection = lambda: ListingClient(self)
+
+    def test_a_listing_is_read_once_within_the_ttl(self):
+        first = metadata_cache.get_stations(self.connection)
+        self.clock.now += 60
+        self.assertEqual(metadata_cache.get_stations(self.connection), first)
+        self.assertEqual((self.reads, self.closed), (1, 1))
+
+    def test_past_the_ttl_the_stale_listing_is_served_and_reread(self):
+        metadata_cache.get_stations(self.connection)
+        self.clock.now += self.connection.metadata_cache_minutes * 60 + 1
+
+        stale = metadata_cache.get_stations(self.connection)
+        self.assertEqual(stale[0]["displayname"], "Wad Medani 1")
+        self.assertEqual(self.reads, 2)
+
+        self.assertEqual(metadata_cache.get_stations(self.connection)[0]["displayname"], "Wad Medani 2")
+
+    def test_a_failed_reread_keeps_the_stale_listing(self):
+        metadata_cache.get_stations(self.connection)
+        self.clock.now += self.connection.metadata_cache_minutes * 60 + 1
+        self.error = RuntimeError("server closed the connection")
+
+        self.assertEqual(metadata_cache.get_stations(self.connection)[0]["displayname"], "Wad Medani 1")
+        self.assertEqual(metadata_cache.get_stations(self.connection)[0]["displayname"], "Wad Medani 1")
+
+    def test_saving_the_connection_forgets_its_listings(self):
+        metadata_cache.get_station_parameters(self.connection, 42)
+        invalidate_metadata_cache(sender=type(self.connection), instance=self.connection)
+        metadata_cache.get_station_parameters(self.connection, 42)
+        self.assertEqual(self.reads, 2)
+
+    def test_each_station_has_its_own_entry(self):
+        metadata_cache.get_station_parameters(self.connection, 42)
+        metadata_cache.get_station_parameters(self.connection, 43)
+        self.assertEqual(self.reads, 2)
+
+    def test_a_zero_ttl_reads_every_time(self):
+        self.connection.metadata_cache_minutes = 0
+        metadata_cache.get_stations(self.connection)
+        metadata_cache.get_stations(self.connection)
+        self.assertEqual(self.reads, 2)
@@ -0,0 +1,151 @@
+"""
+Tests for the ingestion cost metrics: what a fetch records of its phases and
+rows, the totals kept per connection, their Prometheus exposition and who may
+scrape it.
+"""
+
+from datetime import timezone
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from adl_adcon_db_plugin import metrics, views
+from adl_adcon_db_plugin.metrics import PHASES, FetchCost
+from adl_adcon_db_plugin.models import ADCONDBConnection
+
+from .test_source_checks import FakeCursor, client_for
+from .test_streaming import FakeNamedCursor
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                      "LOCATION": "adl-adcon-metrics-tests"}}
+
+COLUMNS = ("tag_id", "enddate", "startdate", "measuringvalue")
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+ROWS = [(1, BASE + 600, BASE, 21.5), (2, BASE + 600, BASE, 55.0), (1, BASE + 1200, BASE + 600, 21.7)]
+
+
+@override_settings(CACHES=LOCMEM)
+class FetchCostTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.cache.clear()
+
+    def test_a_fetch_records_its_phases_and_rows(self):
+        client = client_for(FakeCursor(rows=ROWS, columns=COLUMNS, dropped=[2]), connection_id=7)
+
+        client.get_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc)
+
+        cost = client.last_cost
+        self.assertEqual((cost.rows, cost.rows_dropped, cost.bytes), (3, 2, 0))
+        self.assertTrue(all(cost.seconds[phase] >= 0 for phase in PHASES))
+        self.assertGreater(cost.seconds["connect"], 0)
+
+        totals = metrics.totals([7])[7]
+        self.assertEqual((totals["fetches"], totals["rows"], totals["rows_dropped"]), (1, 3, 2))
+
+    def test_the_connect_is_charged_once(self):
+        client = client_for(FakeCursor(rows=ROWS, columns=COLUMNS), connection_id=7)
+
+        client.get_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc)
+        client.get_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc)
+
+        self.assertEqual(client.last_cost.seconds["connect"], 0)
+        self.assertEqual(metrics.totals([7])[7]["fetches"], 2)
+
+    def test_a_stream_records_once_read_to_the_end(self):
+        client = client_for(FakeNamedCursor(rows=sorted(ROWS, key=lambda row: row[1]), columns=COLUMNS,
+                                            dropped=[1]),
+                            connection_id=7)
+
+        stream = client.stream_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc)
+        iterator = iter(stream)
+        next(iterator)
+        self.assertEqual(metrics.totals([7])[7]["fetches"], 0)
+
+        list(iterator)
+        self.assertEqual((stream.cost.rows, stream.cost.rows_dropped), (3, 1))
+        self.assertEqual(metrics.totals([7])[7]["rows"], 3)
+
+    def test_a_client_without_a_connection_counts_nothing(self):
+        client = client_for(FakeCursor(rows=ROWS, columns=COLUMNS), connection_id=None)
+
+        client.get_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc)
+
+        self.assertEqual(client.last_cost.rows, 3)
+        self.assertEqual(metrics.totals([None])[None]["fetches"], 0)
+
+    def test_a_batch_writes_its_fetches_once_at_its_end(self):
+        client = client_for(FakeCursor(rows=ROWS, columns=COLUMNS), connection_id=7)
+
+        with mock.patch.object(metrics.cache, "get_many", wraps=metrics.cache.get_many) as get_many, \
+                mock.patch.object(metrics.cache, "add", wraps=metrics.cache.add) as add:
+            with metrics.batched():
+                with metrics.batched():
+                    for _fetch in range(5):
+                        client.get_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc)
+                self.assertEqual(get_many.call_count, 0)
+
+            # One read of the counters, and each that moved written once.
+            self.assertEqual(get_many.call_count, 1)
+            written = add.call_count
+
+        self.assertLessEqual(written, len(metrics.COUNTERS) + len(PHASES))
+        totals = metrics.totals([7])[7]
+        self.assertEqual((totals["fetches"], totals["rows"]), (5, 15))
+
+    def test_an_unreachable_cache_costs_only_the_counters(self):
+        with mock.patch.object(metrics.cache, "add", side_effect=ConnectionError("redis is down")), \
+                self.assertLogs("adl_adcon_db_plugin.metrics", level="WARNING"):
+            metrics.record(7, FetchCost())
+
+
+@override_settings(CACHES=LOCMEM)
+class RenderTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.cache.clear()
+
+    def test_renders_every_connection_labelled(self):
+        cost = FetchCost()
+        cost.rows, cost.rows_dropped, cost.bytes = 1440, 12, 61920
+        cost.seconds["execute"] = 0.25
+        metrics.record(7, cost)
+
+        text = metrics.render([(7, 'Gezira "north"'), (8, "Kassala")])
+
+        self.assertIn('adl_adcon_db_rows_total{connection_id="7",connection="Gezira \\"north\\""} 1440', text)
+        self.assertIn('adl_adcon_db_rows_total{connection_id="8",connection="Kassala"} 0', text)
+        self.assertIn('adl_adcon_db_bytes_total{connection_id="7",connection="Gezira \\"north\\""} 61920', text)
+        self.assertIn('adl_adcon_db_phase_seconds_total{connection_id="7",connection="Gezira \\"north\\"",'
+                      'phase="execute"} 0.250000', text)
+        self.assertIn("# TYPE adl_adcon_db_fetches_total counter", text)
+
+
+@override_settings(CACHES=LOCMEM)
+class MetricsViewTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.cache.clear()
+
+    def scrape(self, **request):
+        objects = mock.Mock()
+        objects.order_by.return_value.values_list.return_value = [(7, "Gezira")]
+        with mock.patch.object(ADCONDBConnection, "objects", objects):
+            return views.adcon_db_metrics(RequestFactory().get("/adl-db-plugin/metrics/", **request))
+
+    def test_no_one_may_scrape_unless_configured(self):
+        self.assertEqual(self.scrape().status_code, 403)
+
+    @override_settings(ADCON_DB_METRICS_TOKEN="s3cret")
+    def test_the_token_is_accepted_as_a_bearer_token(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer guess").status_code, 403)
+
+    @override_settings(ADCON_DB_METRICS_ALLOWED_IPS=["10.0.0.0/8", "192.168.1.5"])
+    def test_allowed_addresses_may_scrape(self):
+        response = self.scrape(REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'adl_adcon_db_rows_total{connection_id="7",connection="Gezira"} 0', response.content)
+
+        self.assertEqual(self.scrape(REMOTE_ADDR="192.168.1.5").status_code, 200)
+        self.assertEqual(self.scrape(REMOTE_ADDR="192.168.1.6").status_code, 403)
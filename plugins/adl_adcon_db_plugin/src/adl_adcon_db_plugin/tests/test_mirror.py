@@ -0,0 +1,53 @@
+"""
+Tests for the local metadata mirror in ``mirror.py``: what a refresh decides to
+pull, and the lookups' fallback to the server while there is no mirror.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import metadata_cache, mirror, utils
+from adl_adcon_db_plugin.mirror import _changes
+
+from .test_source_checks import make_connection
+
+
+class ChangesTests(SimpleTestCase):
+
+    def test_only_new_and_changed_digests_are_pulled(self):
+        changed, removed = _changes({1: "a", 2: "b", 3: "c"}, {1: "a", 2: "B", 4: "d"})
+        self.assertEqual(changed, [2, 4])
+        self.assertEqual(removed, [3])
+
+    def test_an_unchanged_server_pulls_nothing(self):
+        self.assertEqual(_changes({1: "a"}, {1: "a"}), ([], []))
+
+    def test_a_station_whose_tags_are_all_gone_is_pulled_once(self):
+        # No tags left means no digest on the server, mirrored as "".
+        self.assertEqual(_changes({1: "a"}, {1: ""}), ([1], []))
+        self.assertEqual(_changes({1: ""}, {1: ""}), ([], []))
+
+
+class FallbackTests(SimpleTestCase):
+
+    def setUp(self):
+        self.connection = make_connection(pk=32)
+
+    def test_no_mirror_answers_before_the_first_refresh(self):
+        self.assertIsNone(mirror.get_stations(self.connection))
+        self.assertIsNone(mirror.get_station_parameters(self.connection, 42))
+
+    def test_lookups_fall_back_to_the_server_without_a_mirror(self):
+        stations = [{"id": 42, "displayname": "Wad Medani"}]
+        with mock.patch.object(metadata_cache, "get_stations", return_value=stations) as live:
+            self.assertEqual(utils.get_stations(self.connection), stations)
+        live.assert_called_once_with(self.connection)
+
+    def test_lookups_prefer_the_mirror(self):
+        parameters = [{"id": 1011, "displayname": "Air Temperature", "subclass": 2}]
+        with mock.patch.object(mirror, "get_station_parameters", return_value=parameters), \
+                mock.patch.object(metadata_cache, "get_station_parameters") as live:
+            self.assertEqual(utils.get_station_parameters(self.connection, 42),
+                             [{"label": "Air Temperature", "value": 1011}])
+        live.assert_not_called()
@@ -0,0 +1,305 @@
+"""
+Tests for the ingestion connection pool in ``pool.py`` and the pooled client
+``get_db_connection(pooled=True)`` hands to the plugin.
+
+Like the diagnostic tests, these never touch a database: ``psycopg2.connect``
+is stubbed, and the pool's clock is patched where idleness matters.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from adl_adcon_db_plugin import pool as pool_module
+from adl_adcon_db_plugin.db import ADCONDBClient
+from adl_adcon_db_plugin.models import ADMIN_CONNECT_TIMEOUT_SECONDS, ADMIN_STATEMENT_TIMEOUT_MS
+from adl_adcon_db_plugin.pool import ADCONConnectionPool, close_pool, get_pool
+
+from .test_source_checks import DB_HOST, DB_PORT, make_connection
+
+CONNECT_KWARGS = {"host": DB_HOST, "port": DB_PORT, "dbname": "adcon", "user": "adl",
+                  "password": "secret"}
+
+
+class PooledConnection:
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+        self.pings = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.broken = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.pings += 1
+        if self.broken:
+            raise pool_module.psycopg2.OperationalError("server closed the connection")
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+def stub_pool_connect():
+    opened = []
+
+    def connect(**kwargs):
+        connection = PooledConnection()
+        opened.append((kwargs, connection))
+        return connection
+
+    patcher = mock.patch.object(pool_module.psycopg2, "connect", side_effect=connect)
+    return patcher, opened
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Timers:
+    """Stands in for ``threading.Timer``, keeping the timers started rather
+    than running them."""
+
+    def __init__(self):
+        self.started = []
+
+    def __call__(self, interval, function):
+        timer = mock.Mock(interval=interval, function=function)
+        timer.start.side_effect = lambda: self.started.append(timer)
+        return timer
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher, self.opened = stub_pool_connect()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.clock = Clock()
+        clock_patcher = mock.patch.object(pool_module.time, "monotonic", self.clock)
+        clock_patcher.start()
+        self.addCleanup(clock_patcher.stop)
+
+        self.timers = Timers()
+        timer_patcher = mock.patch.object(pool_module.threading, "Timer", self.timers)
+        timer_patcher.start()
+        self.addCleanup(timer_patcher.stop)
+
+    def test_a_returned_connection_is_reused(self):
+        pool = ADCONConnectionPool(max_size=2)
+        first = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(first)
+        second = pool.getconn(CONNECT_KWARGS)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_a_returned_connection_is_rolled_back(self):
+        pool = ADCONConnectionPool()
+        connection = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertFalse(connection.closed)
+
+    def test_never_opens_more_than_the_maximum(self):
+        pool = ADCONConnectionPool(max_size=2, acquire_timeout=0)
+        pool.getconn(CONNECT_KWARGS)
+        pool.getconn(CONNECT_KWARGS)
+        with self.assertRaises(PoolError):
+            pool.getconn(CONNECT_KWARGS)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_idle_connections_above_the_minimum_are_evicted(self):
+        pool = ADCONConnectionPool(min_size=1, max_size=3)
+        connections = [pool.getconn(CONNECT_KWARGS) for _ in range(3)]
+        for connection in connections:
+            pool.putconn(connection)
+
+        self.clock.now += pool_module.IDLE_TIMEOUT_SECONDS + 1
+        kept = pool.getconn(CONNECT_KWARGS)
+
+        self.assertEqual([c.closed for c in connections], [1, 1, 0])
+        self.assertIs(kept, connections[2])
+
+    def test_idle_connections_are_closed_without_another_borrow(self):
+        pool = ADCONConnectionPool(min_size=1, max_size=3)
+        connections = [pool.getconn(CONNECT_KWARGS) for _ in range(3)]
+        for connection in connections:
+            self.clock.now += 10
+            pool.putconn(connection)
+
+        # One timer, started by the second return and due when the coldest
+        # connection has been idle long enough.
+        [timer] = self.timers.started
+        self.assertEqual(timer.interval, pool_module.IDLE_TIMEOUT_SECONDS - 10)
+
+        self.clock.now += pool_module.IDLE_TIMEOUT_SECONDS - 20
+        timer.function()
+        self.assertEqual([c.closed for c in connections], [1, 0, 0])
+
+        # Rescheduled for the next one, and not past the minimum.
+        [_first, second] = self.timers.started
+        self.assertEqual(second.interval, 10)
+        self.clock.now += 10
+        second.function()
+        self.assertEqual([c.closed for c in connections], [1, 1, 0])
+        self.assertEqual(len(self.timers.started), 2)
+
+    def test_a_return_evicts_connections_idle_too_long(self):
+        pool = ADCONConnectionPool(max_size=2)
+        cold, warm = pool.getconn(CONNECT_KWARGS), pool.getconn(CONNECT_KWARGS)
+        pool.putconn(cold)
+
+        self.clock.now += pool_module.IDLE_TIMEOUT_SECONDS + 1
+        pool.putconn(warm)
+
+        self.assertTrue(cold.closed)
+        self.assertFalse(warm.closed)
+
+    def test_closeall_stops_the_timer(self):
+        pool = ADCONConnectionPool()
+        pool.putconn(pool.getconn(CONNECT_KWARGS))
+        [timer] = self.timers.started
+
+        pool.closeall()
+        timer.cancel.assert_called_once_with()
+
+    def test_a_long_idle_connection_is_pinged_before_reuse(self):
+        pool = ADCONConnectionPool()
+        connection = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(connection)
+
+        self.clock.now += pool_module.HEALTH_CHECK_AFTER_SECONDS + 1
+        self.assertIs(pool.getconn(CONNECT_KWARGS), connection)
+        self.assertEqual(connection.pings, 1)
+
+    def test_a_recently_returned_connection_is_trusted(self):
+        pool = ADCONConnectionPool()
+        connection = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(connection)
+        pool.getconn(CONNECT_KWARGS)
+        self.assertEqual(connection.pings, 0)
+
+    def test_a_broken_connection_is_replaced(self):
+        pool = ADCONConnectionPool(max_size=1)
+        connection = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(connection)
+        connection.broken = True
+
+        self.clock.now += pool_module.HEALTH_CHECK_AFTER_SECONDS + 1
+        replacement = pool.getconn(CONNECT_KWARGS)
+
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+    def test_a_connection_closed_by_the_server_is_replaced(self):
+        pool = ADCONConnectionPool(max_size=1)
+        connection = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(connection)
+        connection.closed = 2
+        self.assertIsNot(pool.getconn(CONNECT_KWARGS), connection)
+
+    def test_edited_credentials_empty_the_pool(self):
+        pool = ADCONConnectionPool()
+        old = pool.getconn(CONNECT_KWARGS)
+        borrowed = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(old)
+
+        new = pool.getconn(dict(CONNECT_KWARGS, password="rotated"))
+
+        self.assertIsNot(new, old)
+        self.assertTrue(old.closed)
+        self.assertEqual(self.opened[-1][0]["password"], "rotated")
+
+        # Borrowed under the old credentials, so closed rather than kept.
+        pool.putconn(borrowed)
+        self.assertTrue(borrowed.closed)
+
+    def test_closeall_closes_idle_and_later_returned_connections(self):
+        pool = ADCONConnectionPool()
+        idle = pool.getconn(CONNECT_KWARGS)
+        borrowed = pool.getconn(CONNECT_KWARGS)
+        pool.putconn(idle)
+
+        pool.closeall()
+        self.assertTrue(idle.closed)
+        self.assertFalse(borrowed.closed)
+
+        pool.putconn(borrowed)
+        self.assertTrue(borrowed.closed)
+        with self.assertRaises(PoolError):
+            pool.getconn(CONNECT_KWARGS)
+
+
+class PooledClientTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher, self.opened = stub_pool_connect()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(close_pool, "pooled-client-tests")
+
+    def test_close_hands_the_connection_back(self):
+        pool = get_pool("pooled-client-tests")
+        client = ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret", pool=pool)
+        connection = client.connection
+        client.close()
+        self.assertFalse(connection.closed)
+
+        again = ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret", pool=pool)
+        self.assertIs(again.connection, connection)
+
+    def test_ingestion_reuses_the_connection_across_station_links(self):
+        connection = make_connection(pk=987654)
+        self.addCleanup(close_pool, connection.pk)
+
+        for _ in range(3):
+            connection.get_db_connection(pooled=True).close()
+
+        self.assertEqual(len(self.opened), 1)
+        self.assertNotIn("connect_timeout", self.opened[0][0])
+
+    def test_the_admin_pages_borrow_bounded_sessions_of_their_own(self):
+        connection = make_connection(pk=987655)
+        self.addCleanup(close_pool, connection.pk)
+        self.addCleanup(close_pool, connection.admin_pool_key)
+
+        connection.get_db_connection(pooled=True).close()
+        for _ in range(3):
+            connection.get_admin_db_connection().close()
+
+        self.assertEqual(len(self.opened), 2)
+        admin_kwargs, _admin_connection = self.opened[1]
+        self.assertEqual(admin_kwargs["connect_timeout"], ADMIN_CONNECT_TIMEOUT_SECONDS)
+        self.assertEqual(admin_kwargs["options"], f"-c statement_timeout={ADMIN_STATEMENT_TIMEOUT_MS}")
+
+        # Ingestion's idle session survives the admin's differing arguments.
+        _kwargs, ingestion_connection = self.opened[0]
+        self.assertFalse(ingestion_connection.closed)
+
+    def test_resized_pools_are_replaced(self):
+        pool = get_pool("pooled-client-tests", max_size=2)
+        self.assertIs(get_pool("pooled-client-tests", max_size=2), pool)
+
+        resized = get_pool("pooled-client-tests", max_size=8)
+        self.assertIsNot(resized, pool)
+        self.assertTrue(pool.closed)
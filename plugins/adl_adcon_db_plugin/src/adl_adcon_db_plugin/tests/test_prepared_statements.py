@@ -0,0 +1,150 @@
+"""
+Tests for the fetch's prepared statements: one per query shape, prepared once
+per session whatever the number of tags, prepared again by a session that lost
+them, and given up for plain queries on a server that refuses them.
+"""
+
+from datetime import timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import db as db_module
+from adl_adcon_db_plugin.db import ADCONDBClient
+
+from .test_source_checks import (
+    DB_HOST,
+    DB_PORT,
+    FakeConnection,
+    FakeCursor,
+    FakeProgrammingError,
+    prepared_statements,
+    stub_connect,
+)
+
+COLUMNS = ("tag_id", "enddate", "startdate", "measuringvalue")
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+ROWS = [(1, BASE + 600, BASE, 21.5)]
+
+
+class RefusingCursor(FakeCursor):
+    """Refuses every PREPARE, as a pooler that does not pass it on does, or
+    with ``pgcode`` as a transaction-mode pooler does."""
+
+    def __init__(self, *args, pgcode="0A000", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pgcode = pgcode
+
+    def execute(self, sql, params=None):
+        if sql.startswith("PREPARE"):
+            self.statements.append(sql)
+            self.parameters.append(params)
+            raise FakeProgrammingError("cannot prepare", pgcode=self.pgcode)
+        super().execute(sql, params)
+
+
+class ResetCursor(FakeCursor):
+    """Answers the first EXECUTE as a backend that was reset does: the
+    statement does not exist there."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reset = True
+
+    def execute(self, sql, params=None):
+        if sql.startswith("EXECUTE") and self.reset:
+            self.reset = False
+            self.statements.append(sql)
+            self.parameters.append(params)
+            raise FakeProgrammingError("prepared statement does not exist", pgcode="26000")
+        super().execute(sql, params)
+
+
+class PreparingConnection(FakeConnection):
+    def __init__(self, cursors=None):
+        super().__init__(cursors)
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class PreparedStatementTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(db_module, "_prepare_refused", set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client_for(self, cursor):
+        connection = PreparingConnection([cursor])
+        patcher, _calls = stub_connect(connection)
+        with patcher:
+            return ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret"), connection
+
+    def test_prepares_each_query_once_per_session_whatever_the_tags(self):
+        cursor = FakeCursor(rows=ROWS, columns=COLUMNS)
+        client, _connection = self.client_for(cursor)
+
+        client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+        client.get_data_for_parameters([1, 2, 3], BASE, BASE + 3600, timezone.utc)
+
+        # The tags go as one array, so a link of three tags runs the
+        # statement prepared for a link of one.
+        self.assertEqual(len(prepared_statements(cursor)), 1)
+        self.assertIn("tag_id = ANY($1::int8[])", prepared_statements(cursor)[0])
+
+        executed = [statement for statement in cursor.statements if statement.startswith("EXECUTE")]
+        self.assertEqual(len(executed), 2)
+        self.assertEqual(executed[0], executed[1])
+        self.assertEqual(cursor.parameters[-1][0], [1, 2, 3])
+
+    def test_a_new_session_prepares_again(self):
+        first, second = FakeCursor(rows=ROWS, columns=COLUMNS), FakeCursor(rows=ROWS, columns=COLUMNS)
+
+        self.client_for(first)[0].get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+        self.client_for(second)[0].get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+
+        self.assertEqual(prepared_statements(first), prepared_statements(second))
+
+    def test_a_refused_prepare_falls_back_to_the_query(self):
+        cursor = RefusingCursor(rows=ROWS, columns=COLUMNS)
+        client, connection = self.client_for(cursor)
+
+        records, sources_count = client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(sources_count, 1)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIn(connection.dsn, db_module._prepare_refused)
+
+        # Once refused, the server is not asked again.
+        cursor.statements.clear()
+        client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+        self.assertFalse(any(statement.startswith(("PREPARE", "EXECUTE")) for statement in cursor.statements))
+
+    def test_a_lost_statement_is_prepared_again(self):
+        cursor = ResetCursor(rows=ROWS, columns=COLUMNS)
+        client, connection = self.client_for(cursor)
+        client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+
+        # Prepared, lost to the reset, and prepared again.
+        first, again = prepared_statements(cursor)[:2]
+        self.assertEqual(first, again)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertNotIn(connection.dsn, db_module._prepare_refused)
+
+        cursor.statements.clear()
+        client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+        self.assertTrue(all(statement.startswith("EXECUTE") for statement in cursor.statements))
+
+    def test_a_statement_lost_again_gives_up_on_the_server(self):
+        cursor = RefusingCursor(rows=ROWS, columns=COLUMNS, pgcode="42P05")
+        client, connection = self.client_for(cursor)
+
+        records, _sources_count = client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(len(prepared_statements(cursor)), 2)
+        self.assertEqual(connection.rollbacks, 2)
+        self.assertIn(connection.dsn, db_module._prepare_refused)
@@ -0,0 +1,98 @@
+"""
+Tests for statement profiling: what is noted of a statement, the flagging of
+slow ones, the connection's ring of them, and the client's use of a profiler.
+"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import psycopg2.extensions
+from django.test import SimpleTestCase, override_settings
+
+from adl_adcon_db_plugin import db as db_module
+from adl_adcon_db_plugin import profiling
+from adl_adcon_db_plugin.db import ADCONDBClient, _data_query, _statement_name
+from adl_adcon_db_plugin.profiling import StatementProfiler
+
+from .test_source_checks import DB_HOST, DB_PORT, FakeConnection, FakeProgrammingError, stub_connect
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                      "LOCATION": "adl-adcon-profiling-tests"}}
+
+
+@override_settings(CACHES=LOCMEM)
+class StatementProfilerTests(SimpleTestCase):
+
+    def setUp(self):
+        profiling.cache.clear()
+
+    def test_notes_the_shape_of_the_parameters_not_their_values(self):
+        profiler = StatementProfiler(7, slow_ms=1000)
+
+        with profiler.timing(SimpleNamespace(rowcount=1440), "SELECT 1\n   FROM historiandata", [[1, 2, 3], 10, 20]):
+            pass
+
+        statement, = profiler.statements
+        self.assertEqual(statement["sql"], "SELECT 1 FROM historiandata")
+        self.assertEqual(statement["parameters"], "array[3], int, int")
+        self.assertEqual(statement["rows"], 1440)
+        self.assertFalse(statement["slow"])
+
+    def test_shows_what_a_prepared_statement_runs(self):
+        name = _statement_name(_data_query())
+        profiler = StatementProfiler(7, slow_ms=1000)
+
+        with mock.patch.dict(db_module._prepared_queries, {name: _data_query()}):
+            profiler.add(f"EXECUTE {name}(%s, %s)", [[1], 10], 0.002, 12)
+
+        self.assertTrue(profiler.statements[0]["sql"].startswith(f"EXECUTE {name}: SELECT tag_id"))
+
+    def test_flags_and_logs_a_slow_statement(self):
+        profiler = StatementProfiler(7, slow_ms=50)
+
+        with self.assertLogs("adl_adcon_db_plugin.profiling", level="WARNING") as logs:
+            profiler.add("SELECT count(*) FROM historiandata", [[1] * 100], 0.25, 1)
+
+        self.assertTrue(profiler.statements[0]["slow"])
+        self.assertIn("250.0 ms", logs.output[0])
+        self.assertIn("array[100]", logs.output[0])
+
+    def test_notes_a_failed_statement(self):
+        profiler = StatementProfiler(7, slow_ms=1000)
+
+        with self.assertRaises(FakeProgrammingError):
+            with profiler.timing(SimpleNamespace(rowcount=-1), "SELECT 1", None):
+                raise FakeProgrammingError("permission denied", pgcode="42501")
+
+        self.assertEqual(profiler.statements[0]["error"], "42501")
+        self.assertIsNone(profiler.statements[0]["rows"])
+
+    def test_the_ring_keeps_the_latest(self):
+        with mock.patch.object(profiling, "RING_SIZE", 3):
+            for batch in (range(2), range(2, 5)):
+                profiler = StatementProfiler(7, slow_ms=1000)
+                for number in batch:
+                    profiler.add(f"SELECT {number}", None, 0.001, 1)
+                profiler.flush()
+
+        self.assertEqual([statement["sql"] for statement in profiling.statements(7)],
+                         ["SELECT 4", "SELECT 3", "SELECT 2"])
+        self.assertEqual(profiling.statements(8), [])
+
+
+class ProfiledClientTests(SimpleTestCase):
+
+    def test_profiles_the_session_until_it_is_handed_back(self):
+        connection = FakeConnection()
+        profiler = mock.Mock(wraps=StatementProfiler(7, slow_ms=1000))
+        patcher, _calls = stub_connect(connection)
+        with patcher:
+            client = ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret", profiler=profiler)
+
+        self.assertTrue(issubclass(connection.cursor_factory, psycopg2.extensions.cursor))
+        self.assertIsNot(connection.cursor_factory, psycopg2.extensions.cursor)
+
+        client.close()
+
+        self.assertIs(connection.cursor_factory, psycopg2.extensions.cursor)
+        profiler.flush.assert_called_once_with()
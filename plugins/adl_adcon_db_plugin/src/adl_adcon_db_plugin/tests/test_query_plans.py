@@ -0,0 +1,108 @@
+"""
+Tests for the query plan inspection: the queries explained, what is read out of
+a plan, and the advice given for the table's indexes.
+"""
+
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import query_plans
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import make_connection, make_station_link
+
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+
+SERVING_INDEX = ("historiandata_tag_id_startdate_idx",
+                 "CREATE INDEX historiandata_tag_id_startdate_idx ON public.historiandata "
+                 "USING btree (tag_id, startdate, enddate, status) INCLUDE (measuringvalue)",
+                 ["tag_id", "startdate", "enddate", "status"])
+PRIMARY_KEY = ("historiandata_pkey",
+               "CREATE UNIQUE INDEX historiandata_pkey ON public.historiandata USING btree (id)",
+               ["id"])
+
+
+def plan(node_type, estimated, actual, index=None):
+    scan = {"Node Type": node_type, "Relation Name": "historiandata", "Plan Rows": estimated,
+            "Actual Rows": actual, "Actual Loops": 1, "Actual Total Time": 1.5,
+            "Shared Hit Blocks": 10, "Shared Read Blocks": 2}
+    if index:
+        scan["Index Name"] = index
+    return {"Plan": {"Node Type": "Gather", "Plan Rows": estimated, "Plans": [scan]},
+            "Planning Time": 0.2, "Execution Time": 2.0}
+
+
+class FetchQueriesTests(SimpleTestCase):
+
+    def link(self, **kwargs):
+        link = make_station_link(make_connection(**kwargs))
+        link.get_variable_mappings = lambda: [mock.Mock(adcon_parameter_id=1), mock.Mock(adcon_parameter_id=2)]
+        return link
+
+    def test_the_window_and_the_data_query_of_the_fetch(self):
+        (window_name, _window, window_parameters), (data_name, data, data_parameters) = \
+            query_plans.fetch_queries(self.link(), BASE, BASE + 3600)
+
+        self.assertEqual((window_name, data_name), ("window", "data"))
+        self.assertEqual(window_parameters, [[1, 2], BASE, BASE + 3600])
+        self.assertIn("UNION ALL", data)
+        self.assertEqual(data_parameters, [[1, 2], BASE, BASE + 3600, 180, 1200, 180, 1200])
+
+    def test_a_watermark_and_streaming_are_explained_as_fetched(self):
+        link = self.link(incremental_fetch=True, stream_itersize=2000)
+        link.fetch_watermark = datetime.fromtimestamp(BASE + 600, tz=timezone.utc)
+
+        # Core saved the observations up to the watermark.
+        with mock.patch.object(ADCONDBPlugin, "_saved_until", return_value=[link.fetch_watermark]):
+            (_name, window, window_parameters), (_name, data, _parameters) = \
+                query_plans.fetch_queries(link, BASE, BASE + 3600)
+
+        self.assertIn("enddate > %s", window)
+        self.assertEqual(window_parameters[-1], BASE + 600)
+        self.assertTrue(data.rstrip().endswith("ORDER BY enddate"))
+
+
+class AdviseTests(SimpleTestCase):
+
+    def test_reads_the_scans_out_of_the_plan(self):
+        summary = query_plans.summarize(plan("Index Only Scan", 40, 36, index=SERVING_INDEX[0]))
+
+        self.assertFalse(summary["seq_scan"])
+        self.assertEqual(summary["execution_ms"], 2.0)
+        self.assertEqual(summary["scans"], [{
+            "node": "Index Only Scan", "index": SERVING_INDEX[0], "estimated_rows": 40, "actual_rows": 36,
+            "ms": 1.5, "buffers_hit": 10, "buffers_read": 2,
+        }])
+
+    def test_suggests_the_index_when_none_serves_the_fetch(self):
+        summaries = {"window": query_plans.summarize(plan("Seq Scan", 1400, 1480)),
+                     "data": query_plans.summarize(plan("Seq Scan", 1400, 1440))}
+
+        advice = query_plans.advise(summaries, [PRIMARY_KEY])
+
+        self.assertEqual(len(advice), 1)
+        self.assertIn(query_plans.SUGGESTED_INDEX, advice[0])
+
+    def test_a_seq_scan_despite_a_serving_index_asks_for_analyze(self):
+        summaries = {"window": query_plans.summarize(plan("Seq Scan", 1400, 1480))}
+
+        advice = query_plans.advise(summaries, [PRIMARY_KEY, SERVING_INDEX])
+
+        self.assertIn("ANALYZE historiandata", advice[0])
+
+    def test_a_data_query_misjudged_alone_asks_for_interval_statistics(self):
+        summaries = {"window": query_plans.summarize(plan("Index Only Scan", 1450, 1480, SERVING_INDEX[0])),
+                     "data": query_plans.summarize(plan("Index Only Scan", 7, 1440, SERVING_INDEX[0]))}
+
+        advice = query_plans.advise(summaries, [SERVING_INDEX])
+
+        self.assertEqual(len(advice), 1)
+        self.assertIn(query_plans.SUGGESTED_STATISTICS, advice[0])
+
+    def test_a_well_served_fetch(self):
+        summaries = {"data": query_plans.summarize(plan("Index Only Scan", 1400, 1440, SERVING_INDEX[0]))}
+
+        self.assertEqual(query_plans.advise(summaries, [SERVING_INDEX]),
+                         [f"The fetch is served by {SERVING_INDEX[0]}."])
@@ -0,0 +1,125 @@
+"""
+Tests for compact records: each must read, and compare, exactly like the dict
+record it stands for, from every engine and from a stream, in less memory.
+"""
+
+import pickle
+import unittest
+from datetime import datetime, timezone
+from importlib.util import find_spec
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import synthetic
+from adl_adcon_db_plugin.benchmarks import _held_mib
+from adl_adcon_db_plugin.db import RESHAPE_ENGINES, ADCONDBClient
+from adl_adcon_db_plugin.records import MISSING, CompactRecord, CompactRecords, as_dicts
+
+from .test_reshape_engines import BASE, COLUMNS, ROWS
+
+OBSERVATION_TIME = datetime.fromtimestamp(BASE, tz=timezone.utc)
+
+
+def by_time(records):
+    return sorted(records, key=lambda record: record["observation_time"])
+
+
+class CompactRecordTests(SimpleTestCase):
+
+    def setUp(self):
+        self.record = CompactRecord(OBSERVATION_TIME, {1: 0, 2: 1, 3: 2}, [21.5, MISSING, None])
+
+    def test_reads_like_its_dict(self):
+        expected = {"observation_time": OBSERVATION_TIME, 1: 21.5, 3: None}
+
+        self.assertEqual(self.record, expected)
+        self.assertEqual(expected, self.record)
+        self.assertEqual(dict(self.record), expected)
+        self.assertEqual(self.record["observation_time"], OBSERVATION_TIME)
+        self.assertEqual(self.record[1], 21.5)
+        self.assertIsNone(self.record[3])
+        self.assertEqual(len(self.record), 3)
+        self.assertEqual(set(self.record), set(expected))
+
+    def test_a_tag_without_a_value_is_not_a_key(self):
+        self.assertNotIn(2, self.record)
+        self.assertIsNone(self.record.get(2))
+        self.assertIsNone(self.record.get(99))
+        with self.assertRaises(KeyError):
+            self.record[2]
+
+    def test_a_tag_first_set_after_a_record_is_not_one_of_its_keys(self):
+        builder = CompactRecords()
+        builder.set(builder.add(OBSERVATION_TIME), 1, 21.5)
+        later = builder.add(OBSERVATION_TIME.replace(minute=10))
+        builder.set(later, 2, 55.0)
+
+        first, second = builder.records()
+
+        self.assertEqual(first, {"observation_time": OBSERVATION_TIME, 1: 21.5})
+        self.assertEqual(second, {"observation_time": OBSERVATION_TIME.replace(minute=10), 2: 55.0})
+
+    def test_survives_pickling(self):
+        unpickled = pickle.loads(pickle.dumps(self.record))
+
+        self.assertEqual(unpickled, self.record)
+        self.assertIs(unpickled.values[1], MISSING)
+
+    def test_as_dicts_gives_plain_dicts(self):
+        records = as_dicts([self.record, {"observation_time": OBSERVATION_TIME}])
+
+        self.assertEqual([type(record) for record in records], [dict, dict])
+        self.assertEqual(records[0], self.record)
+
+
+class CompactEngineTests(SimpleTestCase):
+
+    def engines(self):
+        return RESHAPE_ENGINES if find_spec("numpy") else {"rows": RESHAPE_ENGINES["rows"]}
+
+    def test_every_engine_returns_the_same_records_compacted(self):
+        for name, reshape in self.engines().items():
+            with self.subTest(engine=name):
+                records = reshape(ROWS, COLUMNS, timezone.utc, True)
+
+                self.assertTrue(all(isinstance(record, CompactRecord) for record in records))
+                self.assertEqual(records, reshape(ROWS, COLUMNS, timezone.utc))
+
+    def test_an_empty_window_has_no_records(self):
+        for name, reshape in self.engines().items():
+            with self.subTest(engine=name):
+                self.assertEqual(reshape([], COLUMNS, timezone.utc, True), [])
+
+
+class CompactFetchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = ADCONDBClient(None, None, None, None, None, pool=synthetic.SyntheticPool(1, 20, 2))
+        self.tag_ids = synthetic.tag_ids(synthetic.station_ids(1)[0], 20)
+        self.window = synthetic.window(2)
+
+    def fetch(self, **options):
+        return self.client.get_data_for_parameters(self.tag_ids, *self.window, timezone.utc, **options)
+
+    def test_a_fetch_and_a_stream_return_the_same_records_compacted(self):
+        for options in ({}, {"itersize": 100}):
+            with self.subTest(**options):
+                records, sources_count = self.fetch(compact=True, **options)
+                expected, expected_count = self.fetch(**options)
+
+                self.assertEqual(sources_count, expected_count)
+                self.assertEqual(by_time(records), by_time(expected))
+                self.assertEqual(by_time(as_dicts(records)), by_time(expected))
+
+    def test_compact_records_hold_less_memory(self):
+        held, _peak = _held_mib(lambda: self.fetch())
+        compact_held, _compact_peak = _held_mib(lambda: self.fetch(compact=True))
+
+        self.assertLess(compact_held, held)
+
+
+@unittest.skipUnless(find_spec("numpy"), "the columnar engine needs NumPy")
+class CompactColumnarFetchTests(CompactFetchTests):
+
+    def fetch(self, **options):
+        return super().fetch(engine="columnar", **options)
@@ -0,0 +1,204 @@
+"""
+Tests for the fetch engines: every engine must return exactly what the row
+engine returns, record order and value precedence included — the binary COPY
+engine too, whether it reads by COPY or falls back to the query.
+"""
+
+import struct
+import unittest
+from datetime import timezone
+from importlib.util import find_spec
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import db as db_module
+from adl_adcon_db_plugin.db import RESHAPE_ENGINES, ADCONDBClient, _observation_time, _parse_copy_binary, _reshape
+
+from .test_source_checks import (
+    DB_HOST,
+    DB_PORT,
+    FakeConnection,
+    FakeCursor,
+    FakeOperationalError,
+    FakeProgrammingError,
+    make_connection,
+    prepared_statements,
+    stub_connect,
+)
+
+COLUMNS = ["tag_id", "enddate", "startdate", "measuringvalue"]
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+
+ROWS = [
+    (2, BASE + 1200, BASE + 600, 54.0),     # the later time arrives first
+    (1, BASE + 600, BASE, 21.5),
+    (2, BASE + 600, BASE, 55.0),
+    (1, BASE + 1200, BASE + 600, 21.7),
+    (1, BASE + 600, BASE, 21.6),            # a repeat: the later row wins
+    (3, BASE + 1800, BASE + 1200, None),
+]
+
+
+@unittest.skipUnless(find_spec("numpy"), "the columnar engine needs NumPy")
+class ReshapeEngineTests(SimpleTestCase):
+
+    def test_every_engine_matches_the_row_engine(self):
+        for timezone_ in (timezone.utc, ZoneInfo("Africa/Khartoum")):
+            expected = _reshape(ROWS, COLUMNS, timezone_)
+            for name, reshape in RESHAPE_ENGINES.items():
+                with self.subTest(engine=name, timezone=timezone_):
+                    records = reshape(ROWS, COLUMNS, timezone_)
+                    self.assertEqual(records, expected)
+                    self.assertEqual([list(r) for r in records], [list(r) for r in expected])
+
+    def test_an_empty_window_has_no_records(self):
+        for name, reshape in RESHAPE_ENGINES.items():
+            with self.subTest(engine=name):
+                self.assertEqual(reshape([], COLUMNS, timezone.utc), [])
+
+    def test_the_column_order_is_read_from_the_cursor(self):
+        columns = ["measuringvalue", "startdate", "enddate", "tag_id"]
+        rows = [tuple(reversed(row)) for row in ROWS]
+        for name, reshape in RESHAPE_ENGINES.items():
+            with self.subTest(engine=name):
+                self.assertEqual(reshape(rows, columns, timezone.utc),
+                                 _reshape(ROWS, COLUMNS, timezone.utc))
+
+
+class ObservationTimeTests(SimpleTestCase):
+
+    def setUp(self):
+        _observation_time.cache_clear()
+
+    def test_each_observation_time_is_converted_once(self):
+        _reshape(ROWS, COLUMNS, timezone.utc)
+        self.assertEqual(_observation_time.cache_info().misses, 3)
+
+        # A second window ending on the same times converts nothing.
+        _reshape(ROWS, COLUMNS, timezone.utc)
+        self.assertEqual(_observation_time.cache_info().misses, 3)
+
+    def test_the_same_time_is_converted_per_timezone(self):
+        utc = _reshape(ROWS, COLUMNS, timezone.utc)
+        khartoum = _reshape(ROWS, COLUMNS, ZoneInfo("Africa/Khartoum"))
+
+        self.assertEqual([r["observation_time"].utcoffset().total_seconds() for r in utc], [0] * 3)
+        self.assertEqual([r["observation_time"].utcoffset().total_seconds() for r in khartoum], [7200] * 3)
+
+    def test_a_repeated_wall_time_stays_two_records(self):
+        # 2025-10-26 02:00 happens twice in Berlin, an hour apart.
+        rows = [(1, 1761436800, 1761436200, 1.0), (1, 1761440400, 1761439800, 2.0)]
+
+        records = _reshape(rows, COLUMNS, ZoneInfo("Europe/Berlin"))
+
+        self.assertEqual([record[1] for record in records], [1.0, 2.0])
+        self.assertEqual([record["observation_time"].timestamp() for record in records], [1761436800, 1761440400])
+
+
+class FetchEngineOptionTests(SimpleTestCase):
+
+    def test_the_connection_passes_its_engine_to_the_fetch(self):
+        connection = make_connection(fetch_engine="columnar")
+        self.assertEqual(connection.get_fetch_options()["engine"], "columnar")
+
+
+def copy_stream(rows):
+    """What ``COPY (...) TO STDOUT WITH (FORMAT binary)`` sends for these
+    ``(tag_id, enddate, startdate, measuringvalue)`` rows."""
+    stream = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    for tag_id, end_date, _start_date, value in rows:
+        stream += struct.pack(">hiqiqidiB", 4, 8, tag_id, 8, end_date, 8,
+                              0.0 if value is None else value, 1, value is None)
+    return stream + b"\xff\xff"
+
+
+class FakeCopyCursor(FakeCursor):
+    def __init__(self, rows=(), columns=COLUMNS, copy_error=None, dropped=()):
+        super().__init__(rows=rows, columns=columns, dropped=dropped)
+        self.copy_error = copy_error
+        self.copies = []
+
+    def mogrify(self, sql, params=None):
+        return (sql % tuple(repr(param) for param in params)).encode()
+
+    def copy_expert(self, sql, file):
+        self.copies.append(sql)
+        if self.copy_error is not None:
+            raise self.copy_error
+        file.write(copy_stream(self.rows + self.count_rows()))
+
+
+class FakeCopyConnection(FakeConnection):
+    def __init__(self, cursors=None):
+        super().__init__(cursors)
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@unittest.skipUnless(find_spec("numpy"), "the copy engine needs NumPy")
+class CopyEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(db_module, "_copy_refused", set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client_for(self, *cursors):
+        connection = FakeCopyConnection(list(cursors))
+        patcher, _calls = stub_connect(connection)
+        with patcher:
+            return ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret"), connection
+
+    def test_reads_the_window_by_copy(self):
+        cursor = FakeCopyCursor(rows=ROWS, dropped=[2])
+        client, _connection = self.client_for(cursor)
+
+        records, sources_count = client.get_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc, engine="copy")
+
+        self.assertEqual(records, _reshape(ROWS, COLUMNS, timezone.utc))
+        self.assertEqual([list(r) for r in records], [list(r) for r in _reshape(ROWS, COLUMNS, timezone.utc)])
+        self.assertEqual(sources_count, len(ROWS) + 2)
+
+        # The rows and the count of those dropped by one COPY, and no query.
+        self.assertEqual(prepared_statements(cursor), [])
+        self.assertEqual(len(cursor.copies), 1)
+        self.assertIn("UNION ALL", cursor.copies[0])
+        self.assertIn("TO STDOUT WITH (FORMAT binary)", cursor.copies[0])
+
+    def test_a_refused_copy_falls_back_to_the_query(self):
+        refused = FakeProgrammingError("permission denied for COPY", pgcode="42501")
+        cursor = FakeCopyCursor(rows=ROWS, copy_error=refused)
+        client, connection = self.client_for(cursor)
+
+        records, _count = client.get_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc, engine="copy")
+
+        self.assertEqual(records, _reshape(ROWS, COLUMNS, timezone.utc))
+        self.assertEqual(connection.rollbacks, 1)
+
+        # Once refused, the session's later fetches go straight to the query.
+        client.get_data_for_parameters([1, 2, 3], BASE, BASE + 3600, timezone.utc, engine="copy")
+        self.assertEqual(len(cursor.copies), 1)
+
+    def test_any_other_copy_failure_raises(self):
+        timeout = FakeOperationalError("canceling statement due to statement timeout", pgcode="57014")
+        client, _connection = self.client_for(FakeCopyCursor(rows=ROWS, copy_error=timeout))
+
+        with self.assertRaises(FakeOperationalError):
+            client.get_data_for_parameters([1, 2, 3], BASE, BASE + 3600, timezone.utc, engine="copy")
+
+    def test_an_empty_window_has_no_records(self):
+        client, _connection = self.client_for(FakeCopyCursor())
+        self.assertEqual(client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc, engine="copy"),
+                         ([], 0))
+
+    def test_an_unexpected_layout_is_refused(self):
+        stream = bytearray(copy_stream(ROWS[:1]))
+        stream[19:21] = struct.pack(">h", 3)
+        with self.assertRaises(ValueError):
+            _parse_copy_binary(bytes(stream))
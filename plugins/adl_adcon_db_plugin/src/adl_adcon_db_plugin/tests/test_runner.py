@@ -0,0 +1,122 @@
+"""
+Tests for the parallel station-link runner in ``runner.py``: every link
+collected through ``get_station_data``, no server ever past its cap.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import runner
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+from adl_adcon_db_plugin.runner import run_station_links
+
+from .test_source_checks import FakeOperationalError, make_connection, make_station_link
+
+START = datetime(2026, 8, 1, tzinfo=timezone.utc)
+
+
+class CountingPlugin:
+    """Holds each collection briefly, tracking how many run at once per
+    server."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+
+    def get_station_data(self, station_link, start_date, end_date):
+        key = station_link.network_connection.pk
+        with self.lock:
+            self.active[key] = self.active.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.active[key])
+        try:
+            time.sleep(0.01)
+            if station_link.adcon_station_id in self.failing:
+                raise FakeOperationalError("too many connections", pgcode="53300")
+            return [{"observation_time": start_date, 1: station_link.adcon_station_id}]
+        finally:
+            with self.lock:
+                self.active[key] -= 1
+
+
+class RunStationLinksTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(runner, "connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def requests(self, connection, station_ids, days=0):
+        end = START + timedelta(days=days, hours=1)
+        return [(make_station_link(connection, adcon_station_id=station_id), START, end)
+                for station_id in station_ids]
+
+    def test_every_link_gets_its_result_in_order(self):
+        plugin = CountingPlugin(failing=[3])
+        requests = self.requests(make_connection(pk=1), [1, 2, 3, 4])
+
+        results = run_station_links(plugin, requests, max_workers=4)
+
+        self.assertEqual([r.station_link for r in results], [link for link, _s, _e in requests])
+        self.assertEqual([r.records[0][1] if r.records else None for r in results], [1, 2, None, 4])
+        self.assertEqual(results[2].error.pgcode, "53300")
+        self.assertTrue(all(r.seconds > 0 for r in results))
+
+    def test_no_server_is_sent_more_than_its_maximum_connections(self):
+        plugin = CountingPlugin()
+        busy = self.requests(make_connection(pk=1, pool_max_size=2), range(1, 9))
+        quiet = self.requests(make_connection(pk=2, pool_max_size=4), range(11, 15))
+
+        run_station_links(plugin, busy + quiet, max_workers=8)
+
+        self.assertEqual(plugin.peak[1], 2)
+        # The busy server's queue never held the other one back.
+        self.assertEqual(plugin.peak[2], 4)
+
+    def test_a_sliced_backfill_holds_a_connection_per_parallel_slice(self):
+        connection = make_connection(pk=1, pool_max_size=3, backfill_parallelism=3)
+        requests = self.requests(connection, [1], days=5) + self.requests(connection, [2, 3])
+        self.assertEqual(runner._weight(requests[0][0], START.timestamp(), requests[0][2].timestamp()), 3)
+
+        plugin = CountingPlugin()
+        run_station_links(plugin, requests, max_workers=8)
+
+        # The backfill took the whole server, so nothing ran beside it.
+        self.assertEqual(plugin.peak[1], 2)
+
+
+class PluginRunStationLinksTests(SimpleTestCase):
+    """What the plugin hands core from a run: the shape get_station_data and
+    aget_stations_data give, not the runner's own results."""
+
+    def setUp(self):
+        patcher = mock.patch.object(runner, "connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_core_gets_each_links_records_or_its_exception_in_order(self):
+        connection = make_connection(pk=1)
+        requests = [(make_station_link(connection, adcon_station_id=station_id), START, START + timedelta(hours=1))
+                    for station_id in (1, 2, 3)]
+        counting = CountingPlugin(failing=[2])
+
+        with mock.patch.object(ADCONDBPlugin, "get_station_data", side_effect=counting.get_station_data):
+            results = ADCONDBPlugin().run_station_links(requests)
+
+        self.assertEqual(results[0], [{"observation_time": START, 1: 1}])
+        self.assertIsInstance(results[1], FakeOperationalError)
+        self.assertEqual(results[2], [{"observation_time": START, 1: 3}])
+
+    def test_the_adapter_keeps_records_and_errors_and_drops_timings(self):
+        link = make_station_link(make_connection(pk=1))
+        error = FakeOperationalError("too many connections", pgcode="53300")
+
+        self.assertEqual(runner.as_station_data([
+            runner.StationLinkResult(link, [], None, 0.5),
+            runner.StationLinkResult(link, None, error, 0.1),
+        ]), [[], error])
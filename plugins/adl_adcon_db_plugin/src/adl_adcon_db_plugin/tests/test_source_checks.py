@@ -59,11 +59,17 @@ class Column:
 
 
 class FakeCursor:
-    def __init__(self, rows=(), columns=(), error=None):
+    def __init__(self, rows=(), columns=(), error=None, dropped=()):
         self.rows = list(rows)
+        self.column_names = list(columns)
         self.description = [Column(name) for name in columns]
         self.error = error
+        # What a data query counts of the rows its sampling-interval bounds
+        # left out, per window in order, answered as the server's count rows
+        # after the data. Left out, they dropped nothing.
+        self.dropped = list(dropped)
         self.statements = []
+        self.parameters = []
 
     def __enter__(self):
         return self
@@ -73,14 +79,30 @@ class FakeCursor:
 
     def execute(self, sql, params=None):
         self.statements.append(sql)
+        self.parameters.append(params)
         if self.error is not None:
             raise self.error
 
     def fetchall(self):
-        return self.rows
+        return self.rows + self.count_rows()
+
+    def fetchone(self):
+        return (len(self.rows),)
+
+    def count_rows(self):
+        columns = self.column_names
+        count_rows = []
+        for position, dropped in enumerate(self.dropped, start=1):
+            if dropped:
+                row = [None] * len(columns)
+                row[columns.index("tag_id")], row[columns.index("enddate")] = -position, dropped
+                count_rows.append(tuple(row))
+        return count_rows
 
 
 class FakeConnection:
+    dsn = "host=adcon.example.org port=5432 user=adl dbname=adcon"
+
     def __init__(self, cursors=None):
         # One cursor per call, in order: the station check makes two queries.
         self.cursors = list(cursors or [FakeCursor()])
@@ -88,10 +110,11 @@ class FakeConnection:
         self.readonly = None
         self.closed = False
 
-    def cursor(self):
+    def cursor(self, name=None):
         cursor = self.cursors[len(self.handed_out)] if len(self.handed_out) < len(
             self.cursors) else self.cursors[-1]
         self.handed_out.append(cursor)
+        cursor.connection = self
         return cursor
 
     def set_session(self, readonly=False):
@@ -101,6 +124,12 @@ class FakeConnection:
         self.closed = True
 
 
+def prepared_statements(cursor):
+    """The queries a cursor prepared, in order; each is then run by EXECUTE
+    with its parameters."""
+    return [statement for statement in cursor.statements if statement.startswith("PREPARE")]
+
+
 def stub_connect(connection=None, error=None):
     """Patch psycopg2.connect where db.py looks it up, capturing its kwargs."""
     calls = []
@@ -115,6 +144,14 @@ def stub_connect(connection=None, error=None):
     return patcher, calls
 
 
+def client_for(*cursors, **kwargs):
+    """A client whose session hands out ``cursors``, one per call and the
+    last one from then on; ``kwargs`` go to the client."""
+    patcher, _calls = stub_connect(FakeConnection(list(cursors)))
+    with patcher:
+        return ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret", **kwargs)
+
+
 def make_connection(**kwargs):
     kwargs.setdefault("db_host", DB_HOST)
     kwargs.setdefault("db_port", DB_PORT)
@@ -136,6 +173,9 @@ class FakeDBClient:
 
     STATION_COLUMNS = ("id", "displayname", "latitude", "longitude", "timezoneid")
 
+    # What a fetch cost; a fake's fetches cost nothing worth reporting.
+    last_cost = None
+
     def __init__(self, stations=None, parameters=None, ping_error=None,
                  stations_error=None, parameters_error=None, data=None):
         self.stations = stations if stations is not None else []
@@ -146,6 +186,7 @@ class FakeDBClient:
         self.data = data
         self.closed = False
         self.readonly = False
+        self.full_scans = 0
 
     def ping_readonly(self):
         if self.ping_error is not None:
@@ -155,14 +196,26 @@ class FakeDBClient:
     def get_stations(self, only_stations_with_coords=False):
         if self.stations_error is not None:
             raise self.stations_error
+        self.full_scans += 1
         return self.stations
 
+    def get_station(self, station_id):
+        if self.stations_error is not None:
+            raise self.stations_error
+        return next((s for s in self.stations if s.get("id") == station_id), None)
+
+    def get_station_summaries(self, station_ids):
+        if self.stations_error is not None:
+            raise self.stations_error
+        return {s["id"]: (s.get("displayname"), len(self.parameters))
+                for s in self.stations if s["id"] in station_ids}
+
     def get_adcon_parameters_for_station(self, adcon_station_id):
         if self.parameters_error is not None:
             raise self.parameters_error
         return self.parameters
 
-    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz):
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
         if self.data is None:
             raise FakeOperationalError("no data", pgcode=None)
         return self.data
@@ -364,6 +417,44 @@ class CheckStationSourceTests(SimpleTestCase):
         from adl.core.source_checks import station_link_implements_check_station_source
         self.assertTrue(station_link_implements_check_station_source(make_station_link()))
 
+    def test_looks_the_station_up_rather_than_scanning_them_all(self):
+        client = FakeDBClient(stations=[station_row(station_id=7), station_row()])
+        result, _calls = self.run_check(client)
+        self.assertEqual(result.status, SourceCheckStatus.OK)
+        self.assertEqual(client.full_scans, 0)
+
+
+class CheckStationLinksTests(SimpleTestCase):
+    """Every link of a connection checked over one connect and one query,
+    each with the verdict its own check would have given."""
+
+    def run_checks(self, client, station_ids):
+        connection = make_connection()
+        links = [make_station_link(connection, adcon_station_id=station_id) for station_id in station_ids]
+        patcher, calls = stub_db_client(client)
+        with patcher:
+            results = connection.check_station_links(links)
+        return results, calls
+
+    def test_each_link_gets_its_own_verdict_in_order(self):
+        client = FakeDBClient(stations=[station_row(station_id=42), station_row(station_id=43, label="Sennar")],
+                              parameters=[{"id": 1}])
+        results, calls = self.run_checks(client, [43, 7, 42])
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r.status for r in results],
+                         [SourceCheckStatus.OK, SourceCheckStatus.FAILED, SourceCheckStatus.OK])
+        self.assertIn("Sennar", results[0].message)
+        self.assertEqual(results[1].category, "PATH_NOT_FOUND")
+        self.assertTrue(client.closed)
+
+    def test_a_failed_read_fails_every_link_without_claiming_absence(self):
+        error = FakeProgrammingError("permission denied for table node_60", pgcode="42501")
+        results, _calls = self.run_checks(FakeDBClient(stations_error=error), [42, 43])
+
+        self.assertEqual([r.status for r in results], [SourceCheckStatus.FAILED] * 2)
+        self.assertEqual([r.category for r in results], ["PERMISSION_DENIED"] * 2)
+
 
 class SourcesCountTests(SimpleTestCase):
     """The count is committed only from something the source told us, and only
@@ -409,26 +500,37 @@ class SourcesCountTests(SimpleTestCase):
             self.collect(link, FakeDBClient(data=None))
         self.assertIsNone(link.adl_sources_count)
 
-    def test_the_count_is_taken_before_the_reshaping(self):
-        # Three rows returned, one of which our own sampling-interval filter
-        # drops and two of which collapse onto one timestamp. The source offered
-        # three; anything less would read as a partly-empty source.
+    def test_the_count_is_of_the_window_not_of_what_we_kept(self):
+        # Three rows in the window: two the sampling-interval bounds keep on
+        # the server, which collapse onto one timestamp, and one they drop,
+        # counted by the same statement. The source offered three; anything
+        # less would read as a partly-empty source.
         columns = ("tag_id", "enddate", "startdate", "measuringvalue")
         base = 1756684800  # 2025-09-01T00:00:00Z
         rows = [
             (1, base + 600, base, 21.5),        # 10 minutes: kept
             (2, base + 600, base, 55.0),        # same timestamp: collapses
-            (3, base + 7200, base, 9.9),        # 120 minutes: dropped
         ]
-        cursor = FakeCursor(rows=rows, columns=columns)
+        cursor = FakeCursor(rows=rows, columns=columns, dropped=[1])
         patcher, _calls = stub_connect(FakeConnection([cursor]))
         with patcher:
             client = ADCONDBClient(DB_HOST, DB_PORT, "adcon", "adl", "secret")
             records, count = client.get_data_for_parameters(
-                [1, 2, 3], base, base + 86400, timezone.utc)
+                [1, 2, 3], base, base + 86400, timezone.utc, sampling_interval=(180, 1200))
         self.assertEqual(count, 3)
         self.assertEqual(len(records), 1)
 
+        # The window is read from historiandata once, into a materialised
+        # CTE; the rows go with the interval bounds, the count with them
+        # negated, both over that CTE.
+        [statement] = prepared_statements(cursor)
+        self.assertEqual(statement.count("FROM historiandata"), 1)
+        self.assertIn("WITH window_rows AS MATERIALIZED", statement)
+        self.assertIn("enddate - startdate >= $4", statement)
+        self.assertIn("count(*) FILTER (WHERE NOT (enddate - startdate >= $6", statement)
+        self.assertEqual(statement.count("FROM window_rows"), 2)
+        self.assertEqual(cursor.parameters[-1], [[1, 2, 3], base, base + 86400, 180, 1200, 180, 1200])
+
 
 class StampingTests(SimpleTestCase):
     """A failed ingestion run carries the server's own verdict into the
@@ -507,7 +609,16 @@ class OlderCoreImportSafetyTests(SimpleTestCase):
 
     # Every module this plugin ships. Extend it as the plugin grows more.
     MODULES = ["models.py", "plugins.py", "db.py", "apps.py", "views.py",
-               "widgets.py", "utils.py", "validators.py", "wagtail_hooks.py"]
+               "widgets.py", "utils.py", "validators.py", "wagtail_hooks.py",
+               "pool.py", "signals.py", "benchmarks.py", "metadata_cache.py",
+               "mirror.py", "tasks.py", "aio.py", "runner.py", "late_data.py",
+               "query_plans.py", "synthetic.py", "metrics.py",
+               "profiling.py", "records.py", "station_detail.py", "mapping_import.py",
+               "loading.py",
+               "management/commands/adcon_db_benchmark.py",
+               "management/commands/adcon_db_benchmark_suite.py",
+               "management/commands/adcon_db_explain.py",
+               "management/commands/adcon_db_import_mappings.py"]
 
     DENIED = "adl.core.source_checks"
 
@@ -0,0 +1,111 @@
+"""
+Tests for the admin's station detail page: the parameters with their recent
+activity, read in one query and cached briefly, and a page that renders
+without whichever the server could not answer in time.
+"""
+
+import threading
+from datetime import timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from adl_adcon_db_plugin import station_detail
+from adl_adcon_db_plugin.models import ADCONStationLink
+
+from .test_source_checks import make_connection, make_station_link
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                      "LOCATION": "adl-adcon-station-detail-tests"}}
+
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+
+PARAMETERS = [
+    {"id": 101, "displayname": "Air Temperature", "subclass": 0},
+    {"id": 102, "displayname": "Rainfall", "subclass": 0},
+]
+
+
+class ActivityClient:
+    def __init__(self, test):
+        self.test = test
+
+    def get_tag_activity(self, adcon_station_id, since):
+        self.test.queries.append((adcon_station_id, since))
+        if self.test.release is not None:
+            self.test.release.wait(5)
+        if self.test.error is not None:
+            raise self.test.error
+        return {101: (21.5, BASE + 600, 144)}
+
+    def close(self):
+        self.test.closed += 1
+
+
+@override_settings(CACHES=LOCMEM)
+class StationDetailTests(SimpleTestCase):
+
+    def setUp(self):
+        station_detail.cache.clear()
+
+        self.queries = []
+        self.closed = 0
+        self.error = None
+        self.release = None
+
+        connection = make_connection(pk=41)
+        connection.get_admin_db_connection = lambda: ActivityClient(self)
+        self.station_link = make_station_link(connection, adcon_station_id=42)
+
+        for patcher in (mock.patch.object(station_detail, "get_adcon_parameters", return_value=PARAMETERS),
+                        mock.patch.object(ADCONStationLink, "timezone", timezone.utc)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lists_each_parameter_with_its_activity(self):
+        context = station_detail.get_station_detail(self.station_link)
+
+        temperature, rainfall = context["station_parameters"]
+        self.assertEqual(temperature["displayname"], "Air Temperature")
+        self.assertEqual(temperature["activity"]["last_value"], 21.5)
+        self.assertEqual(temperature["activity"]["last_observation"].timestamp(), BASE + 600)
+        self.assertEqual(temperature["activity"]["rows"], 144)
+        self.assertIsNone(rainfall["activity"])
+        self.assertIsNone(context["activity_error"])
+
+        # One query for the station, its session handed back.
+        self.assertEqual([station_id for station_id, _since in self.queries], [42])
+        self.assertEqual(self.closed, 1)
+
+    def test_the_activity_is_reused_for_a_while(self):
+        station_detail.get_station_detail(self.station_link)
+        station_detail.get_station_detail(self.station_link)
+
+        self.assertEqual(len(self.queries), 1)
+
+    def test_a_failed_activity_read_still_renders_the_parameters(self):
+        self.error = RuntimeError("canceling statement due to statement timeout")
+
+        context = station_detail.get_station_detail(self.station_link)
+
+        self.assertEqual(len(context["station_parameters"]), 2)
+        self.assertIn("statement timeout", context["activity_error"])
+        self.assertEqual(self.closed, 1)
+
+    def test_the_page_stops_waiting_for_the_activity(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+        with mock.patch.object(station_detail, "ACTIVITY_WAIT_SECONDS", 0.05):
+            context = station_detail.get_station_detail(self.station_link)
+
+        self.assertEqual(len(context["station_parameters"]), 2)
+        self.assertIsNotNone(context["activity_error"])
+
+    def test_an_unreadable_listing_is_reported_rather_than_raised(self):
+        with mock.patch.object(station_detail, "get_adcon_parameters",
+                               side_effect=RuntimeError("timeout expired")):
+            context = station_detail.get_station_detail(self.station_link)
+
+        self.assertEqual(context["station_parameters"], [])
+        self.assertEqual(context["parameters_error"], "timeout expired")
@@ -0,0 +1,91 @@
+"""
+Tests for the streaming fetch through a server-side cursor: the records and the
+sources count must match the materialised fetch's, only arriving incrementally.
+"""
+
+from datetime import timezone
+
+import psycopg2
+from django.test import SimpleTestCase
+
+from .test_source_checks import FakeCursor, FakeOperationalError, client_for
+
+COLUMNS = ("tag_id", "enddate", "startdate", "measuringvalue")
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+
+# Ordered by enddate, as the streaming query asks for.
+ROWS = [
+    (1, BASE + 600, BASE, 21.5),
+    (2, BASE + 600, BASE, 55.0),
+    (1, BASE + 1200, BASE + 600, 21.7),
+    (2, BASE + 1200, BASE + 600, 54.0),
+]
+
+
+class FakeNamedCursor(FakeCursor):
+    """A server-side cursor: iterated rather than fetched, and described only
+    once iteration has started."""
+
+    def __init__(self, rows=(), columns=(), error=None, fail_after=None, dropped=()):
+        super().__init__(rows=rows, columns=columns, error=error, dropped=dropped)
+        self.columns = self.description
+        self.description = None
+        self.fail_after = fail_after
+        self.itersize = None
+
+    def __iter__(self):
+        # The count rows' enddates are counts, so they are ordered first.
+        for index, row in enumerate(self.count_rows() + self.rows):
+            if index == self.fail_after:
+                raise FakeOperationalError("server closed the connection", pgcode="57P01")
+            self.description = self.columns
+            yield row
+
+
+class StreamingTests(SimpleTestCase):
+
+    def test_matches_the_materialised_fetch(self):
+        materialised = client_for(FakeCursor(rows=ROWS, columns=COLUMNS, dropped=[2])).get_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc)
+        streamed = client_for(FakeNamedCursor(rows=ROWS, columns=COLUMNS, dropped=[2])).get_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc, itersize=2)
+
+        self.assertEqual(streamed, materialised)
+        self.assertEqual(streamed[1], 6)
+
+    def test_reads_in_batches_of_itersize_ordered_by_time(self):
+        cursor = FakeNamedCursor(rows=ROWS, columns=COLUMNS)
+        client_for(cursor).get_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc, itersize=500)
+
+        self.assertEqual(cursor.itersize, 500)
+        self.assertIn("ORDER BY enddate", cursor.statements[0])
+
+    def test_yields_each_record_once_it_is_complete(self):
+        stream = client_for(FakeNamedCursor(rows=ROWS, columns=COLUMNS)).stream_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc)
+        records = iter(stream)
+
+        first = next(records)
+        self.assertEqual(set(first) - {"observation_time"}, {1, 2})
+        self.assertIsNone(stream.sources_count)
+
+        self.assertEqual(len(list(records)), 1)
+        self.assertEqual(stream.sources_count, 4)
+
+    def test_a_broken_stream_makes_no_claim_at_all(self):
+        stream = client_for(FakeNamedCursor(rows=ROWS, columns=COLUMNS, fail_after=3)).stream_data_for_parameters(
+            [1, 2, 3], BASE, BASE + 3600, timezone.utc)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            list(stream)
+        self.assertIsNone(stream.sources_count)
+
+    def test_a_stream_failure_is_stamped(self):
+        error = FakeOperationalError("auth", pgcode="28P01")
+        stream = client_for(FakeNamedCursor(columns=COLUMNS, error=error)).stream_data_for_parameters(
+            [1], BASE, BASE + 3600, timezone.utc)
+
+        with self.assertRaises(psycopg2.OperationalError) as caught:
+            list(stream)
+        self.assertEqual(caught.exception.adl_category, "AUTH_FAILED")
@@ -0,0 +1,164 @@
+"""
+Tests for a connection's time limits: the server's statement timeout, windows
+whose query it cancelled fetched again in halves, and a station link's
+collection cancelled on the server once its deadline passes.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import psycopg2.extensions
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin import synthetic
+from adl_adcon_db_plugin.db import ADCONDBClient, RunDeadlineExceeded
+from adl_adcon_db_plugin.models import ADCONStationLink
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import FakeDBClient, make_connection, make_station_link, stub_connect, stub_db_client
+
+HOUR = 3600
+START = datetime(2026, 8, 1, tzinfo=timezone.utc)
+
+
+class TimingOutDBClient(FakeDBClient):
+    """Answers windows of up to ``longest`` seconds with a record and a row
+    per hour; the server cancels the query of any longer one."""
+
+    def __init__(self, longest):
+        super().__init__()
+        self.longest = longest
+        self.windows = []
+
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
+        self.windows.append((start_date, end_date))
+        if end_date - start_date > self.longest:
+            raise psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout")
+        return [{"observation_time": hour} for hour in range(start_date, end_date, HOUR)], (end_date - start_date) // HOUR
+
+
+class SplitOnTimeoutTests(SimpleTestCase):
+
+    def collect(self, link, client, hours):
+        patcher, calls = stub_db_client(client)
+        station = SimpleNamespace(name="Wad Medani")
+        with patcher, \
+                mock.patch.object(ADCONStationLink, "timezone", timezone.utc), \
+                mock.patch.object(ADCONStationLink, "station", station):
+            records = ADCONDBPlugin().get_station_data(link, START, START + timedelta(hours=hours))
+        return records, calls
+
+    def link(self, **kwargs):
+        link = make_station_link(make_connection(**kwargs))
+        link.get_variable_mappings = lambda: [mock.Mock(adcon_parameter_id=1)]
+        return link
+
+    def test_a_timed_out_window_is_fetched_again_in_halves(self):
+        client = TimingOutDBClient(longest=6 * HOUR)
+        link = self.link()
+
+        records, _calls = self.collect(link, client, hours=24)
+
+        self.assertEqual(len(records), 24)
+        self.assertEqual([record["observation_time"] for record in records],
+                         list(range(int(START.timestamp()), int(START.timestamp()) + 24 * HOUR, HOUR)))
+        self.assertEqual(link.adl_sources_count, 24)
+        self.assertEqual(len(client.windows), 7)
+
+    def test_the_halves_meet_on_the_hour(self):
+        client = TimingOutDBClient(longest=HOUR)
+
+        self.collect(self.link(), client, hours=3)
+
+        for start_date, end_date in client.windows:
+            self.assertEqual(start_date % HOUR, 0)
+            self.assertEqual(end_date % HOUR, 0)
+
+    def test_a_window_too_short_to_split_raises(self):
+        client = TimingOutDBClient(longest=0)
+
+        with self.assertRaises(psycopg2.extensions.QueryCanceledError):
+            self.collect(self.link(), client, hours=1)
+
+    def test_the_fetches_share_the_station_links_deadline(self):
+        client = TimingOutDBClient(longest=HOUR)
+
+        _records, calls = self.collect(self.link(run_deadline_minutes=10), client, hours=2)
+
+        deadline = calls[0]["deadline"]
+        self.assertAlmostEqual(deadline, time.monotonic() + 600, delta=5)
+        self.assertEqual({call["deadline"] for call in calls}, {deadline})
+
+
+class CancellingConnection:
+    """A session whose statement blocks until it is cancelled."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.rolled_back = 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def rollback(self):
+        self.rolled_back += 1
+
+    def run(self):
+        if not self.cancelled.wait(5):
+            return
+        raise psycopg2.extensions.QueryCanceledError("canceling statement due to user request")
+
+
+class DeadlineTests(SimpleTestCase):
+
+    def client_with_deadline(self, deadline):
+        client = ADCONDBClient(None, None, None, None, None, pool=synthetic.SyntheticPool(1, 1, 1),
+                               deadline=deadline)
+        client.connection = CancellingConnection()
+        return client
+
+    def test_a_query_running_at_the_deadline_is_cancelled(self):
+        client = self.client_with_deadline(time.monotonic() + 0.05)
+
+        with self.assertRaises(RunDeadlineExceeded):
+            with client._cancelling():
+                client.connection.run()
+
+        self.assertTrue(client.connection.cancelled.is_set())
+        self.assertEqual(client.connection.rolled_back, 1)
+
+    def test_nothing_is_started_past_the_deadline(self):
+        client = self.client_with_deadline(time.monotonic() - 1)
+
+        with self.assertRaises(RunDeadlineExceeded):
+            client.get_data_for_parameters([1], 0, HOUR, timezone.utc)
+
+        self.assertFalse(client.connection.cancelled.is_set())
+
+    def test_a_statement_timeout_before_the_deadline_is_raised_as_such(self):
+        client = self.client_with_deadline(time.monotonic() + 60)
+
+        with self.assertRaises(psycopg2.extensions.QueryCanceledError):
+            with client._cancelling():
+                raise psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout")
+
+        self.assertFalse(client.connection.cancelled.is_set())
+        self.assertEqual(client.connection.rolled_back, 1)
+
+
+class StatementTimeoutTests(SimpleTestCase):
+
+    def test_the_query_time_limit_is_the_sessions_statement_timeout(self):
+        patcher, calls = stub_connect()
+        with patcher:
+            make_connection(statement_timeout_seconds=30).get_db_connection()
+        self.assertEqual(calls[0]["options"], "-c statement_timeout=30000")
+
+    def test_without_one_the_servers_own_applies(self):
+        patcher, calls = stub_connect()
+        with patcher:
+            make_connection().get_db_connection()
+        self.assertNotIn("options", calls[0])
@@ -0,0 +1,197 @@
+"""
+Tests for incremental fetching: the station link's high-watermark, and the
+``enddate > watermark`` bound it puts on the fetch and on its count of the
+dropped rows.
+"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_adcon_db_plugin.models import ADCONStationLink
+from adl_adcon_db_plugin.plugins import ADCONDBPlugin
+
+from .test_source_checks import (
+    FakeCursor,
+    FakeDBClient,
+    client_for,
+    make_connection,
+    make_station_link,
+    prepared_statements,
+    stub_db_client,
+)
+
+COLUMNS = ("tag_id", "enddate", "startdate", "measuringvalue")
+BASE = 1756684800  # 2025-09-01T00:00:00Z
+START = datetime.fromtimestamp(BASE, tz=timezone.utc)
+
+# Core saved everything the link's watermark says was handed over.
+SAVED = object()
+
+
+class WatermarkQueryTests(SimpleTestCase):
+
+    def test_the_fetch_and_its_count_only_read_rows_ending_after_the_watermark(self):
+        cursor = FakeCursor(rows=[(1, BASE + 1800, BASE + 1200, 21.5)], columns=COLUMNS)
+        client = client_for(cursor)
+
+        client.get_data_for_parameters([1, 2], BASE, BASE + 3600, timezone.utc, after=BASE + 1200)
+
+        # The window both the rows kept and those dropped are taken from is
+        # held to the watermark.
+        [statement] = prepared_statements(cursor)
+        self.assertEqual(statement.count("enddate > $"), 1)
+        self.assertIn("enddate > $4", statement)
+
+        [parameters] = [parameters for parameters in cursor.parameters if parameters]
+        self.assertEqual(parameters, [[1, 2], BASE, BASE + 3600, BASE + 1200, 180, 1200, 180, 1200])
+
+    def test_without_a_watermark_the_whole_window_is_read(self):
+        cursor = FakeCursor(rows=[], columns=COLUMNS)
+        client = client_for(cursor)
+
+        client.get_data_for_parameters([1], BASE, BASE + 3600, timezone.utc)
+
+        self.assertTrue(all("enddate >" not in statement for statement in cursor.statements))
+
+    def test_a_batched_link_is_held_to_its_own_watermark(self):
+        rows = [
+            (1, BASE + 600, BASE, 21.5),
+            (1, BASE + 1200, BASE + 600, 21.7),
+            (2, BASE + 600, BASE, 55.0),
+        ]
+        cursor = FakeCursor(rows=rows, columns=COLUMNS)
+        client = client_for(cursor)
+
+        results = client.get_data_for_parameter_groups({
+            "a": ([1], BASE, BASE + 3600, timezone.utc),
+            "b": ([2], BASE, BASE + 3600, timezone.utc),
+        }, watermarks={"a": BASE + 600})
+
+        self.assertEqual([record["observation_time"].timestamp() for record in results["a"][0]],
+                         [BASE + 1200])
+        self.assertEqual(len(results["b"][0]), 1)
+
+        # Link b has no watermark, so the shared query reads the whole window;
+        # link a's count of its dropped rows still takes its own.
+        [statement] = prepared_statements(cursor)
+        self.assertNotIn("enddate > $", statement)
+        self.assertEqual(cursor.parameters[-1][9], [BASE + 600, None])
+
+
+class WatermarkDBClient(FakeDBClient):
+    """Answers every fetch with the given records, keeping the bound asked."""
+
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+        self.afters = []
+
+    def get_data_for_parameters(self, parameter_ids, start_date, end_date, tz, **options):
+        self.afters.append(options.get("after"))
+        return self.records, len(self.records)
+
+
+class WatermarkCollectionTests(SimpleTestCase):
+
+    def collect(self, link, client, saved_until=SAVED):
+        """Collect the link, core having saved its observations up to
+        ``saved_until``, its watermark unless given."""
+        if saved_until is SAVED:
+            saved_until = link.fetch_watermark
+        patcher, _calls = stub_db_client(client)
+        with patcher, \
+                mock.patch.object(ADCONDBPlugin, "_saved_until", return_value=[saved_until]), \
+                mock.patch.object(ADCONStationLink, "timezone", timezone.utc), \
+                mock.patch.object(ADCONStationLink, "station", SimpleNamespace(name="Wad Medani")):
+            return ADCONDBPlugin().get_station_data(link, START, START + timedelta(hours=6))
+
+    def link(self, watermark=None, **kwargs):
+        kwargs.setdefault("incremental_fetch", True)
+        link = make_station_link(make_connection(**kwargs), fetch_watermark=watermark)
+        link.get_variable_mappings = lambda: [mock.Mock(adcon_parameter_id=1)]
+        return link
+
+    def test_fetches_after_the_watermark_and_advances_it(self):
+        watermark = START + timedelta(hours=2)
+        client = WatermarkDBClient([
+            {"observation_time": START + timedelta(hours=3), 1: 21.5},
+            {"observation_time": START + timedelta(hours=4), 1: 21.7},
+        ])
+        link = self.link(watermark)
+
+        self.collect(link, client)
+
+        self.assertEqual(client.afters, [int(watermark.timestamp())])
+        self.assertEqual(link.fetch_watermark, START + timedelta(hours=4))
+
+    def test_only_what_core_saved_bounds_the_fetch(self):
+        # The last run's records were handed over, but core saved only those
+        # up to an hour before the watermark.
+        watermark = START + timedelta(hours=2)
+        client = WatermarkDBClient([])
+
+        self.collect(self.link(watermark), client, saved_until=START + timedelta(hours=1))
+
+        self.assertEqual(client.afters, [int((START + timedelta(hours=1)).timestamp())])
+
+    def test_a_run_core_saved_nothing_of_is_read_again_whole(self):
+        client = WatermarkDBClient([])
+
+        self.collect(self.link(START + timedelta(hours=2)), client, saved_until=None)
+
+        self.assertEqual(client.afters, [None])
+
+    def test_a_run_with_nothing_new_leaves_the_watermark(self):
+        watermark = START + timedelta(hours=2)
+        link = self.link(watermark)
+
+        self.collect(link, WatermarkDBClient([]))
+
+        self.assertEqual(link.fetch_watermark, watermark)
+        self.assertEqual(link.adl_sources_count, 0)
+
+    def test_the_watermark_never_moves_back(self):
+        watermark = START + timedelta(hours=5)
+        link = self.link(watermark)
+
+        self.collect(link, WatermarkDBClient([{"observation_time": START + timedelta(hours=1), 1: 21.5}]))
+
+        self.assertEqual(link.fetch_watermark, watermark)
+
+    def test_without_incremental_fetching_the_whole_window_is_read(self):
+        watermark = START + timedelta(hours=2)
+        client = WatermarkDBClient([{"observation_time": START + timedelta(hours=3), 1: 21.5}])
+        link = self.link(watermark, incremental_fetch=False)
+
+        self.collect(link, client)
+
+        self.assertEqual(client.afters, [None])
+        self.assertEqual(link.fetch_watermark, watermark)
+
+
+class SavedUntilTests(SimpleTestCase):
+
+    def test_each_link_is_confirmed_over_its_own_parameters_in_one_query(self):
+        from adl.core.models import ObservationRecord
+
+        first = make_station_link(make_connection(), station_id=5)
+        first.get_variable_mappings = lambda: [mock.Mock(adl_parameter_id=1)]
+        second = make_station_link(make_connection(), station_id=5)
+        second.get_variable_mappings = lambda: [mock.Mock(adl_parameter_id=2), mock.Mock(adl_parameter_id=3)]
+        unsaved = make_station_link(make_connection(), station_id=6)
+        unsaved.get_variable_mappings = lambda: [mock.Mock(adl_parameter_id=1)]
+
+        objects = mock.Mock()
+        objects.filter.return_value.values.return_value.annotate.return_value = [
+            {"station_id": 5, "parameter_id": 1, "latest": START},
+            {"station_id": 5, "parameter_id": 2, "latest": START + timedelta(hours=1)},
+            {"station_id": 5, "parameter_id": 3, "latest": START + timedelta(hours=2)},
+        ]
+        with mock.patch.object(ObservationRecord, "objects", objects):
+            saved = ADCONDBPlugin._saved_until([first, second, unsaved])
+
+        self.assertEqual(saved, [START, START + timedelta(hours=2), None])
+        objects.filter.assert_called_once_with(station_id__in={5, 6}, parameter_id__in={1, 2, 3})
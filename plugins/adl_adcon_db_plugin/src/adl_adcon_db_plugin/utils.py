@@ -1,8 +1,32 @@
-def get_station_parameters(network_conn, adcon_station_id):
-    db = network_conn.get_db_connection()
+from . import metadata_cache, mirror
+
+
+def get_stations(network_conn):
+    """
+    The connection's ADCON stations: from the local mirror when there is one,
+    otherwise from the server through the listing cache.
+    """
+    stations = mirror.get_stations(network_conn)
+    if stations is None:
+        stations = metadata_cache.get_stations(network_conn)
+
+    return stations
+
 
-    parameters = db.get_adcon_parameters_for_station(adcon_station_id)
+def get_adcon_parameters(network_conn, adcon_station_id):
+    """
+    An ADCON station's parameters, from the local mirror when it knows the
+    station, otherwise from the server through the listing cache.
+    """
+    parameters = mirror.get_station_parameters(network_conn, adcon_station_id)
+    if parameters is None:
+        parameters = metadata_cache.get_station_parameters(network_conn, adcon_station_id)
+
+    return parameters
+
+
+def get_station_parameters(network_conn, adcon_station_id):
+    parameters = get_adcon_parameters(network_conn, adcon_station_id)
     parameter_options = [{"label": parameter["displayname"], "value": parameter["id"], } for parameter in parameters]
-    db.close()
 
     return parameter_options
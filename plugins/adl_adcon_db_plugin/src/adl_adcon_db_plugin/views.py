@@ -1,13 +1,19 @@
+import hmac
+import ipaddress
+
 from adl.core.utils import get_object_or_none
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
 from django.utils.translation import gettext_lazy as _
 
+from . import metrics, profiling
 from .models import (
     ADCONDBConnection,
     ADCONStationLink
 )
-from .utils import get_station_parameters
+from .station_detail import get_station_detail
+from .utils import get_station_parameters, get_stations
 
 
 def get_adcon_stations_for_connection(request):
@@ -28,27 +34,17 @@ def get_adcon_stations_for_connection(request):
 
         return JsonResponse(response, status=400)
 
-    db = network_conn.get_db_connection()
-    stations = db.get_stations(only_stations_with_coords=network_conn.only_stations_with_coords)
-
-    db.close()
+    stations = get_stations(network_conn)
 
     return JsonResponse(stations, safe=False)
 
 
 def adcon_db_station_detail(request, station_link_id):
     station_link = ADCONStationLink.objects.get(pk=station_link_id)
-    device_node_id = station_link.adcon_station_id
-
-    network_conn = station_link.network_connection
-
-    db = network_conn.get_db_connection()
-
-    station_parameters = db.get_adcon_parameters_for_station(device_node_id)
 
     context = {
         "station_link": station_link,
-        "station_parameters": station_parameters,
+        **get_station_detail(station_link),
     }
 
     return render(request, "adl_adcon_db_plugin/adcon_db_station_detail.html", context)
@@ -81,3 +77,49 @@ def get_adcon_variables_for_connection(request):
     variables = get_station_parameters(network_conn, station_id) or []
 
     return JsonResponse(variables, safe=False)
+
+
+def _may_scrape_metrics(request):
+    """Whether the request carries ``ADCON_DB_METRICS_TOKEN`` as its bearer
+    token, or comes from an address in ``ADCON_DB_METRICS_ALLOWED_IPS``. With
+    neither set, no one may."""
+    token = getattr(settings, "ADCON_DB_METRICS_TOKEN", None)
+    if token:
+        scheme, _space, given = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(given.strip().encode(), token.encode()):
+            return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in getattr(settings, "ADCON_DB_METRICS_ALLOWED_IPS", ()))
+
+
+def adcon_db_metrics(request):
+    """Every ADCON connection's ingestion cost, in Prometheus's text format.
+
+    Served outside the admin, for a scraper that has no session, so it is
+    guarded by ``_may_scrape_metrics`` instead.
+    """
+    if not _may_scrape_metrics(request):
+        return HttpResponseForbidden()
+
+    connections = ADCONDBConnection.objects.order_by("pk").values_list("pk", "name")
+
+    return HttpResponse(metrics.render(connections), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def adcon_db_statement_profile(request, connection_id):
+    network_connection = ADCONDBConnection.objects.get(pk=connection_id)
+    statements = profiling.statements(connection_id)
+
+    context = {
+        "network_connection": network_connection,
+        "statements": statements,
+        "slow_count": sum(1 for statement in statements if statement["slow"]),
+    }
+
+    return render(request, "adl_adcon_db_plugin/adcon_db_statement_profile.html", context)
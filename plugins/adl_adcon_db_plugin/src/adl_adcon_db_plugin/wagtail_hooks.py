@@ -3,6 +3,7 @@ from wagtail import hooks
 
 from .views import (
     adcon_db_station_detail,
+    adcon_db_statement_profile,
     get_adcon_stations_for_connection,
     get_adcon_variables_for_connection
 )
@@ -18,4 +19,6 @@ def urlconf_wis2box_adl_adcon_plugin():
              name="get_adcon_variables_for_connection"),
         path('adl-db-plugin/station-detail/<int:station_link_id>/', adcon_db_station_detail,
              name='adcon_db_station_detail'),
+        path("adl-db-plugin/statement-profile/<int:connection_id>/", adcon_db_statement_profile,
+             name="adcon_db_statement_profile"),
     ]